@@ -0,0 +1,83 @@
+"""
+Time filters and group-bys on the columnar index against a synthetic store.
+
+Compares the index with the obvious alternative of loading every listing
+dict and aggregating in Python, and times an incremental refresh after a
+small batch of new saves.
+
+    python -m benchmarks.bench_columnar --listings 100000
+"""
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import collections
+from scraper import config
+from benchmarks.load_server import build_store
+
+
+def timed(fn, repeat=5):
+    """Best wall time of fn in milliseconds, and its last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def python_median_rent(listings):
+    prices = collections.defaultdict(list)
+    for listing in listings:
+        if "Rentals" in listing["location"]:
+            prices[listing["location"].split(",")[0]].append(float(listing["price"]))
+    return {district: statistics.median(values) for district, values in prices.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        build_store(tmp, args.listings, with_images=0)
+        print(f"Built {args.listings} synthetic listings in {time.perf_counter() - started:.1f}s")
+        config.COLUMNAR_DIR = f"{tmp}/columnar"
+
+        from scraper import storage, columnar
+        took, index = timed(lambda: columnar.build(full=True), repeat=1)
+        print(f"Full index build: {took:.0f} ms")
+        took, index = timed(lambda: columnar.ColumnarIndex.load(), repeat=1)
+        print(f"Open (mmap): {took:.1f} ms")
+
+        rentals = lambda: index.mask(property_type="Rentals")
+        queries = {
+            "median rent by district": lambda: index.group_by("district", "price", "median", rentals()),
+            "count by property type": lambda: index.group_by("property_type"),
+            "mean price, 3+ beds, Kandy": lambda: index.group_by(
+                "property_type", "price", "mean", index.mask(district="Kandy", min_bedrooms=3)),
+            "filter only (price band)": lambda: int(index.mask(min_price=1_000_000, max_price=5_000_000).sum()),
+        }
+        print(f"\n{'query':<32}{'ms':>10}")
+        for name, query in queries.items():
+            took, _ = timed(query)
+            print(f"{name:<32}{took:>10.2f}")
+
+        took, listings = timed(storage.get_all_listings, repeat=1)
+        python_took, expected = timed(lambda: python_median_rent(listings), repeat=1)
+        print(f"{'python: load all listings':<32}{took:>10.2f}")
+        print(f"{'python: median rent by district':<32}{python_took:>10.2f}")
+        got = index.group_by("district", "price", "median", rentals())
+        assert got == {k: round(v, 2) for k, v in sorted(expected.items(), key=lambda kv: kv[1], reverse=True)}
+
+        rng = random.Random(7)
+        batch = [dict(listing, price=str(rng.randrange(20_000, 90_000))) for listing in listings[:500]]
+        storage.save_listings(batch)
+        took, changed = timed(lambda: columnar.build().__len__(), repeat=1)
+        print(f"\nIncremental refresh after 500 updates: {took:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare the serial scraper with the async crawl engine against the stub server.
+
+    python -m benchmarks.bench_crawl --target 100 --latency 0.2
+"""
+import time
+import argparse
+import tempfile
+from urllib.parse import urlparse
+from scraper import config, ratelimit
+from benchmarks.stub_server import start_stub_server
+
+
+def point_at(base_url, storage_dir):
+    """Redirect scraper config to the stub server and a scratch storage dir."""
+    config.BASE_URL = base_url
+    config.SEARCH_URL = f"{base_url}/en/ads/sri-lanka/property"
+    config.STORAGE_DIR = storage_dir
+    config.IMAGES_DIR = f"{storage_dir}/images"
+    config.BLOBS_DIR = f"{storage_dir}/blobs"
+    config.JSON_DIR = f"{storage_dir}/json"
+    config.DB_FILE = f"{storage_dir}/listings.db"
+    config.CHECKPOINT_FILE = f"{storage_dir}/crawl_checkpoint.json"
+    config.HTTP_CACHE_FILE = f"{storage_dir}/http_cache.db"
+    config.ARCHIVE_DIR = f"{storage_dir}/archive"
+    config.THUMBS_DIR = f"{storage_dir}/thumbs"
+    config.COLUMNAR_DIR = f"{storage_dir}/columnar"
+    config.EXPORT_DIR = f"{storage_dir}/exports"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated server latency")
+    parser.add_argument("--delay", type=float, default=0.1, help="seconds between requests in the serial run")
+    parser.add_argument("--concurrency", type=int, default=config.CRAWL_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=20.0, help="request budget for the async run")
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    # Every mode should pay for the network, not read the previous run's pages
+    config.HTTP_CACHE_ENABLED = False
+
+    from scraper.scraper import run_scraper
+    from scraper.crawler import run_async_scraper
+    from scraper.pipeline import run_pipeline
+
+    server, base_url = start_stub_server(latency=args.latency)
+    host = urlparse(base_url).netloc
+    results = {}
+    try:
+        if not args.skip_serial:
+            with tempfile.TemporaryDirectory() as tmp:
+                point_at(base_url, tmp)
+                ratelimit.get_limiter().configure(host, 1 / args.delay, burst=1)
+                started = time.perf_counter()
+                saved = run_scraper(target_count=args.target)
+                results["serial"] = (saved, time.perf_counter() - started)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            point_at(base_url, tmp)
+            started = time.perf_counter()
+            stats = run_async_scraper(target_count=args.target, concurrency=args.concurrency, rate=args.rate)
+            results["async"] = (stats["saved"], time.perf_counter() - started)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            point_at(base_url, tmp)
+            ratelimit.get_limiter().configure(host, args.rate, burst=args.concurrency)
+            started = time.perf_counter()
+            report = run_pipeline(target_count=args.target, fetch_workers=args.concurrency)
+            results["pipeline"] = (report["saved"], time.perf_counter() - started)
+    finally:
+        server.shutdown()
+
+    print(f"\n{'mode':<10}{'saved':>8}{'seconds':>10}{'listings/s':>12}")
+    for mode, (saved, elapsed) in results.items():
+        print(f"{mode:<10}{saved:>8}{elapsed:>10.2f}{saved / elapsed:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Time near-duplicate detection on a synthetic store with planted reposts.
+
+A fraction of the listings are reposts of an earlier one with a few words
+of the title and description changed. Measures save_listings with and
+without the LSH check, cluster_store over the whole store, how many planted
+reposts were found, and what comparing every pair of signatures would cost
+(timed on a sample and extrapolated).
+
+    python -m benchmarks.bench_dedupe --listings 20000
+"""
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+from scraper import config, db, dedupe, storage
+from benchmarks import synthetic_pages
+from benchmarks.bench_crawl import point_at
+
+
+def make_listings(n, repost_rate, rng):
+    listings = []
+    originals = {}
+    for i in range(n):
+        if listings and rng.random() < repost_rate:
+            source = rng.choice(listings)
+            words = source["description"].split()
+            for _ in range(max(1, len(words) // 30)):
+                words[rng.randrange(len(words))] = rng.choice(synthetic_pages.WORDS)
+            listing = {**source, "listing_id": f"bench-{i}", "description": " ".join(words),
+                       "title": source["title"] + " " + rng.choice(["urgent", "new", "reduced"])}
+            originals[listing["listing_id"]] = originals.get(source["listing_id"], source["listing_id"])
+        else:
+            listing = {
+                "listing_id": f"bench-{i}",
+                "title": " ".join(rng.choices(synthetic_pages.WORDS, k=7)).title(),
+                "description": " ".join(rng.choices(synthetic_pages.WORDS, k=rng.randint(60, 200))),
+                "price": float(rng.randrange(20_000, 500_000, 500)),
+                "location": f"{rng.choice(synthetic_pages.DISTRICTS)}, {rng.choice(synthetic_pages.CATEGORIES)}",
+            }
+        listings.append(listing)
+    return listings, originals
+
+
+def timed_save(listings, enabled, batch=1):
+    config.DEDUPE_ENABLED = enabled
+    started = time.perf_counter()
+    for start in range(0, len(listings), batch):
+        storage.save_listings(listings[start:start + batch])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=20_000)
+    parser.add_argument("--reposts", type=float, default=0.1, help="fraction of listings that are reposts")
+    parser.add_argument("--sample", type=int, default=2000, help="listings in the all-pairs timing sample")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    listings, originals = make_listings(args.listings, args.reposts, rng)
+    tail = listings[-1000:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        point_at("http://127.0.0.1:9", tmp)
+        storage.init_storage()
+        storage.save_listings(listings[:-1000])
+        plain = timed_save(tail, False)
+        with_lsh = timed_save(tail, True)
+
+        started = time.perf_counter()
+        signed, duplicates, clusters = dedupe.cluster_store()
+        cluster_took = time.perf_counter() - started
+
+        roots = dict(db.connect().execute("SELECT listing_id, duplicate_of FROM minhash"))
+        found = sum(roots.get(listing_id) == root for listing_id, root in originals.items())
+        false = sum(1 for listing_id, root in roots.items() if root and listing_id not in originals)
+
+        signatures = np.stack([dedupe.signature(l) for l in listings[:args.sample]])
+        started = time.perf_counter()
+        for i in range(len(signatures) - 1):
+            dedupe.similarity(signatures[i], signatures[i + 1:])
+        pairs_took = time.perf_counter() - started
+        pairs_estimate = pairs_took * (args.listings / args.sample) ** 2
+
+    print(f"{args.listings} listings, {len(originals)} planted reposts")
+    print(f"{'save_listings, 1000 singly':<36}{plain * 1000:>10.1f} ms without LSH check")
+    print(f"{'':<36}{with_lsh * 1000:>10.1f} ms with LSH check "
+          f"({(with_lsh - plain) / len(tail) * 1000:.2f} ms/listing)")
+    print(f"{'cluster_store':<36}{cluster_took * 1000:>10.1f} ms  "
+          f"({signed} signed, {duplicates} duplicates, {clusters} clusters)")
+    print(f"{'all-pairs signature compare':<36}{pairs_estimate * 1000:>10.1f} ms  "
+          f"(extrapolated from {args.sample} listings)")
+    print(f"planted reposts found: {found}/{len(originals)}, other listings flagged: {false}")
+
+
+if __name__ == "__main__":
+    main()
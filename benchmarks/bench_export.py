@@ -0,0 +1,59 @@
+"""
+Measure export time and peak Python memory at two store sizes.
+
+Peak memory (tracemalloc) should stay flat as the store grows, since only one
+chunk of listings is held at a time. For comparison the "dataframe" line
+loads every listing into pandas first, the way init_excel-style code would.
+tracemalloc slows allocation-heavy code, so the times are inflated (openpyxl
+most of all); compare them with each other rather than with a plain run.
+
+    python -m benchmarks.bench_export --small 5000 --large 20000
+"""
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import pandas as pd
+from scraper import config
+from benchmarks.load_server import build_store
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    took = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return took, peak / 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--small", type=int, default=5_000)
+    parser.add_argument("--large", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        from scraper import export, storage
+        formats = [fmt for fmt in export.FORMATS if fmt != "parquet" or export.pa is not None]
+        print(f"{'listings':>9}  {'export':<14}{'seconds':>9}{'peak MB':>9}{'file MB':>9}")
+        for count in (args.small, args.large):
+            build_store(tmp, count, with_images=0)
+            config.EXPORT_DIR = os.path.join(tmp, "exports")
+            for fmt in formats:
+                path = os.path.join(tmp, f"out.{fmt}")
+                took, peak, _ = measure(lambda: export.export(fmt, path=path))
+                print(f"{count:>9}  {fmt:<14}{took:>9.2f}{peak:>9.1f}{os.path.getsize(path) / 1e6:>9.1f}")
+            path = os.path.join(tmp, "frame.csv")
+            took, peak, _ = measure(lambda: pd.DataFrame(storage.get_all_listings()).to_csv(path, index=False))
+            print(f"{count:>9}  {'dataframe csv':<14}{took:>9.2f}{peak:>9.1f}{os.path.getsize(path) / 1e6:>9.1f}")
+
+        storage.save_listings([dict(listing, title="changed") for listing in storage.get_all_listings()[:100]])
+        took, peak, (_, written) = measure(lambda: export.export("csv", incremental=True))
+        print(f"\nIncremental csv after 100 updates: {written} rows in {took:.2f}s, peak {peak:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Re-crawl cost with the HTTP cache: cold, warm (within TTL) and revalidated
+(TTL expired, server answers 304) against the stub server.
+
+    python -m benchmarks.bench_http_cache --target 60 --latency 0.1
+"""
+import os
+import time
+import argparse
+import tempfile
+from urllib.parse import urlparse
+from scraper import config, ratelimit, httpcache
+from benchmarks.stub_server import start_stub_server
+from benchmarks.bench_crawl import point_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--target", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.1, help="simulated server latency")
+    parser.add_argument("--rate", type=float, default=10.0, help="requests per second to the stub")
+    args = parser.parse_args()
+
+    from scraper.scraper import run_scraper
+
+    server, base_url = start_stub_server(latency=args.latency)
+    ratelimit.get_limiter().configure(urlparse(base_url).netloc, args.rate, burst=1)
+    config.HTTP_CACHE_ENABLED = True
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_file = os.path.join(tmp, "http_cache.db")
+            for name, ttl in (("cold", None), ("warm", None), ("revalidate", {"search": 0, "detail": 0})):
+                # A fresh listings store each pass so every page is requested again
+                point_at(base_url, os.path.join(tmp, name))
+                config.HTTP_CACHE_FILE = cache_file
+                cache = httpcache.get_cache()
+                if ttl is not None:
+                    cache.ttl = ttl
+                before = dict(cache.counters)
+                started = time.perf_counter()
+                saved = run_scraper(target_count=args.target)
+                elapsed = time.perf_counter() - started
+                delta = {k: cache.counters[k] - before[k] for k in before}
+                results.append((name, saved, elapsed, delta))
+            stats = httpcache.get_cache().stats()
+    finally:
+        server.shutdown()
+
+    print(f"\n{'pass':<12}{'saved':>7}{'seconds':>9}{'hits':>7}{'304s':>7}{'misses':>8}{'bytes saved':>14}")
+    for name, saved, elapsed, d in results:
+        print(f"{name:<12}{saved:>7}{elapsed:>9.2f}{d['hits']:>7}{d['revalidated']:>7}{d['misses']:>8}"
+              f"{d['bytes_saved']:>14}")
+    print(f"\ncache: {stats['entries']} entries, {stats['stored_bytes']} bytes on disk "
+          f"({stats['compression_ratio']}x compression)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Cross-check and time the window.initialData extractors on the saved fixtures.
+
+    python -m benchmarks.bench_initial_data --repeat 20
+"""
+import os
+import time
+import argparse
+from scraper import initial_data, scrape_listings
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper")
+FIXTURES = ["ikman_property.html", "ikman_detail.html", "debug_page.html"]
+
+
+def best_of(func, html, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<22}{'soup ms':>10}{'fast ms':>10}{'speedup':>10}  match")
+    for name in FIXTURES:
+        with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+            html = f.read()
+
+        match = initial_data.extract_initial_data(html) == scrape_listings.extract_initial_data_soup(html)
+        slow = best_of(scrape_listings.extract_initial_data_soup, html, args.repeat)
+        fast = best_of(initial_data.extract_initial_data, html, args.repeat)
+        print(f"{name:<22}{slow * 1000:>10.2f}{fast * 1000:>10.2f}{slow / fast:>9.1f}x  {'yes' if match else 'NO'}")
+        if not match:
+            raise SystemExit(f"Extractors disagree on {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Time the field normalizer on synthetic raw listings.
+
+Compares normalize_listing in a loop with the bulk column mode
+(normalize_records, normalize_frame) and checks they agree field for field.
+
+    python -m benchmarks.bench_normalize --listings 100000
+"""
+import time
+import random
+import argparse
+import pandas as pd
+from scraper import normalize
+
+
+def raw_listings(count, seed=42):
+    """Listings shaped like the parsers' output: strings everywhere."""
+    rng = random.Random(seed)
+    listings = []
+    for i in range(count):
+        kind = rng.random()
+        listing = {"listing_id": f"synthetic-{i}"}
+        if kind < 0.4:
+            listing["price"] = f"{rng.randrange(15_000, 500_000, 500)} /month"
+            listing["bedrooms"] = rng.choice(["1", "2", "3", "4", "10+"])
+            listing["bathrooms"] = str(rng.randint(1, 4))
+            listing["area"] = f"{rng.randrange(500, 4000):,}.0 sqft"
+            listing["area_sqft"] = listing["area"].replace("sqft", "").strip()
+        elif kind < 0.7:
+            listing["price"] = f"{rng.randrange(100_000, 5_000_000, 1000)} per perch"
+            listing["area"] = f"{rng.randrange(5, 80)}.0 perches"
+        elif kind < 0.95:
+            listing["price"] = str(rng.randrange(5_000_000, 200_000_000, 10_000))
+            listing["bedrooms"] = str(rng.randint(1, 6))
+            listing["bathrooms"] = str(rng.randint(1, 5))
+            listing["area_sqft"] = float(rng.randrange(800, 6000))
+        else:
+            listing["price"] = rng.choice(["Negotiable", "", "2.5 Mn", "5000 /night"])
+        listings.append(listing)
+    return listings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=100_000)
+    args = parser.parse_args()
+    listings = raw_listings(args.listings)
+
+    started = time.perf_counter()
+    expected = [normalize.normalize_listing(listing) for listing in listings]
+    loop_took = time.perf_counter() - started
+
+    started = time.perf_counter()
+    got = normalize.normalize_records(listings)
+    bulk_took = time.perf_counter() - started
+    assert got == expected
+
+    frame = pd.DataFrame(listings)
+    started = time.perf_counter()
+    normalize.normalize_frame(frame)
+    frame_took = time.perf_counter() - started
+
+    started = time.perf_counter()
+    again = [normalize.normalize_listing(listing) for listing in expected]
+    idempotent_took = time.perf_counter() - started
+    assert again == expected
+
+    print(f"{args.listings} listings")
+    print(f"{'normalize_listing loop':<32}{loop_took * 1000:>10.1f} ms")
+    print(f"{'normalize_records':<32}{bulk_took * 1000:>10.1f} ms")
+    print(f"{'normalize_frame (DataFrame)':<32}{frame_took * 1000:>10.1f} ms")
+    print(f"{'re-run on typed listings':<32}{idempotent_took * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
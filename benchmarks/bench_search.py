@@ -0,0 +1,110 @@
+"""
+Time full-text search against a linear scan on a synthetic store.
+
+Fills a scratch store with listings whose text mixes filler words with a few
+place and university names, then times storage.search_listings for a set of
+queries against the old way of finding them: loading every stored listing
+and checking its text for the words. Also times the save_listings cost of
+keeping the index up to date and a full rebuild.
+
+    python -m benchmarks.bench_search --listings 100000
+"""
+import time
+import random
+import argparse
+import tempfile
+from scraper import config, storage, search
+from benchmarks import synthetic_pages
+from benchmarks.bench_crawl import point_at
+
+PLACES = ["Moratuwa", "Katubedda", "Nugegoda", "Maharagama", "Peradeniya", "Kelaniya", "Dehiwala", "Malabe",
+          "Kottawa", "Piliyandala", "Battaramulla", "Rajagiriya", "Wattala", "Negombo", "Panadura", "Homagama",
+          "Kadawatha", "Ja-Ela", "Kiribathgoda", "Boralesgamuwa", "Pannipitiya", "Athurugiriya", "Kandana", "Ragama"]
+UNIVERSITIES = ["University of Moratuwa", "University of Peradeniya", "University of Kelaniya",
+                "University of Colombo", "SLIIT"]
+
+QUERIES = [
+    "annex near Moratuwa university",
+    "furnished apartment Nugegoda",
+    "luxury house garden view",
+    "Peradeniya",
+    "quiet annex Katubedda parking",
+]
+
+
+# Listing text draws on a large vocabulary with a few very common words
+# (Zipf-like), so queries match a realistic share of the store
+VOCABULARY = synthetic_pages.WORDS + [f"w{n}" for n in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def make_listing(i, rng):
+    place = rng.choice(PLACES)
+    words = rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(40, 120))
+    words.insert(rng.randrange(len(words)), f"near {place}")
+    return {
+        "listing_id": f"bench-{i}",
+        "title": f"{rng.choice(['Annex', 'House', 'Apartment', 'Room'])} for rent in {place}",
+        "description": " ".join(words),
+        "price": float(rng.randrange(15_000, 300_000, 500)),
+        "location": f"{place}, {rng.choice(synthetic_pages.CATEGORIES)}",
+        "amenities": rng.sample(["Parking", "Hot water", "Air conditioning", "Garden", "Furnished"], 2),
+        "nearest_university": rng.choice(UNIVERSITIES),
+    }
+
+
+def linear_scan(text, limit):
+    """Every listing whose text contains every word of the query (no ranking)."""
+    words = [w.lower() for w in search.TOKEN.findall(text)]
+    found = []
+    for listing in storage.get_all_listings():
+        haystack = " ".join(search.document(listing)).lower()
+        if all(w in haystack for w in words):
+            found.append(listing)
+    return found[:limit]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=config.API_PAGE_SIZE)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    listings = [make_listing(i, rng) for i in range(args.listings)]
+    config.DEDUPE_ENABLED = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        point_at("http://127.0.0.1:9", tmp)
+        storage.init_storage()
+        started = time.perf_counter()
+        for start in range(0, len(listings), 1000):
+            storage.save_listings(listings[start:start + 1000])
+        indexed_save = time.perf_counter() - started
+
+        started = time.perf_counter()
+        search.rebuild()
+        rebuild_took = time.perf_counter() - started
+
+        print(f"{args.listings} listings: saved with index updates in {indexed_save:.1f}s, "
+              f"full rebuild {rebuild_took:.1f}s")
+        print(f"{'query':<36}{'search':>12}{'matched':>9}{'linear scan':>14}")
+        for query in QUERIES:
+            took, (found, _, matched) = best_of(lambda: storage.search_listings(query, limit=args.limit),
+                                                args.repeat)
+            scan_took, _ = best_of(lambda: linear_scan(query, args.limit), 1)
+            print(f"{query:<36}{took * 1000:>9.1f} ms{matched:>9}{scan_took * 1000:>11.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
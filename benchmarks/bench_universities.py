@@ -0,0 +1,78 @@
+"""
+Time the nearest-university pass over synthetic listing locations.
+
+Compares universities.resolve (unique locations, vectorised haversine) with
+a per-listing loop using math.* over the same gazetteer, and checks both
+pick the same university.
+
+    python -m benchmarks.bench_universities --listings 100000
+"""
+import math
+import time
+import random
+import argparse
+from scraper import universities
+
+
+def naive(locations):
+    results = []
+    for location in locations:
+        point = universities.coordinates(location)
+        if point is None:
+            results.append((None, None))
+            continue
+        lat1, lon1 = map(math.radians, point)
+        best = None
+        for name, lat, lon in universities.UNIVERSITIES:
+            lat2, lon2 = math.radians(lat), math.radians(lon)
+            a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+            km = 2 * universities.EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+            if best is None or km < best[1]:
+                best = (name, km)
+        results.append((best[0], round(best[1], 1)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    towns = [name.title() for name in universities.LOCATIONS]
+    districts = ["Colombo", "Gampaha", "Kandy", "Galle", "Kurunegala", "Kalutara"]
+    categories = ["House Rentals", "Houses For Sale", "Land For Sale", "Apartments For Sale"]
+    locations = []
+    for _ in range(args.listings):
+        kind = rng.random()
+        if kind < 0.5:
+            locations.append(f"{rng.choice(towns)}, {rng.choice(districts)}")  # detail page l3, l1
+        elif kind < 0.95:
+            locations.append(f"{rng.choice(districts)}, {rng.choice(categories)}")  # search card
+        else:
+            locations.append(f"Colombo {rng.randint(1, 15)}")
+
+    started = time.perf_counter()
+    expected = naive(locations)
+    naive_took = time.perf_counter() - started
+
+    started = time.perf_counter()
+    got = universities.resolve(locations)
+    took = time.perf_counter() - started
+    assert got == expected
+
+    lats = [rng.uniform(5.9, 9.8) for _ in range(args.listings)]
+    lons = [rng.uniform(79.7, 81.9) for _ in range(args.listings)]
+    started = time.perf_counter()
+    universities.nearest(lats, lons)
+    points_took = time.perf_counter() - started
+
+    print(f"{args.listings} listings, {len(set(locations))} distinct locations, "
+          f"{len(universities.UNIVERSITIES)} universities")
+    print(f"{'per-listing math loop':<36}{naive_took * 1000:>10.1f} ms")
+    print(f"{'resolve (unique + vectorised)':<36}{took * 1000:>10.1f} ms")
+    print(f"{'nearest, every point distinct':<36}{points_took * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Check every installed parser backend produces exactly the html.parser output
+on the saved fixtures, and time each one.
+
+    python -m benchmarks.check_parser_backends
+
+Exits non-zero if any backend disagrees, so it can gate a PARSER_BACKEND change.
+"""
+import os
+import sys
+import time
+import argparse
+from scraper import parsers, html_backends
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper")
+FIXTURES = ["ikman_property.html", "ikman_detail.html", "debug_page.html"]
+REFERENCE = "html.parser"
+
+
+def run(backend, html):
+    return (
+        parsers.parse_search_page(html, backend=backend),
+        parsers.parse_detail_page(html, "https://ikman.lk/en/ad/fixture", backend=backend),
+    )
+
+
+def timed(backend, html, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run(backend, html)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def diff(expected, actual):
+    """Describe the first difference between two parser outputs."""
+    for label, exp, act in zip(("search", "detail"), expected, actual):
+        if exp == act:
+            continue
+        if isinstance(exp, list) and len(exp) != len(act):
+            return f"{label}: {len(exp)} listings vs {len(act)}"
+        pairs = zip(exp, act) if isinstance(exp, list) else [(exp, act)]
+        for e, a in pairs:
+            for key in sorted(set(e) | set(a)):
+                if e.get(key) != a.get(key):
+                    return f"{label}[{key}]: {e.get(key)!r:.80} vs {a.get(key)!r:.80}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backends = html_backends.available_backends()
+    print(f"Installed backends: {', '.join(backends)}\n")
+    failures = 0
+
+    for name in FIXTURES:
+        with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+            html = f.read()
+        expected = run(REFERENCE, html)
+        reference_time = timed(REFERENCE, html, args.repeat)
+
+        for backend in backends:
+            problem = None if backend == REFERENCE else diff(expected, run(backend, html))
+            elapsed = reference_time if backend == REFERENCE else timed(backend, html, args.repeat)
+            status = "ok" if problem is None else f"MISMATCH {problem}"
+            failures += problem is not None
+            print(f"{name:<22}{backend:<13}{elapsed * 1000:>9.1f} ms {reference_time / elapsed:>6.1f}x  {status}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
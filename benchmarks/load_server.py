@@ -0,0 +1,141 @@
+"""
+Load-test the listings server against a synthetic 10k-listing store.
+
+Each scenario hammers one URL from several client threads and reports
+requests/second and bytes on the wire. "plain" requests send no validators
+and accept no compression (what every request cost before ETags and gzip);
+"gzip" and "304" show the same URLs with compression and revalidation.
+
+    python -m benchmarks.load_server --listings 10000 --seconds 3 --clients 4
+"""
+import os
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import requests
+from scraper import config
+
+
+def build_store(storage_dir, count, with_images=50):
+    """Fill a scratch store with synthetic listings (and a few stored images)."""
+    config.STORAGE_DIR = storage_dir
+    config.IMAGES_DIR = f"{storage_dir}/images"
+    config.BLOBS_DIR = f"{storage_dir}/blobs"
+    config.JSON_DIR = f"{storage_dir}/json"
+    config.DB_FILE = f"{storage_dir}/listings.db"
+
+    from scraper import storage, images
+    storage.init_storage()
+    rng = random.Random(42)
+    districts = ["Colombo", "Gampaha", "Kandy", "Galle", "Kurunegala", "Kalutara"]
+    categories = ["House Rentals", "Houses For Sale", "Land For Sale", "Apartments For Sale"]
+    batch = []
+    for i in range(count):
+        listing_id = f"synthetic-{i}"
+        batch.append({
+            "listing_id": listing_id,
+            "source_url": f"https://ikman.lk/en/ad/synthetic-listing-{i}",
+            "title": f"Synthetic listing {i} in {rng.choice(districts)}",
+            "price": str(rng.randrange(20_000, 90_000_000, 500)),
+            "currency": "LKR",
+            "location": f"{rng.choice(districts)}, {rng.choice(categories)}",
+            "bedrooms": str(rng.randint(1, 6)),
+            "bathrooms": str(rng.randint(1, 4)),
+            "description": " ".join(rng.choice(["spacious", "quiet", "road", "garden", "tiled", "near",
+                                                "school", "bus", "route", "parking"]) for _ in range(80)),
+            "image_urls": [f"https://i.ikman-st.com/synthetic/{i}/{k}.jpg" for k in range(3)],
+            "image_folder": "",
+            "scraped_date": "2026-01-01 00:00:00",
+        })
+        if len(batch) >= 1000:
+            storage.save_listings(batch)
+            batch = []
+    storage.save_listings(batch)
+
+    for i in range(with_images):
+        data = os.urandom(30_000)
+        tmp = os.path.join(config.BLOBS_DIR, f".{i}.part")
+        os.makedirs(config.BLOBS_DIR, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        blob = images.store_file(tmp, hashlib.sha256(data).hexdigest(), "jpg")
+        listing_dir = os.path.join(config.IMAGES_DIR, f"synthetic-{i}")
+        os.makedirs(listing_dir, exist_ok=True)
+        images.save_manifest(listing_dir, f"synthetic-{i}", [{
+            "url": f"https://i.ikman-st.com/synthetic/{i}/0.jpg", "file": "image_1.jpg",
+            "blob": blob, "size": len(data), "status": "ok",
+        }])
+
+
+def hammer(url, headers, seconds, clients):
+    """Requests/second and average wire bytes for url over seconds."""
+    counts = [0] * clients
+    wire = [0] * clients
+    statuses = set()
+    deadline = time.perf_counter() + seconds
+
+    def client(n):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            response = session.get(url, headers=headers)
+            statuses.add(response.status_code)
+            counts[n] += 1
+            wire[n] += int(response.headers.get("Content-Length", len(response.content)))
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    total = sum(counts)
+    return total / seconds, sum(wire) / max(total, 1), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--listings", type=int, default=10_000)
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each scenario")
+    parser.add_argument("--clients", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        build_store(tmp, args.listings)
+        print(f"Built {args.listings} synthetic listings in {time.perf_counter() - started:.1f}s")
+
+        from werkzeug.serving import make_server
+        from server.app import app
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        urls = {
+            "index": f"{base}/",
+            "api page": f"{base}/api/listings?limit=50",
+            "api filtered": f"{base}/api/listings?limit=50&location=Kandy&min_price=1000000",
+            "image": f"{base}/images/synthetic-0/image_1.jpg",
+        }
+        print(f"\n{'scenario':<28}{'req/s':>10}{'bytes/req':>12}  status")
+        try:
+            for name, url in urls.items():
+                first = requests.get(url, headers={"Accept-Encoding": "gzip"})
+                etag = first.headers.get("ETag")
+                scenarios = [
+                    ("plain", {"Accept-Encoding": "identity"}),
+                    ("gzip", {"Accept-Encoding": "gzip"}),
+                    ("304", {"Accept-Encoding": "gzip", "If-None-Match": etag}),
+                ]
+                for label, headers in scenarios:
+                    if label == "gzip" and name == "image":
+                        continue
+                    rps, size, statuses = hammer(url, headers, args.seconds, args.clients)
+                    print(f"{name + ' (' + label + ')':<28}{rps:>10.1f}{size:>12.0f}  {sorted(statuses)}")
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Local stand-in for ikman.lk built from the saved fixtures.
+
+Search pages serve scraper/ikman_property.html with every ad link made unique
+per page, detail pages serve scraper/debug_page.html, and image URLs are
+pointed back at the stub so nothing leaves the machine. Pages carry an ETag
+and answer a matching If-None-Match with 304.
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper")
+SEARCH_FIXTURE = os.path.join(FIXTURES_DIR, "ikman_property.html")
+DETAIL_FIXTURE = os.path.join(FIXTURES_DIR, "debug_page.html")
+IMAGE_BYTES = b"\xff\xd8\xff\xe0" + b"\0" * 20_000
+
+AD_LINK = re.compile(r'href="/en/ad/([^"]+)"')
+IMAGE_HOST = "https://i.ikman-st.com/"
+
+
+def load_fixture(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    search_html = ""
+    detail_html = b""
+    max_pages = 100
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, content_type="text/html; charset=utf-8", status=200):
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = urlparse(self.path)
+        if parsed.path.startswith("/en/ads/"):
+            page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+            if page > self.max_pages:
+                return self._send(b"<html><body></body></html>")
+            counter = iter(range(10_000))
+            html = AD_LINK.sub(lambda m: f'href="/en/ad/{m.group(1)}-p{page}x{next(counter)}"', self.search_html)
+            html = html.replace(IMAGE_HOST, f"http://{self.headers['Host']}/img/")
+            return self._send(html.encode("utf-8"))
+        if parsed.path.startswith("/en/ad/"):
+            return self._send(self.detail_html)
+        if parsed.path.startswith("/img/"):
+            return self._send(IMAGE_BYTES, content_type="image/jpeg")
+        self._send(b"not found", status=404)
+
+
+def start_stub_server(port=0, latency=0.0, max_pages=100):
+    """Start the stub server in a daemon thread. Returns (server, base_url)."""
+    handler = type("Handler", (StubHandler,), {
+        "search_html": load_fixture(SEARCH_FIXTURE),
+        "detail_html": load_fixture(DETAIL_FIXTURE).encode("utf-8"),
+        "latency": latency,
+        "max_pages": max_pages,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the saved ikman fixtures locally")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--max-pages", type=int, default=100)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.port, args.latency, args.max_pages)
+    print(f"Stub server on {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,276 @@
+"""
+Offline benchmark suite: parsers, storage and an end-to-end crawl.
+
+Every case runs against the saved fixtures (scraper/*.html), synthetic pages
+(benchmarks/synthetic_pages.py), a scratch store or the local stub server, so
+nothing touches ikman.lk. Each case reports ops/second (items per second for
+batch operations), mean time per call and the peak Python allocation of one
+call (tracemalloc, measured in a separate call so it does not skew timing).
+
+Results are written as JSON so runs on different commits can be compared:
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only parse --compare benchmarks/results/<earlier>.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import itertools
+import tempfile
+import subprocess
+import tracemalloc
+from scraper import config, html_backends, initial_data, parsers, ratelimit, scrape_listings
+from benchmarks import synthetic_pages
+from benchmarks.bench_crawl import point_at
+from benchmarks.stub_server import FIXTURES_DIR, start_stub_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+CASES = {}
+
+
+def case(name, repeat=None):
+    """Register setup(ctx) -> (op, items_per_call) under name.
+
+    repeat=1 marks cases too slow to loop (they run once for time, once for memory).
+    """
+    def register(setup):
+        CASES[name] = (setup, repeat)
+        return setup
+    return register
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+# Parsers
+
+@case("parse_search_page[fixture]")
+def _(ctx):
+    html = fixture("ikman_property.html")
+    return lambda: parsers.parse_search_page(html), 1
+
+
+@case("parse_search_page[synthetic-100ads]")
+def _(ctx):
+    html = synthetic_pages.search_page(ads=100)
+    return lambda: parsers.parse_search_page(html), 1
+
+
+@case("parse_detail_page[fixture]")
+def _(ctx):
+    html = fixture("debug_page.html")
+    return lambda: parsers.parse_detail_page(html, "https://ikman.lk/en/ad/fixture"), 1
+
+
+@case("parse_detail_page[synthetic]")
+def _(ctx):
+    html = synthetic_pages.detail_page()
+    return lambda: parsers.parse_detail_page(html, "https://ikman.lk/en/ad/synthetic"), 1
+
+
+@case("extract_initial_data[search-fixture]")
+def _(ctx):
+    html = fixture("ikman_property.html")
+    return lambda: initial_data.extract_initial_data(html), 1
+
+
+@case("extract_initial_data[detail-fixture]")
+def _(ctx):
+    html = fixture("debug_page.html")
+    return lambda: initial_data.extract_initial_data(html), 1
+
+
+@case("extract_initial_data[synthetic-2MB]")
+def _(ctx):
+    html = synthetic_pages.detail_page(filler_kb=2048)
+    return lambda: initial_data.extract_initial_data(html), 1
+
+
+@case("parse_ad_data[fixture]")
+def _(ctx):
+    data = initial_data.extract_initial_data(fixture("debug_page.html"))
+    return lambda: scrape_listings.parse_ad_data(data, "https://ikman.lk/en/ad/fixture"), 1
+
+
+# Storage
+
+def _listing(i):
+    return {
+        "listing_id": f"bench-{i}",
+        "source_url": f"https://ikman.lk/en/ad/bench-{i}",
+        "title": f"Bench listing {i}",
+        "price": 85000.0,
+        "location": "Colombo, House Rentals",
+        "bedrooms": 3,
+        "bathrooms": 2,
+        "description": " ".join(synthetic_pages.WORDS * 10),
+        "image_urls": [f"https://i.ikman-st.com/bench/{i}/{k}.jpg" for k in range(5)],
+    }
+
+
+@case("save_listing")
+def _(ctx):
+    from scraper import storage
+    storage.init_storage()
+    ids = itertools.count()
+    return lambda: storage.save_listing(_listing(next(ids))), 1
+
+
+@case("get_all_listings[2000]")
+def _(ctx):
+    from scraper import storage
+    storage.init_storage()
+    existing = len(storage.get_existing_ids())
+    storage.save_listings([_listing(i) for i in range(existing, 2000)])
+    return storage.get_all_listings, max(existing, 2000)
+
+
+# End to end
+
+@case("end_to_end[pipeline]", repeat=1)
+def _(ctx):
+    from scraper.pipeline import run_pipeline
+    server, base_url = ctx["server"]()
+    host = base_url.split("//", 1)[1]
+    target = ctx["e2e_target"]
+
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            point_at(base_url, tmp)
+            ratelimit.get_limiter().configure(host, 1000, burst=50)
+            report = run_pipeline(target_count=target)
+            point_at(base_url, ctx["storage_dir"])
+            return report
+    return run, target
+
+
+def run_case(op, items, min_time, repeat=None):
+    op()  # warm-up: imports, caches, connections
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        op()
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if repeat is not None and runs >= repeat:
+            break
+        if repeat is None and elapsed >= min_time and runs >= 3:
+            break
+
+    tracemalloc.start()
+    op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ops_per_sec": round(runs * items / elapsed, 2),
+        "mean_ms": round(elapsed / runs * 1000, 3),
+        "items_per_call": items,
+        "runs": runs,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def environment():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, timeout=30,
+                                  cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    backend = config.PARSER_BACKEND
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parser_backend": html_backends.available_backends()[0] if backend == "auto" else backend,
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Print throughput/memory changes against an earlier results file. Returns regressed case names."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline_path} (commit {baseline['environment']['commit']}):")
+    print(f"{'case':<42}{'ops/s':>9}{'memory':>9}")
+    regressed = []
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        speed = result["ops_per_sec"] / old["ops_per_sec"] - 1
+        memory = result["peak_kb"] / old["peak_kb"] - 1 if old["peak_kb"] else 0.0
+        flag = ""
+        if speed < -threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:<42}{speed:>+9.1%}{memory:>+9.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=None, help="run cases whose name contains this text")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to loop each case")
+    parser.add_argument("--e2e-target", type=int, default=50, help="listings in the end-to-end crawl")
+    parser.add_argument("--backend", default=None, help="override config.PARSER_BACKEND")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown flagged as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if any case regressed")
+    args = parser.parse_args()
+
+    if args.backend:
+        config.PARSER_BACKEND = args.backend
+    # Per-listing INFO lines would dominate the storage cases and bury the report
+    logging.getLogger().setLevel(logging.WARNING)
+    config.HTTP_CACHE_ENABLED = False
+    config.ARCHIVE_ENABLED = False
+
+    selected = {name: spec for name, spec in CASES.items() if not args.only or args.only in name}
+    results = {}
+    servers = []
+
+    def server():
+        if not servers:
+            servers.append(start_stub_server())
+        return servers[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        point_at("http://127.0.0.1:9", tmp)
+        ctx = {"storage_dir": tmp, "server": server, "e2e_target": args.e2e_target}
+        print(f"{'case':<42}{'ops/s':>12}{'mean ms':>11}{'peak KB':>11}")
+        try:
+            for name, (setup, repeat) in selected.items():
+                op, items = setup(ctx)
+                result = run_case(op, items, args.min_time, repeat)
+                results[name] = result
+                print(f"{name:<42}{result['ops_per_sec']:>12.1f}{result['mean_ms']:>11.2f}{result['peak_kb']:>11.0f}")
+        finally:
+            for stub, _ in servers:
+                stub.shutdown()
+
+    env = environment()
+    path = args.output or os.path.join(RESULTS_DIR, f"{env['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": env, "args": vars(args), "results": results}, f, indent=2)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        regressed = compare(results, args.compare, args.threshold)
+        if regressed and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Synthetic ikman-style pages of a chosen size.
+
+The saved fixtures are single data points; these generators make search and
+detail pages that the real parsers accept (same selectors, same
+window.initialData shape) with a configurable number of ads, description
+length and JSON payload, so parse costs can be measured as pages grow.
+"""
+import json
+import random
+from scraper import config
+
+WORDS = ["spacious", "quiet", "road", "garden", "tiled", "near", "school", "bus", "route", "parking",
+         "apartment", "house", "annex", "furnished", "luxury", "view", "kitchen", "bedroom", "water", "power"]
+DISTRICTS = ["Colombo", "Gampaha", "Kandy", "Galle", "Kurunegala", "Kalutara"]
+CATEGORIES = ["House Rentals", "Houses For Sale", "Land For Sale", "Apartment Rentals"]
+
+
+def _cls(selector):
+    """'li.normal--2QYVk' -> ('li', 'normal--2QYVk')."""
+    tag, _, cls = config.SELECTORS[selector].partition(".")
+    return tag, cls
+
+
+def _initial_data(payload, filler_kb, rng):
+    """window.initialData script with filler to bring the JSON to roughly filler_kb."""
+    filler = [{"id": i, "slug": f"item-{i}", "name": " ".join(rng.choices(WORDS, k=8)),
+               "flags": {"isFeatured": i % 3 == 0, "isTop": False}} for i in range(filler_kb * 1024 // 120)]
+    data = {"locale": "en", "marketLocales": ["en", "si", "ta"], "locations": {"type": "NotAsked"},
+            "verticals": filler, **payload}
+    # Braces and quotes inside strings are what trip naive extractors
+    data["note"] = 'escaped "quotes" and {braces} in a string'
+    return f"<script>window.initialData = {json.dumps(data)};</script>"
+
+
+def search_page(ads=25, filler_kb=200, seed=0):
+    """A search results page with `ads` listing cards."""
+    rng = random.Random(seed)
+    item_tag, item_cls = _cls("listing_item")
+    _, link_cls = _cls("listing_link")
+    _, title_cls = _cls("listing_title")
+    _, price_cls = _cls("listing_price")
+    _, location_cls = _cls("listing_location")
+    _, image_cls = _cls("listing_image")
+    cards = []
+    for i in range(ads):
+        slug = f"synthetic-{seed}-{i}-{rng.randrange(10 ** 6)}"
+        title = " ".join(rng.choices(WORDS, k=6)).title()
+        price = f"Rs {rng.randrange(20_000, 500_000, 500):,} /month"
+        cards.append(
+            f'<{item_tag} class="{item_cls}"><a class="{link_cls}" href="/en/ad/{slug}">'
+            f'<img class="{image_cls}" src="https://i.ikman-st.com/{slug}/0.jpg">'
+            f'<h2 class="{title_cls}">{title}</h2>'
+            f'<div class="{location_cls}">{rng.choice(DISTRICTS)}, {rng.choice(CATEGORIES)}</div>'
+            f'<div class="{price_cls}">{price}</div></a></{item_tag}>'
+        )
+    serp = {"serp": {"ads": {"type": "Success", "data": {"ads": [{"id": str(i)} for i in range(ads)]}}}}
+    return (f"<html><head><title>Property</title>{_initial_data(serp, filler_kb, rng)}</head>"
+            f"<body><ul>{''.join(cards)}</ul></body></html>")
+
+
+def detail_page(description_words=300, images=8, filler_kb=400, seed=0):
+    """A detail page readable by both parse_detail_page and parse_ad_data."""
+    rng = random.Random(seed)
+    title = " ".join(rng.choices(WORDS, k=8)).title()
+    price = rng.randrange(20_000, 500_000, 500)
+    paragraphs = [" ".join(rng.choices(WORDS, k=50)) for _ in range(max(1, description_words // 50))]
+    bedrooms, bathrooms, size = rng.randint(1, 6), rng.randint(1, 4), rng.randrange(500, 4000)
+    attributes = {"Bedrooms": bedrooms, "Bathrooms": bathrooms, "House size": f"{size:,}.0 sqft"}
+    _, title_cls = _cls("detail_title")
+    _, price_cls = _cls("detail_price")
+    _, desc_cls = _cls("detail_description")
+    _, gallery_cls = _cls("detail_gallery_image")
+    ad = {
+        "id": f"synthetic-{seed}",
+        "title": title,
+        "description": "\n".join(paragraphs),
+        "category": {"id": 413, "name": rng.choice(CATEGORIES)},
+        "price": {"value": price, "currency": "LKR"},
+        "l1_location": rng.choice(DISTRICTS),
+        "properties": [{"key": "bedrooms", "value": str(bedrooms)}, {"key": "bathrooms", "value": str(bathrooms)},
+                       {"key": "size", "value": f"{size:,} sqft"}],
+        "amenities": [{"name": word} for word in rng.sample(WORDS, 5)],
+        "images": {"ids": [f"img-{seed}-{k}" for k in range(images)], "base_uri": "https://i.ikman-st.com"},
+    }
+    body = (
+        f'<h1 class="{title_cls}">{title}</h1>'
+        f'<div class="{price_cls}">Rs {price:,} /month</div>'
+        f'<div class="{desc_cls}">{"".join(f"<p>{p}</p>" for p in paragraphs)}</div>'
+        f'<dl>{"".join(f"<dt>{k}:</dt><dd>{v}</dd>" for k, v in attributes.items())}</dl>'
+        + "".join(f'<img class="{gallery_cls}" src="https://i.ikman-st.com/{seed}/{k}.jpg">' for k in range(images))
+    )
+    payload = {"adDetail": {"type": "Success", "data": {"ad": ad}}}
+    return f"<html><head>{_initial_data(payload, filler_kb, rng)}</head><body>{body}</body></html>"
+
+
+if __name__ == "__main__":
+    from scraper import parsers, initial_data, scrape_listings
+
+    search = search_page()
+    detail = detail_page()
+    print(f"search page: {len(search) / 1024:.0f} KB, {len(parsers.parse_search_page(search))} listings")
+    print(f"detail page: {len(detail) / 1024:.0f} KB, "
+          f"{sorted(parsers.parse_detail_page(detail, 'u'))}")
+    ad = scrape_listings.parse_ad_data(initial_data.extract_initial_data(detail), "u")
+    print(f"initialData ad: {ad['title']!r}, {ad['price']} {ad['currency']}, {ad['bedrooms']} beds")
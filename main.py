@@ -1,4 +1,245 @@
+import time
+import argparse
+from scraper import config
 from scraper.scraper import run_scraper
 
+
+def main():
+    parser = argparse.ArgumentParser(description="ikman.lk property scraper")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--async", dest="use_async", action="store_true",
+                      help="fetch detail pages concurrently")
+    mode.add_argument("--pipeline", action="store_true",
+                      help="run fetch, parse (process pool) and persist as separate stages")
+    parser.add_argument("--incremental", action="store_true",
+                        help="stop once the crawl reaches listings stored by earlier runs")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted crawl from its checkpoint")
+    parser.add_argument("--recheck", action="store_true",
+                        help="also re-fetch stored listings whose search card (price, title, location) changed")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="fetch every page from the network instead of the HTTP cache")
+    parser.add_argument("--no-thumbs", action="store_true",
+                        help="skip generating listing card thumbnails after the crawl")
+    parser.add_argument("--target", type=int, default=config.TARGET_COUNT,
+                        help="number of new listings to collect")
+    parser.add_argument("--concurrency", type=int, default=config.CRAWL_CONCURRENCY,
+                        help="max in-flight detail fetches in async mode")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="override requests per second to the listing host in async mode")
+    parser.add_argument("--metrics-interval", type=float, default=config.METRICS_INTERVAL,
+                        help="seconds between metrics summary lines during the crawl")
+    parser.add_argument("--prometheus", default=None, metavar="FILE",
+                        help="keep a Prometheus text-format metrics file up to date during the crawl")
+    parser.add_argument("--profile", choices=["cprofile", "sample"], default=None,
+                        help="profile the crawl by stage into logs/profiles (sample is cheap enough for production)")
+    parser.add_argument("--profile-every", type=int, default=None, metavar="N",
+                        help="only profile every Nth search page")
+    parser.add_argument("--profile-top", type=int, default=config.PROFILE_TOP_N, metavar="N",
+                        help="functions per stage in the profile summary")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("migrate", help="import storage/json/*.json into the listings database")
+    images_cmd = commands.add_parser("images", help="image store maintenance")
+    images_cmd.add_argument("action", choices=["report", "gc"],
+                            help="report: dedupe statistics; gc: delete unreferenced blobs")
+    images_cmd.add_argument("--dry-run", action="store_true", help="gc: only count what would be deleted")
+    cache_cmd = commands.add_parser("cache", help="HTTP cache maintenance")
+    cache_cmd.add_argument("action", choices=["stats", "clear"])
+    thumbs_cmd = commands.add_parser("thumbs", help="thumbnail cache maintenance")
+    thumbs_cmd.add_argument("action", choices=["pregenerate", "stats", "evict"])
+    archive_cmd = commands.add_parser("archive", help="raw HTML archive maintenance")
+    archive_cmd.add_argument("action", choices=["stats", "reindex"],
+                             help="reindex: rebuild the offset index from the segment files")
+    reparse_cmd = commands.add_parser("reparse", help="rebuild listings from the HTML archive (no network)")
+    reparse_cmd.add_argument("--workers", type=int, default=None, help="parse processes (default: CPU count)")
+    reparse_cmd.add_argument("--parser", choices=["selectors", "initial-data"], default="selectors",
+                             help="selectors: parsers.parse_detail_page; initial-data: window.initialData")
+    stats_cmd = commands.add_parser("stats", help="aggregate listings from the columnar index")
+    stats_cmd.add_argument("--group-by", default="district", choices=["district", "location", "property_type", "university"])
+    stats_cmd.add_argument("--value", choices=["price", "bedrooms", "bathrooms", "area_sqft"], default=None)
+    stats_cmd.add_argument("--agg", choices=["count", "median", "mean", "min", "max", "sum"], default=None,
+                           help="default: median with --value, count without")
+    stats_cmd.add_argument("--property-type", default=None, help="substring, e.g. Rentals")
+    stats_cmd.add_argument("--district", default=None)
+    stats_cmd.add_argument("--university", default=None, help="substring of the nearest university")
+    stats_cmd.add_argument("--min-price", type=float, default=None)
+    stats_cmd.add_argument("--max-price", type=float, default=None)
+    stats_cmd.add_argument("--bedrooms", type=float, default=None)
+    stats_cmd.add_argument("--rebuild", action="store_true", help="rebuild the index from scratch first")
+    universities_cmd = commands.add_parser("universities", help="nearest university for stored listings")
+    universities_cmd.add_argument("action", choices=["assign", "unresolved"],
+                                  help="assign: fill nearest_university for the whole store; "
+                                       "unresolved: list location names missing from the gazetteer")
+    commands.add_parser("normalize", help="convert stored price/area/room strings to typed values")
+    duplicates_cmd = commands.add_parser("duplicates", help="near-duplicate (reposted) listings")
+    duplicates_cmd.add_argument("action", choices=["cluster", "report"],
+                                help="cluster: rebuild the MinHash/LSH index over the whole store; "
+                                     "report: list the largest clusters")
+    duplicates_cmd.add_argument("--limit", type=int, default=20, help="report: clusters to show")
+    search_cmd = commands.add_parser("search", help="full-text search over stored listings")
+    search_cmd.add_argument("text", nargs="?", default="", help="words to search for")
+    search_cmd.add_argument("--limit", type=int, default=10)
+    search_cmd.add_argument("--rebuild", action="store_true", help="re-index every stored listing first")
+    history_cmd = commands.add_parser("history", help="listing price history and recent price changes")
+    history_cmd.add_argument("listing_id", nargs="?", default=None,
+                             help="show one listing's history (default: recent price changes)")
+    history_cmd.add_argument("--days", type=float, default=None, help="price changes in the last N days")
+    history_cmd.add_argument("--limit", type=int, default=50)
+    serve_cmd = commands.add_parser("serve", help="run the listings web server")
+    serve_cmd.add_argument("--host", default="127.0.0.1")
+    serve_cmd.add_argument("--port", type=int, default=5000)
+    export_cmd = commands.add_parser("export", help="write the listing store to Excel, CSV or Parquet")
+    export_cmd.add_argument("--format", choices=["xlsx", "csv", "parquet"], default="xlsx")
+    export_cmd.add_argument("--incremental", action="store_true",
+                            help="only listings changed since the last export in this format")
+    export_cmd.add_argument("--output", default=None, help="file to write (default: under storage/)")
+    args = parser.parse_args()
+    if args.recheck and (args.use_async or args.pipeline):
+        parser.error("--recheck only works with the serial crawl")
+
+    if args.no_cache:
+        config.HTTP_CACHE_ENABLED = False
+
+    if args.command == "migrate":
+        from scraper import storage
+        storage.init_storage()
+        count = storage.migrate_json_to_sqlite()
+        print(f"Migrated {count} listings into {config.DB_FILE}")
+    elif args.command == "images":
+        from scraper import storage, images
+        storage.init_storage()
+        if args.action == "report":
+            for key, value in images.dedupe_report().items():
+                print(f"{key:<20}{value}")
+        else:
+            removed, freed = images.garbage_collect(dry_run=args.dry_run)
+            print(f"{'Would remove' if args.dry_run else 'Removed'} {removed} blobs ({freed} bytes)")
+    elif args.command == "cache":
+        from scraper import httpcache
+        cache = httpcache.get_cache()
+        if args.action == "stats":
+            for key, value in cache.stats().items():
+                print(f"{key:<20}{value}")
+        else:
+            print(f"Removed {cache.clear()} cached pages from {config.HTTP_CACHE_FILE}")
+    elif args.command == "thumbs":
+        from scraper import storage, thumbnails
+        storage.init_storage()
+        if args.action == "pregenerate":
+            print(f"{thumbnails.pregenerate()} thumbnails ready in {config.THUMBS_DIR}")
+        elif args.action == "evict":
+            print(f"Removed {thumbnails.evict()} thumbnails")
+        else:
+            for key, value in thumbnails.stats().items():
+                print(f"{key:<20}{value}")
+    elif args.command == "archive":
+        from scraper.archive import get_archive
+        if args.action == "stats":
+            for key, value in get_archive().stats().items():
+                print(f"{key:<20}{value}")
+        else:
+            print(f"Indexed {get_archive().reindex()} archived pages")
+    elif args.command == "stats":
+        from scraper import storage, columnar
+        storage.init_storage()
+        index = columnar.get_index(full=args.rebuild)
+        started = time.perf_counter()
+        mask = index.mask(min_price=args.min_price, max_price=args.max_price, bedrooms=args.bedrooms,
+                          district=args.district, property_type=args.property_type, university=args.university)
+        groups = index.group_by(args.group_by, args.value, args.agg or ("median" if args.value else "count"), mask)
+        took = (time.perf_counter() - started) * 1000
+        for group, result in groups.items():
+            print(f"{group:<40}{result}")
+        print(f"{int(mask.sum())} of {len(index)} listings matched ({took:.1f} ms)")
+    elif args.command == "universities":
+        from scraper import storage, universities
+        storage.init_storage()
+        if args.action == "assign":
+            started = time.perf_counter()
+            updated, unresolved = universities.assign_store()
+            print(f"Updated {updated} listings ({unresolved} with unknown locations) "
+                  f"in {time.perf_counter() - started:.1f}s")
+        else:
+            for location, count in universities.unresolved_locations():
+                print(f"{location:<50}{count}")
+    elif args.command == "normalize":
+        from scraper import storage, normalize
+        storage.init_storage()
+        started = time.perf_counter()
+        count = normalize.normalize_store()
+        print(f"Normalized {count} listings in {time.perf_counter() - started:.1f}s")
+    elif args.command == "duplicates":
+        from scraper import storage, dedupe
+        storage.init_storage()
+        if args.action == "cluster":
+            started = time.perf_counter()
+            signed, duplicates, clusters = dedupe.cluster_store()
+            print(f"{duplicates} of {signed} listings are near-duplicates, in {clusters} clusters "
+                  f"({time.perf_counter() - started:.1f}s)")
+        else:
+            for root, members in dedupe.duplicate_clusters(args.limit):
+                listing = storage.get_listing(root) or {}
+                print(f"{root} ({len(members)} reposts) {listing.get('title', '')!r}: {' '.join(members)}")
+    elif args.command == "search":
+        from scraper import storage, search
+        storage.init_storage()
+        if args.rebuild:
+            print(f"Indexed {search.rebuild()} listings")
+        if args.text:
+            started = time.perf_counter()
+            listings, _, matched = storage.search_listings(args.text, limit=args.limit)
+            took = (time.perf_counter() - started) * 1000
+            for listing in listings:
+                print(f"{listing['listing_id']:<20}{listing.get('price') or '':<16}{listing.get('title', '')}")
+            print(f"{len(listings)} listings matching {matched or 'no'} words ({took:.1f} ms)")
+    elif args.command == "history":
+        from scraper import storage, history
+        storage.init_storage()
+        if args.listing_id:
+            for entry in history.price_history(args.listing_id):
+                changes = ", ".join(f"{field}={value}" for field, value in entry["changes"].items())
+                print(f"{entry['observed_at']:<22}{entry['price'] if entry['price'] is not None else '':<16}{changes}")
+        else:
+            for change in history.price_changes(days=args.days, limit=args.limit):
+                percent = f"{change['percent']:+.1f}%" if change["percent"] is not None else ""
+                print(f"{change['observed_at']:<22}{change['listing_id']:<20}"
+                      f"{change['old_price']} -> {change['price']} {percent}")
+    elif args.command == "serve":
+        from server.app import app
+        app.run(host=args.host, port=args.port)
+    elif args.command == "export":
+        from scraper import storage, export
+        storage.init_storage()
+        try:
+            path, count = export.export(args.format, path=args.output, incremental=args.incremental)
+        except RuntimeError as e:
+            parser.error(str(e))
+        print(f"Exported {count} listings to {path}")
+    elif args.command == "reparse":
+        from scraper.reparse import reparse
+        count = reparse(workers=args.workers, parser=args.parser)
+        print(f"Rebuilt {count} listings from {config.ARCHIVE_DIR}")
+    else:
+        from scraper import metrics, profiling
+        mode = "pipeline" if args.pipeline else "async" if args.use_async else "crawl"
+        with metrics.reporting(mode, interval=args.metrics_interval, prometheus_path=args.prometheus), \
+                profiling.session(args.profile, every=args.profile_every, name=mode, top=args.profile_top):
+            if args.pipeline:
+                from scraper.pipeline import run_pipeline
+                run_pipeline(target_count=args.target, incremental=args.incremental, resume=args.resume)
+            elif args.use_async:
+                from scraper.crawler import run_async_scraper
+                run_async_scraper(target_count=args.target, concurrency=args.concurrency, rate=args.rate,
+                                  incremental=args.incremental, resume=args.resume)
+            else:
+                run_scraper(target_count=args.target, incremental=args.incremental, resume=args.resume,
+                            recheck=args.recheck)
+
+        if not args.no_thumbs:
+            # Card thumbnails for new listings, so the first page view needs no decode
+            from scraper import thumbnails
+            thumbnails.pregenerate()
+
+
 if __name__ == "__main__":
-    run_scraper()
+    main()
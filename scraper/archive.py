@@ -0,0 +1,249 @@
+"""
+Raw HTML archive of every fetched search and detail page.
+
+Pages are appended to rotating segment files under config.ARCHIVE_DIR
+(pages-00001.warc.gz, ...). Each page is one WARC-style record (a short header
+block, a blank line, then the HTML) compressed as its own gzip member, so a
+segment is a valid .gz file and any record can be read on its own by seeking
+to its offset. The offsets live in a small SQLite index next to the segments;
+reindex() rebuilds it from the segments if it is ever lost.
+
+reparse.py replays the archive through the current parsers to rebuild the
+listing store without touching the network, e.g. after fixing a selector.
+"""
+import os
+import re
+import gzip
+import zlib
+import time
+import calendar
+import logging
+import threading
+from . import config, db, httpcache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    url_class TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_url ON pages(url);
+CREATE INDEX IF NOT EXISTS idx_pages_class ON pages(url_class);
+"""
+
+SEGMENT_NAME = re.compile(r"pages-(\d{5})\.warc\.gz$")
+READ_CHUNK = 64 * 1024  # Bytes fed to the decompressor while reindexing
+
+
+def _format_record(url, html, fetched_at):
+    body = html.encode("utf-8")
+    header = (
+        "WARC/1.0\r\n"
+        "WARC-Type: response\r\n"
+        f"WARC-Target-URI: {url}\r\n"
+        f"WARC-Date: {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(fetched_at))}\r\n"
+        "Content-Type: text/html; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    )
+    return header.encode("utf-8") + body
+
+
+def _parse_record(data):
+    """Split a decompressed record into (headers, html)."""
+    head, _, body = data.partition(b"\r\n\r\n")
+    headers = {}
+    for line in head.decode("utf-8").split("\r\n")[1:]:
+        key, _, value = line.partition(": ")
+        headers[key] = value
+    return headers, body.decode("utf-8")
+
+
+class PageArchive:
+    def __init__(self, directory=None, segment_bytes=None):
+        self.directory = directory or config.ARCHIVE_DIR
+        self.segment_bytes = segment_bytes or config.ARCHIVE_SEGMENT_BYTES
+        self.index_path = os.path.join(self.directory, "index.db")
+        self._file = None
+        self._segment = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        return db.connect(self.index_path, schema=SCHEMA)
+
+    def segments(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if SEGMENT_NAME.match(name))
+
+    def _open_segment(self):
+        """Append to the newest segment, rotating once it reaches segment_bytes."""
+        if self._file is not None and self._file.tell() < self.segment_bytes:
+            return
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.segments()
+        number = int(SEGMENT_NAME.match(existing[-1]).group(1)) if existing else 1
+        name = f"pages-{number:05d}.warc.gz"
+        if existing and os.path.getsize(os.path.join(self.directory, name)) >= self.segment_bytes:
+            name = f"pages-{number + 1:05d}.warc.gz"
+        self._segment = name
+        self._file = open(os.path.join(self.directory, name), "ab")
+
+    # Writing
+
+    def append(self, url, html):
+        """Archive one fetched page."""
+        url_class = httpcache.url_class(url)
+        if url_class is None:
+            return
+        fetched_at = time.time()
+        member = gzip.compress(_format_record(url, html, fetched_at), compresslevel=config.ARCHIVE_COMPRESSION)
+        with self._lock:
+            self._open_segment()
+            offset = self._file.tell()
+            self._file.write(member)
+            self._file.flush()
+            segment = self._segment
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO pages (url, url_class, segment, offset, length, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, url_class, segment, offset, len(member), fetched_at),
+            )
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = self._segment = None
+
+    # Reading
+
+    def read(self, segment, offset, length):
+        """Return (headers, html) for the record at offset in segment."""
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            return _parse_record(gzip.decompress(f.read(length)))
+
+    def latest(self, url):
+        """The most recently archived HTML for url, or None."""
+        row = self._conn().execute(
+            "SELECT segment, offset, length FROM pages WHERE url = ? ORDER BY id DESC LIMIT 1", (url,)
+        ).fetchone()
+        return self.read(*row)[1] if row else None
+
+    def iter_pages(self, url_class, latest_only=False):
+        """Yield (url, html) for archived pages of a class in archive order.
+
+        latest_only keeps just the newest copy of each URL. Segments are read
+        sequentially with one open file each.
+        """
+        if latest_only:
+            query = ("SELECT url, segment, offset, length FROM pages WHERE id IN "
+                     "(SELECT MAX(id) FROM pages WHERE url_class = ? GROUP BY url) ORDER BY id")
+        else:
+            query = "SELECT url, segment, offset, length FROM pages WHERE url_class = ? ORDER BY id"
+        handles = {}
+        try:
+            for url, segment, offset, length in self._conn().execute(query, (url_class,)).fetchall():
+                f = handles.get(segment)
+                if f is None:
+                    f = handles[segment] = open(os.path.join(self.directory, segment), "rb")
+                f.seek(offset)
+                yield url, _parse_record(gzip.decompress(f.read(length)))[1]
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def _scan_segment(self, segment):
+        """Yield index rows for each complete gzip member in a segment."""
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            offset = 0
+            while True:
+                f.seek(offset)
+                decompressor = zlib.decompressobj(wbits=31)
+                parts = []
+                consumed = 0
+                try:
+                    while not decompressor.eof:
+                        chunk = f.read(READ_CHUNK)
+                        if not chunk:
+                            break
+                        consumed += len(chunk)
+                        parts.append(decompressor.decompress(chunk))
+                except zlib.error:
+                    decompressor = None
+                if decompressor is None or not decompressor.eof:
+                    if consumed:
+                        logger.warning(f"Truncated record in {segment} at offset {offset}; ignoring the rest")
+                    return
+                length = consumed - len(decompressor.unused_data)
+                headers, _ = _parse_record(b"".join(parts))
+                url = headers.get("WARC-Target-URI", "")
+                fetched_at = calendar.timegm(time.strptime(headers["WARC-Date"], "%Y-%m-%dT%H:%M:%SZ"))
+                yield url, httpcache.url_class(url) or "other", segment, offset, length, fetched_at
+                offset += length
+
+    def reindex(self):
+        """Rebuild the offset index by walking every gzip member of every segment."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            rows = []
+            for segment in self.segments():
+                rows.extend(self._scan_segment(segment))
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM pages")
+                conn.executemany(
+                    "INSERT INTO pages (url, url_class, segment, offset, length, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        logger.info(f"Reindexed {len(rows)} archived pages from {len(self.segments())} segments")
+        return len(rows)
+
+    def stats(self):
+        conn = self._conn()
+        by_class = dict(conn.execute("SELECT url_class, COUNT(*) FROM pages GROUP BY url_class").fetchall())
+        unique = conn.execute("SELECT COUNT(DISTINCT url) FROM pages").fetchone()[0]
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "bytes_on_disk": sum(os.path.getsize(os.path.join(self.directory, s)) for s in segments),
+            "search_pages": by_class.get("search", 0),
+            "detail_pages": by_class.get("detail", 0),
+            "unique_urls": unique,
+        }
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Process-wide archive for config.ARCHIVE_DIR."""
+    global _archive
+    with _archive_lock:
+        if _archive is None or _archive.directory != config.ARCHIVE_DIR:
+            if _archive is not None:
+                _archive.close()
+            _archive = PageArchive()
+        return _archive
+
+
+def record_page(url, html):
+    """Archive a fetched page if archiving is enabled; never fails the fetch."""
+    if not config.ARCHIVE_ENABLED:
+        return
+    try:
+        get_archive().append(url, html)
+    except Exception as e:
+        logger.error(f"Failed to archive {url}: {e}")
@@ -0,0 +1,121 @@
+"""
+Durable crawl state for crash-safe resume.
+
+While a crawl runs it keeps the next search page to fetch, the frontier of
+listings queued but not yet stored, and any image jobs in progress. The state
+is written atomically (temp file + rename) every config.CHECKPOINT_INTERVAL
+seconds and when the crawl stops, and removed after a clean finish. A
+--resume run finishes the image jobs and frontier first, then carries on from
+the saved page instead of starting again at page 1.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from . import config, utils, storage
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlCheckpoint:
+    def __init__(self, path=None, interval=None):
+        self.path = path or config.CHECKPOINT_FILE
+        self.interval = config.CHECKPOINT_INTERVAL if interval is None else interval
+        self.next_page = 1
+        self.saved = 0
+        self.frontier = {}
+        self.image_jobs = {}
+        self._last_write = time.monotonic()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Restore state from disk. Returns False if there is no checkpoint."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except ValueError as e:
+            logger.error(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return False
+        with self._lock:
+            self.next_page = state.get("next_page", 1)
+            self.saved = state.get("saved", 0)
+            self.frontier = {l["listing_id"]: l for l in state.get("frontier", [])}
+            self.image_jobs = {j["listing_id"]: j["image_urls"] for j in state.get("image_jobs", [])}
+        logger.info(
+            f"Resuming from checkpoint: page {self.next_page}, {len(self.frontier)} pending listings, "
+            f"{len(self.image_jobs)} image jobs, {self.saved} saved so far"
+        )
+        return True
+
+    # Progress updates (thread-safe)
+
+    def page_done(self, page):
+        with self._lock:
+            self.next_page = page + 1
+        self.maybe_save()
+
+    def add_pending(self, listing):
+        with self._lock:
+            self.frontier[listing["listing_id"]] = listing
+
+    def listing_done(self, listing_id, saved):
+        with self._lock:
+            self.frontier.pop(listing_id, None)
+            self.saved += bool(saved)
+        self.maybe_save()
+
+    def image_started(self, listing_id, image_urls):
+        with self._lock:
+            self.image_jobs[listing_id] = list(image_urls)
+
+    def image_done(self, listing_id):
+        with self._lock:
+            self.image_jobs.pop(listing_id, None)
+
+    def pending(self):
+        """Listings and image jobs left over from the interrupted run."""
+        with self._lock:
+            return list(self.frontier.values()), dict(self.image_jobs)
+
+    # Persistence
+
+    def maybe_save(self):
+        if time.monotonic() - self._last_write >= self.interval:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            state = {
+                "next_page": self.next_page,
+                "saved": self.saved,
+                "frontier": list(self.frontier.values()),
+                "image_jobs": [{"listing_id": k, "image_urls": v} for k, v in self.image_jobs.items()],
+                "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            utils.write_json_atomic(self.path, state)
+            self._last_write = time.monotonic()
+
+    def clear(self):
+        """Remove the checkpoint after a crawl finishes cleanly."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def open_checkpoint(resume):
+    """Create the run's checkpoint, restoring the previous one when resuming."""
+    checkpoint = CrawlCheckpoint()
+    if resume and not checkpoint.load():
+        logger.info("No checkpoint found; starting a fresh crawl.")
+    return checkpoint
+
+
+def resume_image_jobs(checkpoint, image_jobs):
+    """Finish image downloads that were in flight when the last run stopped."""
+    for listing_id, image_urls in image_jobs.items():
+        storage.download_images(listing_id, image_urls)
+        checkpoint.image_done(listing_id)
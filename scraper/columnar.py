@@ -0,0 +1,344 @@
+"""
+Columnar listing index for fast filtering and aggregation.
+
+Numeric fields (price, bedrooms, bathrooms, area_sqft) are kept as NumPy
+arrays and location, district, property_type and nearest university as
+integer codes into small category lists, so a filter is a handful of
+vectorised comparisons and a group-by is a bincount instead of a loop over
+every listing dict.
+
+The index lives in config.COLUMNAR_DIR as one .npy file per column (opened
+with mmap_mode="r") plus meta.json. Each build writes a new generation
+directory and then switches current.json over to it, so readers never see a
+half-written index. refresh() only reads rows whose updated_at is newer than
+the last build, less a small window for saves that committed late; rows from
+that window are only applied if they differ from what the index holds.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import threading
+import numpy as np
+from . import config, db, storage, utils
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_COLUMNS = ("price", "bedrooms", "bathrooms", "area_sqft")
+CATEGORY_COLUMNS = ("location", "district", "property_type", "university")
+AGGREGATES = ("count", "median", "mean", "min", "max", "sum")
+
+NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+ROWS_SQL = """
+SELECT listing_id, price, location, property_type, updated_at,
+       json_extract(data, '$.bedrooms'), json_extract(data, '$.bathrooms'), json_extract(data, '$.area_sqft'),
+       json_extract(data, '$.nearest_university')
+FROM listings WHERE updated_at > ? ORDER BY rowid
+"""
+
+
+def to_number(value):
+    """Parse 3, "3", "10+", "1,200 sqft" to a float; anything else is NaN."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = NUMBER.search(value.replace(",", ""))
+        if match:
+            return float(match.group())
+    return np.nan
+
+
+def district_of(location):
+    # Search pages give "District, Category"
+    return location.split(",", 1)[0].strip() if location else None
+
+
+def _current_version(directory):
+    try:
+        with open(os.path.join(directory, "current.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["version"]
+    except FileNotFoundError:
+        return None
+
+
+class ColumnarIndex:
+    def __init__(self, listing_ids, columns, codes, categories, updated_at=0.0, version=None):
+        self.listing_ids = listing_ids
+        self.columns = columns
+        self.codes = codes
+        self.categories = categories
+        self.updated_at = updated_at
+        self.version = version
+
+    def __len__(self):
+        return len(self.listing_ids)
+
+    # Building
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.array([], dtype="U1"),
+            {name: np.array([], dtype=np.float64) for name in NUMERIC_COLUMNS},
+            {name: np.array([], dtype=np.int32) for name in CATEGORY_COLUMNS},
+            {name: [] for name in CATEGORY_COLUMNS},
+        )
+
+    def refresh(self):
+        """Fold listings saved since the last build into the index. Returns rows changed."""
+        rows = db.connect().execute(ROWS_SQL, (self.updated_at - config.COMMIT_SKEW,)).fetchall()
+        if not rows:
+            return 0
+
+        position = {listing_id: i for i, listing_id in enumerate(self.listing_ids.tolist())}
+        lookups = {name: {value: i for i, value in enumerate(values)} for name, values in self.categories.items()}
+        categories = {name: list(values) for name, values in self.categories.items()}
+
+        def code(name, value):
+            if not value:
+                return -1
+            table = lookups[name]
+            if value not in table:
+                table[value] = len(categories[name])
+                categories[name].append(value)
+            return table[value]
+
+        listing_ids = self.listing_ids.tolist()
+        columns = {name: np.array(self.columns[name], dtype=np.float64) for name in NUMERIC_COLUMNS}
+        codes = {name: np.array(self.codes[name], dtype=np.int32) for name in CATEGORY_COLUMNS}
+        updates = {name: [] for name in NUMERIC_COLUMNS + CATEGORY_COLUMNS}
+        targets = []
+        appended = 0
+        newest = self.updated_at
+        indexed = len(listing_ids)
+        for listing_id, price, location, property_type, updated_at, bedrooms, bathrooms, area_sqft, university in rows:
+            newest = max(newest, updated_at)
+            values = {
+                "price": np.nan if price is None else price,
+                "bedrooms": to_number(bedrooms),
+                "bathrooms": to_number(bathrooms),
+                "area_sqft": to_number(area_sqft),
+                "location": code("location", location),
+                "district": code("district", district_of(location)),
+                "property_type": code("property_type", property_type),
+                "university": code("university", university),
+            }
+            i = position.get(listing_id)
+            if i is not None and i < indexed and updated_at <= self.updated_at and self._matches(i, values):
+                # Re-read from the skew window and already indexed as it is
+                continue
+            if i is None:
+                i = position[listing_id] = len(listing_ids)
+                listing_ids.append(listing_id)
+                appended += 1
+            targets.append(i)
+            for name, value in values.items():
+                updates[name].append(value)
+
+        changed = len(targets)
+        if not changed:
+            return 0
+        targets = np.array(targets, dtype=np.int64)
+        for name in NUMERIC_COLUMNS:
+            columns[name] = np.concatenate([columns[name], np.full(appended, np.nan)])
+            columns[name][targets] = updates[name]
+        for name in CATEGORY_COLUMNS:
+            codes[name] = np.concatenate([codes[name], np.full(appended, -1, dtype=np.int32)])
+            codes[name][targets] = updates[name]
+
+        self.listing_ids = np.array(listing_ids)
+        self.columns = columns
+        self.codes = codes
+        self.categories = categories
+        self.updated_at = newest
+        return changed
+
+    def _matches(self, i, values):
+        """True if row i of the index already holds values (NaN equals NaN)."""
+        for name in NUMERIC_COLUMNS:
+            current = float(self.columns[name][i])
+            if current != values[name] and not (np.isnan(current) and np.isnan(values[name])):
+                return False
+        return all(int(self.codes[name][i]) == values[name] for name in CATEGORY_COLUMNS)
+
+    # Persistence
+
+    def save(self, directory=None):
+        """Write a new generation and point current.json at it."""
+        directory = directory or config.COLUMNAR_DIR
+        os.makedirs(directory, exist_ok=True)
+        version = max(self.version or 0, _current_version(directory) or 0) + 1
+        gen_dir = os.path.join(directory, f"gen-{version}")
+        if os.path.exists(gen_dir):
+            shutil.rmtree(gen_dir)
+        os.makedirs(gen_dir)
+
+        np.save(os.path.join(gen_dir, "listing_id.npy"), self.listing_ids)
+        for name, values in self.columns.items():
+            np.save(os.path.join(gen_dir, f"{name}.npy"), values)
+        for name, values in self.codes.items():
+            np.save(os.path.join(gen_dir, f"{name}_code.npy"), values)
+        utils.write_json_atomic(os.path.join(gen_dir, "meta.json"), {
+            "categories": self.categories,
+            "updated_at": self.updated_at,
+            "rows": len(self),
+            "built": time.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        utils.write_json_atomic(os.path.join(directory, "current.json"), {"version": version})
+        self.version = version
+
+        # Keep the previous generation for readers that opened it a moment ago
+        for name in os.listdir(directory):
+            if name.startswith("gen-") and name[4:].isdigit() and int(name[4:]) < version - 1:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory=None):
+        """Open the current generation memory-mapped, or None if there is none."""
+        directory = directory or config.COLUMNAR_DIR
+        try:
+            version = _current_version(directory)
+            if version is None:
+                return None
+            gen_dir = os.path.join(directory, f"gen-{version}")
+            with open(os.path.join(gen_dir, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+
+            def column(name):
+                return np.load(os.path.join(gen_dir, f"{name}.npy"), mmap_mode="r")
+
+            return cls(
+                column("listing_id"),
+                {name: column(name) for name in NUMERIC_COLUMNS},
+                {name: column(f"{name}_code") for name in CATEGORY_COLUMNS},
+                meta["categories"],
+                updated_at=meta["updated_at"],
+                version=version,
+            )
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Ignoring unreadable columnar index in {directory}: {e}")
+            return None
+
+    # Queries
+
+    def _category_mask(self, name, text):
+        """Rows whose category value contains text (case-insensitive)."""
+        text = text.lower()
+        matching = [i for i, value in enumerate(self.categories[name]) if text in value.lower()]
+        return np.isin(self.codes[name], matching)
+
+    def mask(self, min_price=None, max_price=None, location=None, district=None, property_type=None,
+             university=None, bedrooms=None, min_bedrooms=None, bathrooms=None, min_area=None, max_area=None):
+        """Boolean row mask for the given filters (category filters match substrings)."""
+        mask = np.ones(len(self), dtype=bool)
+        price = self.columns["price"]
+        if min_price is not None:
+            mask &= price >= min_price
+        if max_price is not None:
+            mask &= price <= max_price
+        if bedrooms is not None:
+            mask &= self.columns["bedrooms"] == bedrooms
+        if min_bedrooms is not None:
+            mask &= self.columns["bedrooms"] >= min_bedrooms
+        if bathrooms is not None:
+            mask &= self.columns["bathrooms"] == bathrooms
+        if min_area is not None:
+            mask &= self.columns["area_sqft"] >= min_area
+        if max_area is not None:
+            mask &= self.columns["area_sqft"] <= max_area
+        categories = (("location", location), ("district", district), ("property_type", property_type),
+                      ("university", university))
+        for name, text in categories:
+            if text:
+                mask &= self._category_mask(name, text)
+        return mask
+
+    def listing_ids_where(self, mask, limit=None):
+        ids = self.listing_ids[mask]
+        return ids[:limit].tolist() if limit else ids.tolist()
+
+    def group_by(self, by, value=None, agg="count", mask=None):
+        """Aggregate value per category of `by`, e.g. group_by("district", "price", "median").
+
+        Rows with a missing group or value are skipped. Returns {group: result},
+        largest first.
+        """
+        if by not in CATEGORY_COLUMNS:
+            raise ValueError(f"Cannot group by {by!r}; expected one of {CATEGORY_COLUMNS}")
+        if agg not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {agg!r}; expected one of {AGGREGATES}")
+        if agg != "count" and value not in NUMERIC_COLUMNS:
+            raise ValueError(f"{agg} needs a value column from {NUMERIC_COLUMNS}")
+
+        codes = np.asarray(self.codes[by])
+        keep = codes >= 0 if mask is None else mask & (codes >= 0)
+        if value is not None:
+            values = np.asarray(self.columns[value])
+            keep &= ~np.isnan(values)
+            values = values[keep]
+        codes = codes[keep]
+        groups = len(self.categories[by])
+        counts = np.bincount(codes, minlength=groups)
+
+        if agg == "count":
+            result = counts.astype(float)
+        elif agg in ("sum", "mean"):
+            sums = np.bincount(codes, weights=values, minlength=groups)
+            result = sums if agg == "sum" else np.divide(sums, counts, out=np.full(groups, np.nan), where=counts > 0)
+        else:
+            # Sort by (group, value) once; each group is then a contiguous run
+            order = np.lexsort((values, codes))
+            sorted_values = values[order]
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            result = np.full(groups, np.nan)
+            for group in np.flatnonzero(counts):
+                run = sorted_values[starts[group]:starts[group] + counts[group]]
+                if agg == "median":
+                    result[group] = np.median(run)
+                else:
+                    result[group] = run[0] if agg == "min" else run[-1]
+
+        names = self.categories[by]
+        out = {names[g]: (int(result[g]) if agg == "count" else round(float(result[g]), 2))
+               for g in np.flatnonzero(counts)}
+        return dict(sorted(out.items(), key=lambda item: item[1], reverse=True))
+
+
+def build(full=False, directory=None, index=None):
+    """Bring the on-disk index (or the already open index) up to date with the store.
+
+    full=True starts from scratch (needed after listings are deleted).
+    """
+    started = time.monotonic()
+    if index is None and not full:
+        index = ColumnarIndex.load(directory)
+    if index is None or full:
+        index = ColumnarIndex.empty()
+    changed = index.refresh()
+    if changed or index.version is None:
+        index.save(directory)
+        index = ColumnarIndex.load(directory)
+    if changed:
+        logger.info(f"Columnar index: {changed} rows updated, {len(index)} total "
+                    f"in {time.monotonic() - started:.2f}s")
+    return index
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def get_index(full=False):
+    """Process-wide index, refreshed whenever the listing database has changed."""
+    global _index, _index_version
+    with _index_lock:
+        version = storage.store_version()
+        if full or _index is None or version != _index_version:
+            _index = build(full=full, index=_index)
+            _index_version = version
+        return _index
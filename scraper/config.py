@@ -14,6 +14,103 @@ HEADERS = {
 REQUEST_DELAY = 1.5  # Seconds between requests
 MAX_RETRIES = 3
 TIMEOUT = 10  # Seconds
+TARGET_COUNT = 2000  # Listings per run (from plan)
+
+# Incremental crawl settings
+INCREMENTAL_STOP_PAGES = 3  # Stop after this many consecutive fully-known search pages
+HIGH_WATER_IDS = 5  # Newest (non-bumped) ads remembered from page 1 between runs
+
+# Async crawl settings
+CRAWL_CONCURRENCY = 8  # Max in-flight detail page fetches
+
+# Pipelined crawl settings (parse workers default to the CPU count)
+PIPELINE_FETCH_WORKERS = 8
+PIPELINE_PERSIST_WORKERS = 4
+PIPELINE_QUEUE_SIZE = 32  # Max items waiting between two stages
+
+# Image downloads
+IMAGE_WORKERS = 8  # Shared download pool size
+IMAGE_CHUNK_SIZE = 64 * 1024  # Bytes per streamed write
+IMAGE_GC_GRACE = 3600  # Seconds; images gc spares unreferenced blobs used this recently (crawl in progress)
+
+# HTTP cache for search/detail pages (see httpcache.py)
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_TTL = {  # Seconds a stored page is served without asking the server
+    "search": 15 * 60,  # New ads appear at the top, so keep this short
+    "detail": 7 * 24 * 3600,
+}
+HTTP_CACHE_MAX_BYTES = 500 * 1024 * 1024  # Compressed size before LRU eviction
+HTTP_CACHE_COMPRESSION = 6  # zlib level
+
+# Thumbnails (needs the optional Pillow package)
+THUMB_WIDTHS = (200, 400, 800)  # Widths the server will generate
+THUMB_PREGENERATE_WIDTHS = (400,)  # Made for every listing card after a crawl
+THUMB_QUALITY = 75
+THUMB_WORKERS = 4
+THUMBS_MAX_BYTES = 200 * 1024 * 1024  # LRU eviction past this size
+
+# Raw HTML archive and offline re-parse
+ARCHIVE_ENABLED = True
+ARCHIVE_SEGMENT_BYTES = 256 * 1024 * 1024  # Start a new segment file past this size
+ARCHIVE_COMPRESSION = 6  # gzip level
+REPARSE_BATCH_SIZE = 200  # Archived pages parsed per batch
+
+# Export
+EXPORT_CHUNK_SIZE = 1000  # Listings read from the store per chunk
+# save_listings stamps updated_at before its transaction commits, so incremental
+# readers (exports, the columnar index) re-read this many seconds behind their mark
+COMMIT_SKEW = 1.0
+
+# Near-duplicate detection (see dedupe.py)
+DEDUPE_ENABLED = True  # Check listings against the LSH index as they are saved
+MINHASH_BANDS = 20  # bands * rows = signature length; (1/bands)**(1/rows) ~ 0.61
+MINHASH_ROWS = 6  # is the similarity at which pairs become likely candidates
+MINHASH_SEED = 1  # Changing it invalidates stored signatures (rerun "main.py duplicates cluster")
+DUPLICATE_THRESHOLD = 0.7  # Estimated Jaccard similarity that counts as a repost
+DEDUPE_MAX_CANDIDATES = 500  # Bucket neighbours compared per saved listing
+DEDUPE_WORD_CACHE = 200_000  # Distinct words whose hashes are kept in memory
+
+# Full-text search (see search.py); bm25 weight per indexed column, in table order
+SEARCH_COLUMN_WEIGHTS = {
+    "title": 10.0,
+    "description": 1.0,
+    "location": 5.0,
+    "amenities": 2.0,
+    "university": 5.0,
+}
+
+# Change tracking (see history.py): a save that changes one of these adds a history row
+HISTORY_FIELDS = ("price", "rental_period", "title", "location", "bedrooms", "bathrooms", "area_sqft")
+
+# Crawl metrics (see metrics.py)
+METRICS_INTERVAL = 60  # Seconds between summary lines during a crawl
+METRICS_SAMPLE_INTERVAL = 1.0  # Seconds between queue depth samples
+
+# Profiling (main.py --profile; see profiling.py)
+PROFILE_TOP_N = 30  # Functions listed per stage in the text summary
+PROFILE_SAMPLE_INTERVAL = 0.01  # Seconds between stack samples in sample mode
+PROFILE_MAX_DEPTH = 64  # Frames kept per sampled stack
+
+# Rate limiting: (requests per second, burst) per host
+DEFAULT_HOST_LIMIT = (1 / REQUEST_DELAY, 1)
+HOST_LIMITS = {
+    "ikman.lk": (1 / REQUEST_DELAY, 1),
+    "i.ikman-st.com": (10.0, 20),  # Image CDN
+}
+RATE_BACKOFF_FACTOR = 0.5  # Multiply rate by this on 429/503
+RATE_MIN_FRACTION = 0.1  # Never drop below this fraction of the configured rate
+RATE_RECOVERY_AFTER = 20  # Healthy responses before stepping the rate back up
+RATE_RECOVERY_FACTOR = 1.25
+
+# Web server API
+API_PAGE_SIZE = 50  # Listings per /api/listings page by default
+API_MAX_PAGE_SIZE = 200
+SEARCH_MAX_OFFSET = 1000  # Deepest /api/search result served; ranked pages are re-scored per request
+API_CACHE_ENTRIES = 256  # Cached query responses, cleared whenever the store changes
+SERVER_GZIP_LEVEL = 6
+SERVER_BROTLI_QUALITY = 5  # Used when the optional brotli package is installed
+BLOB_MAX_AGE = 365 * 24 * 3600  # /blobs/ URLs are content-addressed, so never change
+LISTING_IMAGE_MAX_AGE = 24 * 3600  # /images/<listing>/<file> can be re-pointed by a re-crawl
 
 # Selectors (Based on analysis)
 SELECTORS = {
@@ -23,22 +120,42 @@ SELECTORS = {
     "listing_price": "div.price--3SnqI",
     "listing_location": "div.description--2-ez3", # Contains "Location, Category"
     "listing_image": "img.normal-ad--1TyjD",
+    "listing_bumped": "span.bump-up-time--Z8zuY", # "Bumped up N minutes ago" on paid re-listings
 
     # Detail page selectors (To be verified)
     "detail_title": "h1.title--3s1R8",
     "detail_price": "div.amount--3NTpl",
     "detail_location": "a.subtitle--BuHVd", # or similar
     "detail_description": "div.description--1nxbC",
+    "detail_description_fallback": "div[class*='description']",
     "detail_attributes": "div.word-break--2nyVq", # Key-value pairs often here
     "detail_contact": "div.contact-section--2swy-", # Contact section
+    "detail_contact_name": "div.contact-name--m97 Sb",
+    "detail_gallery_image": "img.gallery-image--1nS9k", # hypothetical class
+    "detail_gallery": "div.gallery-container", # potential
 }
 
+# HTML parser backend: "html.parser", "lxml", "selectolax" or "auto" (the
+# fastest installed). The faster ones are opt-in; check them with
+# python -m benchmarks.check_parser_backends before switching
+PARSER_BACKEND = "html.parser"
+
 # Storage settings
 import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STORAGE_DIR = os.path.join(BASE_DIR, "storage")
-IMAGES_DIR = os.path.join(STORAGE_DIR, "images")
-JSON_DIR = os.path.join(STORAGE_DIR, "json")
-EXCEL_FILE = os.path.join(STORAGE_DIR, "listings.xlsx") # Keep for reference or removal
+IMAGES_DIR = os.path.join(STORAGE_DIR, "images")  # Per-listing manifests
+BLOBS_DIR = os.path.join(STORAGE_DIR, "blobs")  # Content-addressed image files
+JSON_DIR = os.path.join(STORAGE_DIR, "json")  # Legacy one-file-per-listing store, migrated into DB_FILE
+DB_FILE = os.path.join(STORAGE_DIR, "listings.db")
+CHECKPOINT_FILE = os.path.join(STORAGE_DIR, "crawl_checkpoint.json")  # Removed after a clean finish
+CHECKPOINT_INTERVAL = 30  # Seconds between checkpoint writes during a crawl
+HTTP_CACHE_FILE = os.path.join(STORAGE_DIR, "http_cache.db")
+THUMBS_DIR = os.path.join(STORAGE_DIR, "thumbs")  # Resized copies of blobs (see thumbnails.py)
+ARCHIVE_DIR = os.path.join(STORAGE_DIR, "archive")  # Raw HTML of every fetched page (see archive.py)
+COLUMNAR_DIR = os.path.join(STORAGE_DIR, "columnar")  # Memory-mapped column files (see columnar.py)
+EXPORT_DIR = os.path.join(STORAGE_DIR, "exports")  # Incremental exports (full ones go next to EXCEL_FILE)
+EXCEL_FILE = os.path.join(STORAGE_DIR, "listings.xlsx")  # Written by "main.py export"
 LOGS_DIR = os.path.join(BASE_DIR, "logs")
 LOG_FILE = os.path.join(LOGS_DIR, "scraper.log")
+PROFILE_DIR = os.path.join(LOGS_DIR, "profiles")  # .prof, .folded and summary files
@@ -0,0 +1,207 @@
+"""
+Concurrent crawl engine.
+
+Search pages are walked in order while detail pages are fetched by a bounded
+pool of workers. Blocking work (requests, parsing, image downloads, saving)
+runs in a thread pool so the event loop only schedules; politeness comes from
+the shared per-host rate limiter rather than a sleep before every call.
+"""
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from . import config, utils, parsers, storage, ratelimit, httpcache, metrics, profiling
+from .scraper import build_listing, persist_listing
+from .incremental import IncrementalTracker
+from .checkpoint import open_checkpoint, resume_image_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class _CrawlState:
+    def __init__(self, target_count, existing_ids):
+        self.target_count = target_count
+        self.existing_ids = existing_ids
+        self.queued_ids = set()
+        self.saved = 0
+        self.failed = 0
+
+    @property
+    def done(self):
+        return self.saved >= self.target_count
+
+
+async def _fetch(loop, executor, session, limiter, url):
+    if not httpcache.is_fresh(session, url):
+        await limiter.wait_async(url)
+    return await loop.run_in_executor(executor, utils.fetch_url, session, url, False)
+
+
+def _process(listing, html, checkpoint):
+    full_data = build_listing(listing, html)
+    return persist_listing(full_data, checkpoint)
+
+
+async def _detail_worker(loop, executor, session, limiter, queue, state, checkpoint):
+    while True:
+        listing = await queue.get()
+        try:
+            if listing is None:
+                return
+            if state.done:
+                continue
+
+            listing_id = listing["listing_id"]
+            logger.info(f"Processing new listing {listing_id}...")
+            response = await _fetch(loop, executor, session, limiter, listing.get("source_url"))
+            if not response:
+                state.failed += 1
+                checkpoint.listing_done(listing_id, False)
+                continue
+
+            saved = await loop.run_in_executor(executor, _process, listing, response.text, checkpoint)
+            checkpoint.listing_done(listing_id, saved)
+            if saved and not state.done:
+                state.existing_ids.add(listing_id)
+                state.saved += 1
+                logger.info(f"Scraped count: {state.saved}/{state.target_count}")
+            elif not saved:
+                state.failed += 1
+        except Exception as e:
+            state.failed += 1
+            logger.error(f"Error processing listing {listing and listing.get('listing_id')}: {e}")
+        finally:
+            queue.task_done()
+
+
+async def crawl(target_count=config.TARGET_COUNT, concurrency=config.CRAWL_CONCURRENCY,
+                rate=None, start_page=1, incremental=False, resume=False):
+    """Crawl search pages and fetch new detail pages concurrently.
+
+    rate overrides the listing host's requests/second from config.HOST_LIMITS.
+    incremental stops the walk once it reaches already-stored listings; resume
+    continues from the checkpoint of an interrupted run instead of start_page.
+    Returns a stats dict with saved/failed counts, pages walked and elapsed time.
+    """
+    started = time.monotonic()
+    storage.init_storage()
+    state = _CrawlState(target_count, storage.get_existing_ids())
+    logger.info(f"Found {len(state.existing_ids)} existing listings.")
+
+    checkpoint = open_checkpoint(resume)
+    frontier, image_jobs = checkpoint.pending()
+    if resume:
+        start_page = checkpoint.next_page
+        state.saved = checkpoint.saved
+
+    loop = asyncio.get_running_loop()
+    # Workers each hold one fetch thread; the extra threads parse and persist
+    executor = ThreadPoolExecutor(max_workers=concurrency * 2, thread_name_prefix="crawl")
+    session = utils.get_session(pool_size=concurrency)
+    limiter = ratelimit.get_limiter()
+    if rate:
+        limiter.configure(urlparse(config.BASE_URL).netloc, rate, burst=concurrency)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    metrics.track_queue("detail", queue)
+
+    workers = [
+        asyncio.create_task(_detail_worker(loop, executor, session, limiter, queue, state, checkpoint))
+        for _ in range(concurrency)
+    ]
+
+    tracker = IncrementalTracker() if incremental else None
+    exhausted = False
+    fetch_failed = False
+    page = start_page
+    pages = 0
+    try:
+        await loop.run_in_executor(executor, resume_image_jobs, checkpoint, image_jobs)
+        # Listings queued by the interrupted run but never stored
+        for listing in frontier:
+            if listing["listing_id"] in state.existing_ids:
+                checkpoint.listing_done(listing["listing_id"], False)
+                continue
+            state.queued_ids.add(listing["listing_id"])
+            await queue.put(listing)
+
+        while not state.done:
+            logger.info(f"Scraping search page {page}...")
+            profiling.at_page(page)
+            search_url = f"{config.SEARCH_URL}?page={page}"
+            response = await _fetch(loop, executor, session, limiter, search_url)
+            if not response:
+                logger.error("Failed to fetch search page. Stopping.")
+                fetch_failed = True
+                break
+
+            listings = await loop.run_in_executor(executor, parsers.parse_search_page, response.text)
+            if not listings:
+                logger.info("No more listings found or parsing failed. Stopping.")
+                exhausted = True
+                break
+            pages += 1
+            stop_after_page = tracker.observe_page(page, listings, state.existing_ids) if tracker else False
+
+            for listing in listings:
+                listing_id = listing.get("listing_id")
+                if not listing_id:
+                    logger.warning("Found listing without ID. Skipping.")
+                    continue
+                if listing_id in state.existing_ids or listing_id in state.queued_ids:
+                    continue
+                if state.done:
+                    break
+                state.queued_ids.add(listing_id)
+                checkpoint.add_pending(listing)
+                # Blocks while the pool is saturated, so the frontier stays bounded
+                await queue.put(listing)
+            checkpoint.page_done(page)
+
+            if stop_after_page:
+                break
+            page += 1
+
+        await queue.join()
+        if tracker:
+            tracker.finish(exhausted=exhausted)
+    except BaseException:
+        checkpoint.save()
+        logger.info(f"Crawl interrupted; checkpoint saved to {checkpoint.path}")
+        raise
+    else:
+        if fetch_failed:
+            # Keep the position so --resume can retry from this page
+            checkpoint.save()
+        else:
+            checkpoint.clear()
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers, return_exceptions=True)
+        executor.shutdown(wait=True)
+        session.close()
+        metrics.untrack_queue("detail")
+
+    stats = {
+        "saved": state.saved,
+        "failed": state.failed,
+        "pages": pages,
+        "elapsed": time.monotonic() - started,
+        "rate_wait": limiter.total_waited(),
+    }
+    logger.info(
+        f"Async crawl completed: {stats['saved']} saved, {stats['failed']} failed, "
+        f"{pages} search pages in {stats['elapsed']:.1f}s"
+    )
+    limiter.log_summary()
+    httpcache.get_cache().log_summary()
+    return stats
+
+
+def run_async_scraper(target_count=config.TARGET_COUNT, concurrency=config.CRAWL_CONCURRENCY,
+                      rate=None, incremental=False, resume=False):
+    """Synchronous entry point for the async crawl engine."""
+    logger.info("Starting async scraper...")
+    return asyncio.run(crawl(target_count=target_count, concurrency=concurrency, rate=rate,
+                             incremental=incremental, resume=resume))
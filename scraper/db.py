@@ -0,0 +1,146 @@
+"""
+SQLite database behind the storage API.
+
+One database file (config.DB_FILE) holds every listing as a JSON document plus
+a few indexed columns for filtering. Connections are kept per thread and per
+database path, so the threaded crawl modes can share the store safely.
+"""
+import os
+import re
+import sqlite3
+import threading
+from . import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id TEXT PRIMARY KEY,
+    price REAL,
+    location TEXT,
+    property_type TEXT,
+    scraped_date TEXT,
+    updated_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings(price);
+CREATE INDEX IF NOT EXISTS idx_listings_location ON listings(location);
+CREATE INDEX IF NOT EXISTS idx_listings_property_type ON listings(property_type);
+CREATE INDEX IF NOT EXISTS idx_listings_updated_at ON listings(updated_at);
+
+CREATE TABLE IF NOT EXISTS image_blobs (
+    url TEXT PRIMARY KEY,
+    blob TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_image_blobs_blob ON image_blobs(blob);
+
+CREATE TABLE IF NOT EXISTS image_refs (
+    listing_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    blob TEXT NOT NULL,
+    PRIMARY KEY (listing_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_image_refs_blob ON image_refs(blob);
+
+-- MinHash signatures and LSH buckets for near-duplicate detection (see dedupe.py)
+CREATE TABLE IF NOT EXISTS minhash (
+    listing_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    duplicate_of TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_minhash_duplicate_of ON minhash(duplicate_of);
+
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    listing_id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, listing_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets_listing ON lsh_buckets(listing_id);
+
+-- Full-text index over listing text, keyed by listings.rowid (see search.py)
+CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+    title, description, location, amenities, university,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+-- Change tracking (see history.py): search card hashes and per-listing history
+CREATE TABLE IF NOT EXISTS listing_cards (
+    listing_id TEXT PRIMARY KEY,
+    card_hash INTEGER NOT NULL,
+    checked_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS listing_history (
+    listing_id TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    price REAL,
+    changes TEXT,
+    PRIMARY KEY (listing_id, observed_at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_local = threading.local()
+
+PRICE_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def connect(path=None, schema=SCHEMA):
+    """Return this thread's connection to the database, creating the schema once.
+
+    Other stores (the HTTP cache) pass their own path and schema.
+    """
+    path = path or config.DB_FILE
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(schema)
+        connections[path] = conn
+    return conn
+
+
+def close():
+    """Close this thread's connections."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
+
+def index_fields(listing):
+    """Columns pulled out of a listing for indexing: (price, location, property_type)."""
+    price = listing.get("price")
+    if isinstance(price, str):
+        match = PRICE_NUMBER.search(price.replace(",", ""))
+        price = float(match.group()) if match else None
+    elif not isinstance(price, (int, float)):
+        price = None
+
+    location = listing.get("location") or None
+    property_type = listing.get("property_type")
+    if not property_type and location and "," in location:
+        # Search pages give "District, Category"
+        property_type = location.split(",", 1)[1].strip()
+    return price, location, property_type or None
+
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
@@ -0,0 +1,275 @@
+"""
+Near-duplicate listings with MinHash and locality-sensitive hashing.
+
+The same property is often reposted under a new id with a reworded title or
+description. Each listing is reduced to a set of shingles (word 3-grams of
+title + description, plus its price and location) and a MinHash signature of
+config.MINHASH_BANDS * config.MINHASH_ROWS values, stored in the minhash
+table. The fraction of equal signature values estimates the Jaccard
+similarity of two listings' shingle sets.
+
+The signature is cut into bands; listings that agree on a whole band land in
+the same LSH bucket (lsh_buckets table). Only listings sharing a bucket are
+compared, so checking a new listing costs a few indexed lookups instead of a
+scan of the store, and clustering the store costs roughly O(n) instead of
+O(n^2) pairs. Pairs whose estimated similarity reaches
+config.DUPLICATE_THRESHOLD are duplicates; each cluster points at its oldest
+listing through duplicate_of.
+
+save_listings() indexes listings as they are stored. cluster_store() rebuilds
+the whole index (and is how stores created before this module get indexed).
+"""
+import re
+import zlib
+import json
+import functools
+import logging
+import numpy as np
+from . import config, db
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r"[^\W_]+")  # Unicode words, so Sinhala/Tamil text shingles too
+SHINGLE_WORDS = 3
+
+NUM_HASHES = config.MINHASH_BANDS * config.MINHASH_ROWS
+
+# Multiply-shift hash family: h_i(x) = (a_i * x + b_i) mod 2^64, top 32 bits.
+# Seeded, so signatures stay comparable across runs and processes.
+_rng = np.random.default_rng(config.MINHASH_SEED)
+_A = _rng.integers(1, 2 ** 63, NUM_HASHES, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, NUM_HASHES, dtype=np.uint64)
+# Per-position multipliers that fold word hashes into 3-gram hashes and one
+# band's values into a bucket number
+_GRAM_MIX = _rng.integers(1, 2 ** 63, SHINGLE_WORDS, dtype=np.uint64) | np.uint64(1)
+_BAND_MIX = _rng.integers(1, 2 ** 63, config.MINHASH_ROWS, dtype=np.uint64) | np.uint64(1)
+
+
+@functools.lru_cache(maxsize=config.DEDUPE_WORD_CACHE)
+def _word_hash(word):
+    return zlib.crc32(word.encode("utf-8"))
+
+
+def _crc32(strings):
+    # Listing text reuses a small vocabulary, so most words are cache hits
+    return np.fromiter(map(_word_hash, strings), dtype=np.uint64, count=len(strings))
+
+
+def shingle_hashes(listing):
+    """Distinct 64-bit hashes of a listing's shingles; empty if it has no text.
+
+    Shingles are word 3-grams of title + description plus price and location
+    tokens. Each word is hashed once and the 3-gram hashes are combined from
+    neighbouring word hashes, so no 3-gram strings are built.
+    """
+    text = f"{listing.get('title') or ''} {listing.get('description') or ''}".lower()
+    words = TOKEN.findall(text)
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    hashes = _crc32(words)
+    if len(hashes) >= SHINGLE_WORDS:
+        with np.errstate(over="ignore"):
+            count = len(hashes) - SHINGLE_WORDS + 1
+            grams = sum(hashes[i:i + count] * _GRAM_MIX[i] for i in range(SHINGLE_WORDS))
+    else:
+        grams = _crc32([" ".join(words)])
+    price, location, _ = db.index_fields(listing)
+    tokens = []
+    if price is not None:
+        tokens.append(f"price:{price:.0f}")
+    if location:
+        tokens.append(f"location:{location.lower()}")
+    return np.unique(np.concatenate([grams, _crc32(tokens)]))
+
+
+def signature(listing):
+    """MinHash signature (uint32 array) of a listing, or None if it has no text."""
+    x = shingle_hashes(listing)
+    if not len(x):
+        return None
+    with np.errstate(over="ignore"):
+        hashed = (x[:, None] * _A + _B) >> np.uint64(32)
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def band_buckets(signatures):
+    """Bucket number per band for a (n, NUM_HASHES) signature array -> (n, bands) int64."""
+    bands = signatures.astype(np.uint64).reshape(len(signatures), config.MINHASH_BANDS, config.MINHASH_ROWS)
+    with np.errstate(over="ignore"):
+        mixed = (bands * _BAND_MIX).sum(axis=2, dtype=np.uint64)
+    return mixed.view(np.int64)
+
+
+def similarity(sig, others):
+    """Estimated Jaccard similarity of sig to each row of others."""
+    return (others == sig).mean(axis=1)
+
+
+def _decode(blob):
+    return np.frombuffer(blob, dtype=np.uint32)
+
+
+def _candidates(conn, listing_id, buckets):
+    """Listings sharing at least one bucket with buckets (excluding listing_id)."""
+    # An OR of (band, bucket) terms is answered from the primary key; a row-value
+    # IN (VALUES ...) list makes SQLite scan the whole bucket table
+    terms = " OR ".join("(b.band = ? AND b.bucket = ?)" for _ in buckets)
+    params = [v for band, bucket in enumerate(buckets) for v in (band, int(bucket))]
+    return conn.execute(
+        f"""
+        SELECT DISTINCT m.listing_id, m.signature, m.duplicate_of
+        FROM lsh_buckets b JOIN minhash m ON m.listing_id = b.listing_id
+        WHERE b.listing_id != ? AND ({terms})
+        LIMIT ?
+        """,
+        (listing_id, *params, config.DEDUPE_MAX_CANDIDATES),
+    ).fetchall()
+
+
+def index_listings(conn, listings):
+    """Sign and bucket listings, recording the closest earlier near-duplicate.
+
+    Runs inside the caller's transaction (storage.save_listings). Returns
+    {listing_id: duplicate_of} for the listings found to be near-duplicates.
+    """
+    found = {}
+    for listing in listings:
+        listing_id = str(listing["listing_id"])
+        sig = signature(listing)
+        conn.execute("DELETE FROM lsh_buckets WHERE listing_id = ?", (listing_id,))
+        if sig is None:
+            conn.execute("DELETE FROM minhash WHERE listing_id = ?", (listing_id,))
+            continue
+        buckets = band_buckets(sig[None, :])[0]
+        duplicate_of = None
+        # Signatures made with other MINHASH_* settings cannot be compared
+        rows = [row for row in _candidates(conn, listing_id, buckets) if len(row[1]) == sig.nbytes]
+        if rows:
+            scores = similarity(sig, np.stack([_decode(blob) for _, blob, _ in rows]))
+            best = int(scores.argmax())
+            if scores[best] >= config.DUPLICATE_THRESHOLD:
+                candidate_id, _, candidate_root = rows[best]
+                # Point at the cluster's oldest listing, not a fellow duplicate
+                duplicate_of = candidate_root or candidate_id
+                if duplicate_of == listing_id:
+                    # Re-saving a cluster's oldest listing
+                    duplicate_of = None
+                else:
+                    found[listing_id] = duplicate_of
+        conn.execute(
+            "INSERT INTO minhash (listing_id, signature, duplicate_of) VALUES (?, ?, ?) "
+            "ON CONFLICT(listing_id) DO UPDATE SET signature = excluded.signature, "
+            "duplicate_of = excluded.duplicate_of",
+            (listing_id, sig.tobytes(), duplicate_of),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO lsh_buckets (band, bucket, listing_id) VALUES (?, ?, ?)",
+            [(band, int(bucket), listing_id) for band, bucket in enumerate(buckets)],
+        )
+    for listing_id, duplicate_of in found.items():
+        logger.info(f"Listing {listing_id} looks like a repost of {duplicate_of}")
+    return found
+
+
+def _clusters(signatures):
+    """Cluster root (lowest index) for each row of a signature array."""
+    n = len(signatures)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets = band_buckets(signatures)
+    for band in range(config.MINHASH_BANDS):
+        column = buckets[:, band]
+        order = np.argsort(column, kind="stable")
+        ordered = column[order]
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        ends = np.r_[starts[1:], n]
+        shared = ends - starts > 1
+        for start, end in zip(starts[shared], ends[shared]):
+            # Members in store order; pull out everything similar to the first
+            # member, then repeat with what is left
+            remaining = order[start:end]
+            while len(remaining) > 1:
+                head, rest = remaining[0], remaining[1:]
+                close = similarity(signatures[head], signatures[rest]) >= config.DUPLICATE_THRESHOLD
+                for other in rest[close]:
+                    a, b = find(int(head)), find(int(other))
+                    if a != b:
+                        parent[max(a, b)] = min(a, b)
+                remaining = rest[~close]
+    return [find(i) for i in range(n)]
+
+
+def cluster_store(batch_size=1000):
+    """Re-sign every stored listing, rebuild the LSH index and cluster the store.
+
+    Each cluster's members point at its oldest listing (by storage order).
+    Returns (listings signed, duplicates, clusters).
+    """
+    conn = db.connect()
+    ids = []
+    signatures = []
+    cursor = conn.execute("SELECT listing_id, data FROM listings ORDER BY rowid")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for listing_id, data in rows:
+            sig = signature(json.loads(data))
+            if sig is not None:
+                ids.append(listing_id)
+                signatures.append(sig)
+
+    signatures = np.stack(signatures) if signatures else np.empty((0, NUM_HASHES), dtype=np.uint32)
+    roots = _clusters(signatures)
+    buckets = band_buckets(signatures)
+    with conn:
+        conn.execute("DELETE FROM lsh_buckets")
+        conn.execute("DELETE FROM minhash")
+        conn.executemany(
+            "INSERT INTO minhash (listing_id, signature, duplicate_of) VALUES (?, ?, ?)",
+            ((listing_id, sig.tobytes(), ids[root] if root != i else None)
+             for i, (listing_id, sig, root) in enumerate(zip(ids, signatures, roots))),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO lsh_buckets (band, bucket, listing_id) VALUES (?, ?, ?)",
+            ((band, bucket, listing_id)
+             for listing_id, row in zip(ids, buckets.tolist()) for band, bucket in enumerate(row)),
+        )
+    duplicates = sum(root != i for i, root in enumerate(roots))
+    clusters = len({root for i, root in enumerate(roots) if root != i})
+    logger.info(f"Near-duplicates: {duplicates} of {len(ids)} listings in {clusters} clusters")
+    return len(ids), duplicates, clusters
+
+
+def duplicate_clusters(limit=20):
+    """[(oldest listing_id, [duplicate ids])], largest clusters first."""
+    rows = db.connect().execute(
+        """
+        SELECT duplicate_of, group_concat(listing_id, ' ') FROM minhash
+        WHERE duplicate_of IS NOT NULL
+        GROUP BY duplicate_of ORDER BY count(*) DESC, duplicate_of LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    return [(root, members.split(" ")) for root, members in rows]
+
+
+def find_similar(listing, limit=10):
+    """[(listing_id, estimated similarity)] of stored listings in the same LSH buckets."""
+    sig = signature(listing)
+    if sig is None:
+        return []
+    buckets = band_buckets(sig[None, :])[0]
+    rows = [row for row in _candidates(db.connect(), str(listing.get("listing_id")), buckets)
+            if len(row[1]) == sig.nbytes]
+    if not rows:
+        return []
+    scores = similarity(sig, np.stack([_decode(blob) for _, blob, _ in rows]))
+    ranked = sorted(zip((row[0] for row in rows), scores.tolist()), key=lambda item: -item[1])
+    return [(listing_id, round(score, 3)) for listing_id, score in ranked[:limit]]
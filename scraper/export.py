@@ -0,0 +1,209 @@
+"""
+Streaming export of the listing store to Excel, CSV and Parquet.
+
+Rows are read from SQLite in rowid order, config.EXPORT_CHUNK_SIZE at a time,
+and handed to a writer that never holds more than one chunk: openpyxl's
+write-only workbook, csv.writer, or a pyarrow ParquetWriter (one row group per
+chunk). The columns are the 18-column schema in init_excel.columns.
+
+An incremental export only contains listings whose updated_at is newer than
+the previous export of the same format. The high-water mark is kept in the
+database meta table together with the listings exported in the last
+config.COMMIT_SKEW seconds before it: the next export re-reads that window, so
+a save that committed late is still picked up, and skips what it already wrote. pyarrow is optional and only needed for Parquet.
+"""
+import os
+import csv
+import json
+import time
+import uuid
+import logging
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from . import config, db
+from .init_excel import columns as COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("xlsx", "csv", "parquet")
+
+CHUNK_SQL = """
+SELECT rowid, listing_id, updated_at, data FROM listings
+WHERE updated_at > ? AND rowid > ?
+ORDER BY rowid LIMIT ?
+"""
+
+
+def iter_chunks(since=0.0, chunk_size=None, exported=None):
+    """Yield (listings, [(listing_id, updated_at)]) chunks of listings changed after since.
+
+    exported maps listing_id -> updated_at for versions an earlier export
+    already wrote; those are skipped.
+    """
+    chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+    exported = exported or {}
+    conn = db.connect()
+    last_rowid = 0
+    while True:
+        rows = conn.execute(CHUNK_SQL, (since, last_rowid, chunk_size)).fetchall()
+        if not rows:
+            return
+        last_rowid = rows[-1][0]
+        rows = [row for row in rows if exported.get(row[1]) != row[2]]
+        if rows:
+            stamps = [(listing_id, updated_at) for _, listing_id, updated_at, _ in rows]
+            yield [json.loads(data) for _, _, _, data in rows], stamps
+
+
+def load_mark(conn, key):
+    """(updated_at, {listing_id: updated_at} near it) of the previous export."""
+    value = db.get_meta(conn, key)
+    if value is None:
+        return 0.0, {}
+    try:
+        mark = json.loads(value)
+    except ValueError:
+        mark = None
+    if not isinstance(mark, dict):
+        # Marks written before the boundary was kept were a bare timestamp
+        return float(value), {}
+    return mark["updated_at"], mark["boundary"]
+
+
+def cell(value):
+    """A listing value as a spreadsheet cell: lists joined, dicts as JSON."""
+    if isinstance(value, list):
+        return "; ".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def to_row(listing):
+    return [cell(listing.get(column)) for column in COLUMNS]
+
+
+class XlsxWriter:
+    def __init__(self, path):
+        self.path = path
+        # write_only streams rows to a temp file instead of building the sheet in memory
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("listings")
+        self.sheet.append(COLUMNS)
+
+    def write(self, listings):
+        for listing in listings:
+            # openpyxl refuses control characters, which scraped descriptions sometimes contain
+            self.sheet.append([ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v
+                               for v in to_row(listing)])
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.path = path
+        # utf-8-sig so Excel detects the encoding of Sinhala/Tamil text
+        self.file = open(path, "w", encoding="utf-8-sig", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, listings):
+        self.writer.writerows(to_row(listing) for listing in listings)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    TYPES = {"price": "float64", "area_sqft": "float64", "bedrooms": "int64", "bathrooms": "int64"}
+
+    def __init__(self, path):
+        if pa is None:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.schema = pa.schema([(column, getattr(pa, self.TYPES.get(column, "string"))()) for column in COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def value(self, column, value):
+        value = cell(value)
+        if value is None or value == "":
+            return None
+        kind = self.TYPES.get(column)
+        try:
+            if kind == "float64":
+                return float(value)
+            if kind == "int64":
+                return int(value)
+        except (TypeError, ValueError):
+            # Listings stored before normalize.py still hold strings
+            return None
+        return str(value)
+
+    def write(self, listings):
+        data = {column: [self.value(column, listing.get(column)) for listing in listings] for column in COLUMNS}
+        self.writer.write_table(pa.table(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"xlsx": XlsxWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+
+
+def default_path(fmt, incremental):
+    if fmt == "xlsx" and not incremental:
+        return config.EXCEL_FILE
+    name = f"listings-changes-{time.strftime('%Y%m%d-%H%M%S')}" if incremental else "listings"
+    return os.path.join(config.EXPORT_DIR if incremental else config.STORAGE_DIR, f"{name}.{fmt}")
+
+
+def export(fmt="xlsx", path=None, incremental=False, chunk_size=None):
+    """Write listings to path in fmt. Returns (path, rows written).
+
+    With incremental=True only listings changed since the last export in this
+    format are written. The high-water mark is updated either way, so a full
+    export also resets the incremental baseline.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {FORMATS}")
+    conn = db.connect()
+    meta_key = f"export_{fmt}_updated_at"
+    since, exported = load_mark(conn, meta_key) if incremental else (0.0, {})
+    path = path or default_path(fmt, incremental)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    started = time.monotonic()
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    writer = WRITERS[fmt](tmp_path)
+    written = 0
+    newest = since
+    stamps = dict(exported)
+    try:
+        for listings, chunk_stamps in iter_chunks(since - config.COMMIT_SKEW if incremental else 0.0,
+                                                  chunk_size, exported):
+            writer.write(listings)
+            written += len(listings)
+            newest = max([newest, *(updated_at for _, updated_at in chunk_stamps)])
+            # Only the versions near the mark are needed to skip them next time
+            stamps.update(chunk_stamps)
+            stamps = {listing_id: updated_at for listing_id, updated_at in stamps.items()
+                      if updated_at > newest - config.COMMIT_SKEW}
+        writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    with conn:
+        db.set_meta(conn, meta_key, json.dumps({"updated_at": newest, "boundary": stamps}))
+    logger.info(f"Exported {written} listings to {path} in {time.monotonic() - started:.1f}s")
+    return path, written
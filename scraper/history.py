@@ -0,0 +1,198 @@
+"""
+Listing change tracking and price history.
+
+A full crawl only fetches listings it has never stored, so a price drop on a
+known ad used to go unseen. Two tables fix that:
+
+- listing_cards keeps a hash of each listing's search-page card (title,
+  price, location). A recheck crawl (run_scraper(recheck=True)) compares
+  the cards it walks past against these hashes and fetches detail pages
+  only for listings whose card changed, so it costs about the same search
+  page requests as a normal crawl.
+- listing_history gets one row when a crawl first stores a listing and one
+  row whenever a later save changes one of config.HISTORY_FIELDS: the price
+  at that time plus the new values of the other fields that changed.
+
+price_history() and price_changes() read the time series back.
+"""
+import json
+import time
+import hashlib
+import logging
+from . import config, db
+
+logger = logging.getLogger(__name__)
+
+
+def card_hash(card):
+    """Signed 64-bit hash of what a search-page card shows."""
+    price, location, _ = db.index_fields(card)
+    text = "\x1f".join((" ".join((card.get("title") or "").split()), repr(price), location or ""))
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def changed_cards(cards):
+    """Search-page cards of stored listings whose content changed since they were saved.
+
+    Unchanged cards get their checked_at stamped. A card seen for the first
+    time (a listing stored before cards were recorded, or by another crawl
+    mode) only sets the baseline hash; it is not reported as changed.
+    """
+    if not cards:
+        return []
+    conn = db.connect()
+    ids = [card["listing_id"] for card in cards]
+    stored = dict(conn.execute(
+        f"SELECT listing_id, card_hash FROM listing_cards WHERE listing_id IN ({', '.join('?' * len(ids))})", ids
+    ))
+    now = time.time()
+    changed = []
+    baseline = []
+    unchanged = []
+    for card in cards:
+        previous = stored.get(card["listing_id"])
+        if previous is None:
+            baseline.append(card)
+        elif previous != card_hash(card):
+            changed.append(card)
+        else:
+            unchanged.append((now, card["listing_id"]))
+    with conn:
+        conn.executemany("UPDATE listing_cards SET checked_at = ? WHERE listing_id = ?", unchanged)
+    remember_cards(baseline)
+    return changed
+
+
+def remember_cards(cards):
+    """Store the card hashes of listings that were just saved (or baselined)."""
+    if not cards:
+        return
+    now = time.time()
+    conn = db.connect()
+    with conn:
+        conn.executemany(
+            "INSERT INTO listing_cards (listing_id, card_hash, checked_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(listing_id) DO UPDATE SET card_hash = excluded.card_hash, checked_at = excluded.checked_at",
+            [(card["listing_id"], card_hash(card), now) for card in cards],
+        )
+
+
+def _comparable(field, value):
+    if field == "price":
+        return db.index_fields({"price": value})[0]
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        try:
+            return float(value.replace(",", ""))
+        except ValueError:
+            return value
+    return float(value) if isinstance(value, (int, float)) else value
+
+
+def changes(old, new):
+    """{field: new value} for the HISTORY_FIELDS that differ between two versions of a listing.
+
+    A field missing from either version (filled in later, or not parsed
+    this time) is not a change; "3" and 3 (normalized or not) compare equal.
+    """
+    diff = {}
+    for field in config.HISTORY_FIELDS:
+        before = _comparable(field, old.get(field))
+        after = _comparable(field, new.get(field))
+        if before is not None and after is not None and before != after:
+            diff[field] = new.get(field)
+    return diff
+
+
+def previous_versions(conn, listings):
+    """{listing_id: (updated_at, listing)} as stored before a save overwrites them."""
+    ids = [str(listing["listing_id"]) for listing in listings]
+    rows = conn.execute(
+        f"SELECT listing_id, updated_at, data FROM listings WHERE listing_id IN ({', '.join('?' * len(ids))})", ids
+    ).fetchall()
+    return {listing_id: (updated_at, json.loads(data)) for listing_id, updated_at, data in rows}
+
+
+def record(conn, listings, previous, now):
+    """Append history rows for a batch being saved (inside the save transaction).
+
+    previous comes from previous_versions() taken before the upsert. Returns
+    the number of listings that changed.
+    """
+    with_history = set()
+    ids = list(previous)
+    if ids:
+        with_history = {row[0] for row in conn.execute(
+            f"SELECT DISTINCT listing_id FROM listing_history WHERE listing_id IN ({', '.join('?' * len(ids))})", ids
+        )}
+    rows = []
+    changed = 0
+    for listing in listings:
+        listing_id = str(listing["listing_id"])
+        price = db.index_fields(listing)[0]
+        if listing_id not in previous:
+            rows.append((listing_id, now, price, None))
+            continue
+        updated_at, old = previous[listing_id]
+        diff = changes(old, listing)
+        if not diff:
+            continue
+        changed += 1
+        logger.info(f"Listing {listing_id} changed: {', '.join(diff)}")
+        if listing_id not in with_history:
+            # Stored before history was kept: its old version starts the series
+            rows.append((listing_id, updated_at, db.index_fields(old)[0], None))
+        diff.pop("price", None)
+        rows.append((listing_id, now, price, json.dumps(diff, ensure_ascii=False) if diff else None))
+    conn.executemany(
+        "INSERT OR REPLACE INTO listing_history (listing_id, observed_at, price, changes) VALUES (?, ?, ?, ?)",
+        rows,
+    )
+    return changed
+
+
+def _timestamp(seconds):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds))
+
+
+def price_history(listing_id):
+    """[{observed_at, price, changes}] for one listing, oldest first."""
+    rows = db.connect().execute(
+        "SELECT observed_at, price, changes FROM listing_history WHERE listing_id = ? ORDER BY observed_at",
+        (listing_id,),
+    )
+    return [
+        {"observed_at": _timestamp(observed_at), "price": price, "changes": json.loads(diff) if diff else {}}
+        for observed_at, price, diff in rows
+    ]
+
+
+def price_changes(days=None, limit=50):
+    """Most recent price changes across the store, newest first.
+
+    Each entry has listing_id, observed_at, old_price, price and the change in
+    percent; days limits them to the last N days.
+    """
+    since = time.time() - days * 86400 if days else 0
+    rows = db.connect().execute(
+        """
+        SELECT listing_id, observed_at, old_price, price FROM (
+            SELECT listing_id, observed_at, price,
+                   LAG(price) OVER (PARTITION BY listing_id ORDER BY observed_at) AS old_price
+            FROM listing_history
+        )
+        WHERE observed_at >= ? AND old_price IS NOT NULL AND price IS NOT old_price
+        ORDER BY observed_at DESC LIMIT ?
+        """,
+        (since, limit),
+    )
+    return [
+        {
+            "listing_id": listing_id,
+            "observed_at": _timestamp(observed_at),
+            "old_price": old_price,
+            "price": price,
+            "percent": round((price - old_price) / old_price * 100, 1) if price is not None and old_price else None,
+        }
+        for listing_id, observed_at, old_price, price in rows
+    ]
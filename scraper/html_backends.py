@@ -0,0 +1,129 @@
+"""
+Pluggable HTML parser backends for parsers.py.
+
+Every backend exposes the same handful of operations the parsers need
+(parse, select, select_one, text, attr, next_sibling) so the CSS selectors in
+config.SELECTORS run unchanged on any of them:
+
+- "html.parser": BeautifulSoup with the stdlib parser (always available)
+- "lxml": BeautifulSoup on the lxml tree builder
+- "selectolax": selectolax's Lexbor engine with native CSS matching
+
+config.PARSER_BACKEND picks one by name and defaults to "html.parser"; "auto"
+takes the fastest installed. The others are opt-in, once
+benchmarks/check_parser_backends.py shows they agree with html.parser.
+"""
+import logging
+from bs4 import BeautifulSoup
+from . import config
+
+logger = logging.getLogger(__name__)
+
+AUTO_ORDER = ("selectolax", "lxml", "html.parser")
+
+
+class SoupBackend:
+    """BeautifulSoup with a configurable tree builder."""
+
+    def __init__(self, builder):
+        self.name = builder
+        self.builder = builder
+
+    def parse(self, html):
+        return BeautifulSoup(html, self.builder)
+
+    def select(self, node, selector):
+        return node.select(selector)
+
+    def select_one(self, node, selector):
+        return node.select_one(selector)
+
+    def text(self, node):
+        return node.get_text(strip=True)
+
+    def attr(self, node, name):
+        return node.get(name)
+
+    def next_sibling(self, node, tag):
+        return node.find_next_sibling(tag)
+
+
+class SelectolaxBackend:
+    """selectolax (Lexbor) backend; selectors are matched natively in C."""
+
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def parse(self, html):
+        return self._parser(html)
+
+    def select(self, node, selector):
+        return node.css(selector)
+
+    def select_one(self, node, selector):
+        return node.css_first(selector)
+
+    def text(self, node):
+        return node.text(deep=True, separator="", strip=True)
+
+    def attr(self, node, name):
+        return node.attributes.get(name)
+
+    def next_sibling(self, node, tag):
+        sibling = node.next
+        while sibling is not None:
+            if sibling.tag == tag:
+                return sibling
+            sibling = sibling.next
+        return None
+
+
+def _create(name):
+    if name == "selectolax":
+        return SelectolaxBackend()
+    if name == "lxml":
+        import lxml  # noqa: F401  (fail here rather than inside BeautifulSoup)
+        return SoupBackend("lxml")
+    if name == "html.parser":
+        return SoupBackend("html.parser")
+    raise ValueError(f"Unknown parser backend: {name}")
+
+
+def available_backends():
+    """Names of the backends that can be created in this environment."""
+    names = []
+    for name in AUTO_ORDER:
+        try:
+            _create(name)
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+_backends = {}
+
+
+def get_backend(name=None):
+    """Return a (cached) backend by name, defaulting to config.PARSER_BACKEND.
+
+    Unavailable backends fall back to html.parser with a warning.
+    """
+    name = name or config.PARSER_BACKEND
+    if name in _backends:
+        return _backends[name]
+
+    if name == "auto":
+        backend = _create(available_backends()[0])
+    else:
+        try:
+            backend = _create(name)
+        except ImportError:
+            logger.warning(f"Parser backend {name} is not installed, using html.parser")
+            backend = _create("html.parser")
+
+    _backends[name] = backend
+    return backend
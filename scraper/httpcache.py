@@ -0,0 +1,265 @@
+"""
+On-disk HTTP cache for search and detail pages.
+
+CachingAdapter sits under the sessions made by utils.get_session. GET
+responses for listing pages are stored zlib-compressed in their own SQLite
+file (config.HTTP_CACHE_FILE):
+
+- within the TTL for the URL's class (config.HTTP_CACHE_TTL) the stored page is
+  returned without touching the network or the rate limiter
+- after that the request is revalidated with If-None-Match/If-Modified-Since
+  when the server gave an ETag/Last-Modified, and a 304 reuses the stored body
+- once the cache grows past config.HTTP_CACHE_MAX_BYTES the least recently
+  used entries are evicted
+
+Image downloads (streamed) and other URLs pass straight through.
+"""
+import json
+import time
+import zlib
+import logging
+import threading
+from urllib.parse import urlparse
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from . import config, db
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    url_class TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    raw_size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses(accessed_at);
+"""
+
+# Describe the decoded body we store, not the original transfer
+DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def url_class(url):
+    """'search' or 'detail' for cacheable listing pages, otherwise None."""
+    path = urlparse(url).path
+    if "/ads/" in path:
+        return "search"
+    if "/ad/" in path:
+        return "detail"
+    return None
+
+
+class HttpCache:
+    def __init__(self, path=None, max_bytes=None, ttl=None):
+        self.path = path or config.HTTP_CACHE_FILE
+        self.max_bytes = max_bytes or config.HTTP_CACHE_MAX_BYTES
+        self.ttl = ttl or config.HTTP_CACHE_TTL
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "evicted": 0,
+                         "bytes_saved": 0, "bytes_downloaded": 0}
+        self._total_bytes = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        return db.connect(self.path, schema=SCHEMA)
+
+    def count(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                self.counters[key] += amount
+
+    # Lookups
+
+    def lookup(self, url):
+        row = self._conn().execute(
+            "SELECT status, headers, body, raw_size, etag, last_modified, stored_at, url_class "
+            "FROM responses WHERE url = ?", (url,)
+        ).fetchone()
+        if not row:
+            return None
+        keys = ("status", "headers", "body", "raw_size", "etag", "last_modified", "stored_at", "url_class")
+        return dict(zip(keys, row))
+
+    def is_fresh(self, url, entry=None):
+        cls = url_class(url)
+        if cls is None:
+            return False
+        entry = entry or self.lookup(url)
+        return bool(entry) and time.time() - entry["stored_at"] < self.ttl.get(cls, 0)
+
+    def touch(self, url, revalidated=False):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            if revalidated:
+                conn.execute("UPDATE responses SET accessed_at = ?, stored_at = ? WHERE url = ?", (now, now, url))
+            else:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+
+    # Writes
+
+    def store(self, url, response):
+        body = response.content
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        compressed = zlib.compress(body, config.HTTP_CACHE_COMPRESSION)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            old = conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (url, url_class, status, headers, body, size, raw_size, "
+                "etag, last_modified, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, url_class(url), response.status_code, json.dumps(headers), compressed, len(compressed),
+                 len(body), response.headers.get("ETag"), response.headers.get("Last-Modified"), now, now),
+            )
+        self.count(stored=1)
+        self._grow(len(compressed) - (old[0] if old else 0))
+
+    def _grow(self, delta):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._conn().execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            else:
+                self._total_bytes += delta
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def evict(self, target=None):
+        """Drop least recently used entries until the cache is below target bytes (90% of max)."""
+        target = self.max_bytes * 0.9 if target is None else target
+        conn = self._conn()
+        with self._lock:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            victims = []
+            for url, size in conn.execute("SELECT url, size FROM responses ORDER BY accessed_at"):
+                if total <= target:
+                    break
+                victims.append((url,))
+                total -= size
+            with conn:
+                conn.executemany("DELETE FROM responses WHERE url = ?", victims)
+            self._total_bytes = total
+            self.counters["evicted"] += len(victims)
+        return len(victims)
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            removed = conn.execute("DELETE FROM responses").rowcount
+        conn.execute("VACUUM")
+        with self._lock:
+            self._total_bytes = 0
+        return removed
+
+    # Reporting
+
+    def stats(self):
+        """Counters for this process plus what the cache holds on disk."""
+        entries, size, raw_size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(raw_size), 0) FROM responses"
+        ).fetchone()
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats.update({
+            "hit_ratio": round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "stored_bytes": size,
+            "uncompressed_bytes": raw_size,
+            "compression_ratio": round(raw_size / size, 2) if size else 1.0,
+        })
+        return stats
+
+    def log_summary(self):
+        with self._lock:
+            c = dict(self.counters)
+        if c["hits"] or c["revalidated"] or c["misses"]:
+            logger.info(
+                f"HTTP cache: {c['hits']} hits, {c['revalidated']} revalidated, {c['misses']} misses, "
+                f"{c['bytes_saved']} bytes saved, {c['evicted']} evicted"
+            )
+
+
+def cached_response(request, entry, adapter):
+    """Build a requests Response from a cache entry."""
+    response = Response()
+    response.status_code = entry["status"]
+    response.reason = "OK"
+    response.headers = CaseInsensitiveDict(json.loads(entry["headers"]))
+    response._content = zlib.decompress(entry["body"])
+    response._content_consumed = True
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+    response.from_cache = True
+    return response
+
+
+class CachingAdapter(HTTPAdapter):
+    """HTTPAdapter that serves listing pages from an HttpCache."""
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != "GET" or stream or url_class(request.url) is None:
+            return super().send(request, stream=stream, **kwargs)
+
+        url = request.url
+        entry = self.cache.lookup(url)
+        # "Cache-Control: no-cache" on the request forces a conditional request
+        revalidate = "no-cache" in request.headers.get("Cache-Control", "")
+        if entry and not revalidate and self.cache.is_fresh(url, entry):
+            self.cache.touch(url)
+            self.cache.count(hits=1, bytes_saved=entry["raw_size"])
+            return cached_response(request, entry, self)
+
+        if entry:
+            if entry["etag"]:
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = super().send(request, stream=stream, **kwargs)
+        if entry and response.status_code == 304:
+            response.close()
+            self.cache.touch(url, revalidated=True)
+            self.cache.count(revalidated=1, bytes_saved=entry["raw_size"])
+            return cached_response(request, entry, self)
+
+        self.cache.count(misses=1, bytes_downloaded=len(response.content))
+        if response.status_code == 200:
+            self.cache.store(url, response)
+        return response
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache shared by every session."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+        return _cache
+
+
+def is_fresh(session, url):
+    """True if session would answer url from its cache without a request."""
+    cache = getattr(session, "http_cache", None)
+    return cache is not None and cache.is_fresh(url)
@@ -0,0 +1,348 @@
+"""
+Concurrent, resumable, content-addressed image storage.
+
+Images are fetched by a shared pool of worker threads over one pooled
+session, streamed to disk in chunks while being hashed, and stored once under
+storage/blobs/<aa>/<sha256>.<ext>. Agents repost the same photos across
+many ads, so identical bytes are only kept once and a source URL that has been
+seen before is not downloaded again at all.
+
+Listing directories hold only a manifest.json that maps image_N.<ext> to its
+blob; the image_refs table mirrors those references for the dedupe report and
+for garbage-collecting blobs nothing points at. A listing's references are
+written once all of its images are done, so every use of a blob refreshes
+its mtime and gc leaves recently used blobs alone.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import config, db, utils, ratelimit, metrics, profiling
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+_pool = None
+_session = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _session
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=config.IMAGE_WORKERS, thread_name_prefix="images")
+            _session = utils.get_session(pool_size=config.IMAGE_WORKERS, cache=False)
+        return _pool, _session
+
+
+def shutdown():
+    """Stop the worker pool (waits for queued downloads)."""
+    global _pool, _session
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _session.close()
+        _pool = _session = None
+
+
+def image_extension(url):
+    ext = url.split('.')[-1].split('?')[0]
+    if len(ext) > 4 or not ext:
+        ext = "jpg"
+    return ext
+
+
+def blob_path(blob):
+    return os.path.join(config.BLOBS_DIR, blob)
+
+
+def blob_exists(blob, size=None):
+    path = blob_path(blob)
+    return os.path.exists(path) and (size is None or os.path.getsize(path) == size)
+
+
+# Manifests
+
+def load_manifest(listing_dir):
+    """Return the listing's manifest as {url: entry}."""
+    path = os.path.join(listing_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {entry["url"]: entry for entry in json.load(f).get("images", [])}
+    except (ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable image manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(listing_dir, listing_id, entries):
+    utils.write_json_atomic(
+        os.path.join(listing_dir, MANIFEST_NAME),
+        {"listing_id": str(listing_id), "images": entries},
+    )
+
+
+def is_complete(entry):
+    """True if the manifest entry's blob is on disk with the recorded size."""
+    return bool(entry) and entry.get("status") == "ok" and bool(entry.get("blob")) \
+        and blob_exists(entry["blob"], entry.get("size"))
+
+
+def resolve_image(listing_id, filename):
+    """Map /images/<listing_id>/<filename> to its blob path, or None."""
+    listing_dir = os.path.join(config.IMAGES_DIR, str(listing_id))
+    for entry in load_manifest(listing_dir).values():
+        if entry.get("file") == filename and entry.get("blob"):
+            return blob_path(entry["blob"])
+    return None
+
+
+def first_blob(listing_id):
+    """Blob name of the listing's first stored image, or None."""
+    listing_dir = os.path.join(config.IMAGES_DIR, str(listing_id))
+    for entry in load_manifest(listing_dir).values():
+        if entry.get("status") == "ok" and entry.get("blob"):
+            return entry["blob"]
+    return None
+
+
+# Blob store
+
+def store_file(tmp_path, digest, ext):
+    """Move a fully written temp file into the blob store. Returns the blob name."""
+    blob = f"{digest[:2]}/{digest}.{ext}"
+    path = blob_path(blob)
+    if os.path.exists(path):
+        # Same bytes already stored for another URL or listing
+        os.remove(tmp_path)
+        touch_blob(blob)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return blob
+
+
+def touch_blob(blob):
+    """Mark a blob as just used, so gc keeps it until the listing's refs are saved."""
+    try:
+        os.utime(blob_path(blob))
+        return True
+    except OSError:
+        return False
+
+
+def lookup_url(url):
+    """Return (blob, size) for a previously fetched URL whose blob is still on disk."""
+    row = db.connect().execute("SELECT blob, size FROM image_blobs WHERE url = ?", (url,)).fetchone()
+    if row and blob_exists(row[0], row[1]) and touch_blob(row[0]):
+        return row
+    return None
+
+
+def remember_url(url, blob, size):
+    conn = db.connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO image_blobs (url, blob, size) VALUES (?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET blob = excluded.blob, size = excluded.size",
+            (url, blob, size),
+        )
+
+
+def fetch_to_blob(session, url):
+    """Stream url into the blob store. Returns (blob, size), or None on failure."""
+    limiter = ratelimit.get_limiter()
+    os.makedirs(config.BLOBS_DIR, exist_ok=True)
+    tmp_path = os.path.join(config.BLOBS_DIR, f".{uuid.uuid4().hex}.part")
+    limiter.wait(url)
+    try:
+        with session.get(url, timeout=config.TIMEOUT, stream=True) as response:
+            limiter.record(url, response.status_code, response.headers)
+            if response.status_code != 200:
+                logger.error(f"Failed to download image {url}: HTTP {response.status_code}")
+                return None
+
+            size = 0
+            digest = hashlib.sha256()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=config.IMAGE_CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+
+            # Content-Length counts the bytes on the wire, before a
+            # Content-Encoding (gzip from some CDNs) is undone
+            received = response.raw.tell()
+            expected = response.headers.get("Content-Length")
+            if expected and expected.isdigit() and int(expected) != received:
+                logger.error(f"Truncated image {url}: got {received} of {expected} bytes")
+                os.remove(tmp_path)
+                return None
+
+        metrics.inc("image_bytes_total", size)
+        return store_file(tmp_path, digest.hexdigest(), image_extension(url)), size
+    except Exception as e:
+        logger.error(f"Failed to download image {url}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+
+def _adopt_legacy_file(listing_dir, entry):
+    """Move an image saved in the listing directory by older runs into the blob store."""
+    path = os.path.join(listing_dir, entry.get("file", ""))
+    if entry.get("blob") or entry.get("status") != "ok" or not os.path.isfile(path) \
+            or os.path.getsize(path) != entry.get("size"):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(config.IMAGE_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    blob = store_file(path, digest.hexdigest(), image_extension(entry["file"]))
+    remember_url(entry["url"], blob, entry["size"])
+    return {**entry, "blob": blob}
+
+
+@profiling.staged("images")
+def _download_one(session, index, url):
+    filename = f"image_{index + 1}.{image_extension(url)}"
+    known = lookup_url(url)
+    if known:
+        blob, size = known
+        reused = True
+    else:
+        result = fetch_to_blob(session, url)
+        if result is None:
+            return {"url": url, "file": filename, "blob": None, "size": None, "status": "failed"}, False
+        blob, size = result
+        remember_url(url, blob, size)
+        reused = False
+    return {"url": url, "file": filename, "blob": blob, "size": size, "status": "ok"}, reused
+
+
+def _save_refs(listing_id, entries):
+    conn = db.connect()
+    with conn:
+        conn.execute("DELETE FROM image_refs WHERE listing_id = ?", (str(listing_id),))
+        conn.executemany(
+            "INSERT INTO image_refs (listing_id, position, blob) VALUES (?, ?, ?)",
+            [(str(listing_id), i, e["blob"]) for i, e in enumerate(entries) if e["status"] == "ok"],
+        )
+
+
+def download_listing_images(listing_id, image_urls, limit=10):
+    """Store a listing's images on the shared pool and update its manifest.
+
+    Returns (listing_dir, downloaded, skipped); skipped counts images that were
+    already complete or whose URL had been fetched before.
+    """
+    listing_dir = os.path.join(config.IMAGES_DIR, str(listing_id))
+    os.makedirs(listing_dir, exist_ok=True)
+    pool, session = _get_pool()
+    manifest = load_manifest(listing_dir)
+
+    entries = []
+    futures = []
+    skipped = 0
+    for i, url in enumerate(image_urls[:limit]):
+        # Inline data: URIs are placeholders, not real photos
+        if not url or not url.startswith("http"):
+            continue
+        entry = manifest.get(url)
+        if entry and not entry.get("blob"):
+            entry = _adopt_legacy_file(listing_dir, entry)
+        if is_complete(entry):
+            entries.append(entry)
+            skipped += 1
+        else:
+            entries.append(None)
+            futures.append((len(entries) - 1, pool.submit(_download_one, session, i, url)))
+
+    downloaded = 0
+    for position, future in futures:
+        entries[position], reused = future.result()
+        if entries[position]["status"] == "ok":
+            skipped += reused
+            downloaded += not reused
+
+    save_manifest(listing_dir, listing_id, entries)
+    _save_refs(listing_id, entries)
+    if skipped:
+        logger.info(f"Listing {listing_id}: {downloaded} images downloaded, {skipped} reused")
+    return listing_dir, downloaded, skipped
+
+
+# Reporting and cleanup
+
+def _blob_files():
+    """Yield (blob, size) for every file in the blob store."""
+    if not os.path.exists(config.BLOBS_DIR):
+        return
+    for prefix in os.listdir(config.BLOBS_DIR):
+        prefix_dir = os.path.join(config.BLOBS_DIR, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if not name.startswith("."):
+                yield f"{prefix}/{name}", os.path.getsize(os.path.join(prefix_dir, name))
+
+
+def dedupe_report():
+    """Summarise how much the blob store saves over one file per listing image."""
+    conn = db.connect()
+    refs = conn.execute("SELECT blob, COUNT(*) FROM image_refs GROUP BY blob").fetchall()
+    on_disk = dict(_blob_files())
+    referenced_blobs = {blob for blob, _ in refs}
+
+    logical_bytes = sum(on_disk.get(blob, 0) * count for blob, count in refs)
+    stored_bytes = sum(on_disk.values())
+    references = sum(count for _, count in refs)
+    return {
+        "references": references,
+        "unique_blobs": len(referenced_blobs),
+        "blobs_on_disk": len(on_disk),
+        "unreferenced_blobs": len(set(on_disk) - referenced_blobs),
+        "logical_bytes": logical_bytes,
+        "stored_bytes": stored_bytes,
+        "dedupe_ratio": round(references / len(referenced_blobs), 3) if referenced_blobs else 1.0,
+        "bytes_saved": max(0, logical_bytes - stored_bytes),
+        "known_urls": conn.execute("SELECT COUNT(*) FROM image_blobs").fetchone()[0],
+    }
+
+
+def garbage_collect(dry_run=False, grace=None):
+    """Delete blobs no listing references. Returns (blobs_removed, bytes_freed).
+
+    Blobs used in the last `grace` seconds (config.IMAGE_GC_GRACE) are kept:
+    a running crawl may have stored them for a listing whose refs are not
+    saved yet.
+    """
+    conn = db.connect()
+    referenced = {row[0] for row in conn.execute("SELECT DISTINCT blob FROM image_refs")}
+    cutoff = time.time() - (config.IMAGE_GC_GRACE if grace is None else grace)
+    removed = freed = recent = 0
+    deleted = []
+    for blob, size in list(_blob_files()):
+        if blob in referenced:
+            continue
+        if os.path.getmtime(blob_path(blob)) > cutoff:
+            recent += 1
+            continue
+        removed += 1
+        freed += size
+        if not dry_run:
+            os.remove(blob_path(blob))
+            deleted.append((blob,))
+    if deleted:
+        with conn:
+            conn.executemany("DELETE FROM image_blobs WHERE blob = ?", deleted)
+    logger.info(f"Image GC{' (dry run)' if dry_run else ''}: {removed} unreferenced blobs, {freed} bytes"
+                f"{f'; {recent} recently used kept' if recent else ''}")
+    return removed, freed
@@ -0,0 +1,93 @@
+"""
+Early termination for incremental (daily) crawls.
+
+Search results are ordered newest first, so once a crawl reaches ads it has
+already stored there is little reason to keep paging. A crawl stops after
+config.INCREMENTAL_STOP_PAGES pages in a row that contained only known
+listings, counted from the page where it passed the previous run's
+high-water mark: the newest ads that run saw on page 1.
+
+Bumped (paid re-listing) cards sit near the top every day, so they never
+enter the mark, and the mark holds ad slugs (the last part of the ad URL)
+rather than listing_id, which is only the slug's last word. A run that never
+meets the mark (all of its ads were taken down) walks on until its target or
+the last page, which is the safe way to fail. The mark is kept in the
+database meta table between runs.
+"""
+import json
+import time
+import logging
+from urllib.parse import urlparse
+from . import config, db
+
+logger = logging.getLogger(__name__)
+
+META_KEY = "high_water_mark"
+
+
+def ad_id(listing):
+    """The ad's slug, unique per ad, or None for a card without a URL."""
+    path = urlparse(listing.get("source_url") or "").path.rstrip("/")
+    return path.rsplit("/", 1)[-1] or None
+
+
+def load_high_water_mark():
+    value = db.get_meta(db.connect(), META_KEY)
+    return json.loads(value) if value else {}
+
+
+def save_high_water_mark(ad_ids):
+    conn = db.connect()
+    mark = {"ad_ids": ad_ids, "updated": time.strftime("%Y-%m-%d %H:%M:%S")}
+    with conn:
+        db.set_meta(conn, META_KEY, json.dumps(mark))
+    return mark
+
+
+class IncrementalTracker:
+    """Decides when an incremental crawl can stop walking search pages."""
+
+    def __init__(self, stop_after=None):
+        self.stop_after = stop_after or config.INCREMENTAL_STOP_PAGES
+        self.mark = load_high_water_mark()
+        # Marks saved before they held ad slugs ("listing_ids") are not used
+        self.marker_ids = set(self.mark.get("ad_ids", []))
+        self.passed_mark = not self.marker_ids
+        self.consecutive_known = 0
+        self.newest_ids = None
+        self.reason = None
+
+    def observe_page(self, page, listings, existing_ids):
+        """Look at a search page before its listings are processed.
+
+        Returns True if the crawl should stop once this page is done.
+        """
+        ids = [l.get("listing_id") for l in listings if l.get("listing_id")]
+        organic = [ad_id(l) for l in listings if not l.get("bumped") and ad_id(l)]
+        if page == 1 and self.newest_ids is None:
+            self.newest_ids = organic[:config.HIGH_WATER_IDS]
+
+        if not self.passed_mark and self.marker_ids.intersection(organic):
+            logger.info(f"Reached previous high-water mark on page {page}")
+            self.passed_mark = True
+
+        if ids and all(listing_id in existing_ids for listing_id in ids):
+            self.consecutive_known += 1
+        else:
+            self.consecutive_known = 0
+        if self.passed_mark and self.consecutive_known >= self.stop_after:
+            self.reason = f"{self.consecutive_known} consecutive fully-known pages"
+            return True
+        return False
+
+    def finish(self, exhausted=False):
+        """Persist the new high-water mark (the newest ads seen on page 1).
+
+        The mark only moves once the crawl has caught up with the previous one
+        (it stopped early here, or ran out of pages); a run cut short by its
+        target or an error keeps the old mark so the gap is walked next time.
+        """
+        if self.reason:
+            logger.info(f"Incremental crawl stopped early: {self.reason}")
+        if self.newest_ids and (self.reason or exhausted):
+            save_high_water_mark(self.newest_ids)
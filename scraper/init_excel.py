@@ -24,9 +24,10 @@ columns = [
     "scraped_date"
 ]
 
-if not os.path.exists(file_path):
-    df = pd.DataFrame(columns=columns)
-    df.to_excel(file_path, index=False)
-    print("Excel file initialized successfully.")
-else:
-    print("Excel file already exists.")
\ No newline at end of file
+if __name__ == "__main__":
+    if not os.path.exists(file_path):
+        df = pd.DataFrame(columns=columns)
+        df.to_excel(file_path, index=False)
+        print("Excel file initialized successfully.")
+    else:
+        print("Excel file already exists.")
\ No newline at end of file
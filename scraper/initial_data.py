@@ -0,0 +1,41 @@
+"""
+Fast window.initialData extraction.
+
+Finds the `window.initialData =` assignment in the raw HTML string and decodes
+the object in place with json.JSONDecoder.raw_decode, so no DOM is built and
+no regex has to guess where the object ends.
+"""
+import json
+
+MARKER = "window.initialData"
+
+_decoder = json.JSONDecoder()
+
+
+def extract_initial_data(html):
+    """Return the decoded window.initialData object.
+
+    Raises ValueError when the marker is missing or no assignment decodes.
+    """
+    error = None
+    pos = html.find(MARKER)
+    while pos != -1:
+        # Skip "window.initialData", whitespace and "=" up to the opening brace
+        start = pos + len(MARKER)
+        while start < len(html) and html[start] in " \t\r\n":
+            start += 1
+        if start < len(html) and html[start] == "=":
+            start += 1
+            while start < len(html) and html[start] in " \t\r\n":
+                start += 1
+            if html.startswith("{", start):
+                try:
+                    data, _ = _decoder.raw_decode(html, start)
+                    return data
+                except json.JSONDecodeError as e:
+                    error = e
+        pos = html.find(MARKER, start)
+
+    if error:
+        raise ValueError(f"JSON decode error: {error}")
+    raise ValueError("Could not find window.initialData script")
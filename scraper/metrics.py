@@ -0,0 +1,438 @@
+"""
+In-process crawl metrics.
+
+A single registry holds counters, histograms and gauges keyed by name and
+labels. The hot paths record into it:
+
+    fetch_seconds{host}            histogram  network fetch latency (utils.fetch_url)
+    fetch_bytes_total{host}        counter    response body bytes
+    fetch_responses_total{host,status}        status code, or "error"
+    fetch_cache_hits_total{host}   counter    pages answered by the HTTP cache
+    ratelimit_wait_seconds{host}   histogram  time spent blocked on the limiter
+    parse_seconds{page}            histogram  parsers.parse_search_page / parse_detail_page
+    save_seconds                   histogram  storage.save_listings transactions
+    listings_saved_total           counter
+    image_seconds                  histogram  storage.download_images per listing
+    images_downloaded_total, images_reused_total, image_bytes_total
+    queue_depth{queue}             gauge      sampled crawl queue sizes (current and max)
+
+reporting() wraps a run: it logs a summary line every config.METRICS_INTERVAL
+seconds, can keep a Prometheus text file up to date, and writes a JSON report
+to config.LOGS_DIR at the end. Work done in a process pool is recorded in the
+worker's own registry; call_in_worker() ships it back to the parent.
+"""
+import os
+import json
+import time
+import bisect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus-style (an implicit +Inf follows)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_PREFIX = "scraper_"
+
+
+class Histogram:
+    """Bucketed distribution with exact count, sum, min and max."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Approximate quantile, interpolated inside the bucket that holds it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = low + (high - low) * (rank - seen) / n
+                return min(max(estimate, self.min), self.max)
+            seen += n
+        return self.max
+
+    def state(self):
+        return {"counts": list(self.counts), "count": self.count, "sum": self.sum, "min": self.min, "max": self.max}
+
+    def merge(self, state):
+        self.counts = [a + b for a, b in zip(self.counts, state["counts"])]
+        self.count += state["count"]
+        self.sum += state["sum"]
+        for name, pick in (("min", min), ("max", max)):
+            if state[name] is not None:
+                ours = getattr(self, name)
+                setattr(self, name, state[name] if ours is None else pick(ours, state[name]))
+
+    def summary(self):
+        quantile = lambda q: None if not self.count else round(self.quantile(q), 6)
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": quantile(0.5),
+            "p95": quantile(0.95),
+            "p99": quantile(0.99),
+        }
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Thread-safe store of every metric recorded by this process."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}  # key -> [current, max]
+        self.queues = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def set_gauge(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            gauge = self.gauges.get(key)
+            if gauge is None:
+                self.gauges[key] = [value, value]
+            else:
+                gauge[0] = value
+                gauge[1] = max(gauge[1], value)
+
+    def track_queue(self, name, q):
+        """Sample q.qsize() into queue_depth{queue=name} until untrack_queue."""
+        with self._lock:
+            self.queues[name] = q
+
+    def untrack_queue(self, name):
+        with self._lock:
+            self.queues.pop(name, None)
+
+    def sample_queues(self):
+        with self._lock:
+            queues = list(self.queues.items())
+        for name, q in queues:
+            self.set_gauge("queue_depth", q.qsize(), queue=name)
+
+    def state(self):
+        """Plain-data copy for merge() in another process."""
+        with self._lock:
+            return {
+                "counters": list(self.counters.items()),
+                "histograms": [(key, h.state()) for key, h in self.histograms.items()],
+            }
+
+    def merge(self, state):
+        with self._lock:
+            for key, value in state["counters"]:
+                key = (key[0], tuple(map(tuple, key[1])))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, histogram_state in state["histograms"]:
+                key = (key[0], tuple(map(tuple, key[1])))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.merge(histogram_state)
+
+    # Reading
+
+    def counter_total(self, name):
+        with self._lock:
+            return sum(value for (n, _), value in self.counters.items() if n == name)
+
+    def combined(self, name):
+        """One histogram merging every label set of name."""
+        total = Histogram()
+        with self._lock:
+            for (n, _), histogram in self.histograms.items():
+                if n == name:
+                    total.merge(histogram.state())
+        return total
+
+    def snapshot(self):
+        """JSON-ready view of every metric."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, h.summary()) for key, h in self.histograms.items())
+            gauges = sorted((key, list(value)) for key, value in self.gauges.items())
+        now = time.time()
+        return {
+            "started": self.started,
+            "finished": now,
+            "elapsed": round(now - self.started, 3),
+            "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in counters],
+            "histograms": [{"name": n, "labels": dict(l), **s} for (n, l), s in histograms],
+            "gauges": [{"name": n, "labels": dict(l), "value": v, "max": m} for (n, l), (v, m) in gauges],
+        }
+
+    def time_breakdown(self):
+        """Total seconds recorded per timing histogram, largest first."""
+        totals = {}
+        with self._lock:
+            for (name, _), histogram in self.histograms.items():
+                totals[name] = totals.get(name, 0.0) + histogram.sum
+        return dict(sorted(((n, round(s, 3)) for n, s in totals.items()), key=lambda item: -item[1]))
+
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+def prometheus_text(registry=None):
+    """The registry in the Prometheus text exposition format."""
+    registry = registry or get_registry()
+    with registry._lock:
+        counters = sorted(registry.counters.items())
+        histograms = sorted((key, h.state(), h.buckets) for key, h in registry.histograms.items())
+        gauges = sorted((key, list(value)) for key, value in registry.gauges.items())
+
+    lines = []
+    declared = set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in counters:
+        metric = PROMETHEUS_PREFIX + name
+        declare(metric, "counter")
+        lines.append(f"{metric}{_labels_text(labels)} {value}")
+    for (name, labels), state, buckets in histograms:
+        metric = PROMETHEUS_PREFIX + name
+        declare(metric, "histogram")
+        cumulative = 0
+        for bound, n in zip(list(buckets) + ["+Inf"], state["counts"]):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_labels_text(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_sum{_labels_text(labels)} {state['sum']}")
+        lines.append(f"{metric}_count{_labels_text(labels)} {state['count']}")
+    for (name, labels), (value, high) in gauges:
+        for metric, v in ((PROMETHEUS_PREFIX + name, value), (f"{PROMETHEUS_PREFIX}{name}_max", high)):
+            declare(metric, "gauge")
+            lines.append(f"{metric}{_labels_text(labels)} {v}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path, registry=None):
+    """Replace path with the current Prometheus text (atomic, for node_exporter's textfile collector)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(registry))
+    os.replace(tmp_path, path)
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+
+def summary_line(registry=None, previous=None, interval=None):
+    """One-line progress summary. previous/interval (counter totals and seconds
+    since the last line) turn counts into rates."""
+    registry = registry or get_registry()
+    fetch = registry.combined("fetch_seconds")
+    parse = registry.combined("parse_seconds")
+    save = registry.combined("save_seconds")
+    totals = {
+        name: registry.counter_total(name)
+        for name in ("fetch_bytes_total", "fetch_cache_hits_total", "listings_saved_total",
+                     "images_downloaded_total", "image_bytes_total")
+    }
+    totals["fetches"] = fetch.count
+
+    def rate(name):
+        if not previous or not interval:
+            return ""
+        return f" ({(totals[name] - previous.get(name, 0)) / interval:.1f}/s)"
+
+    with registry._lock:
+        queues = sorted((dict(labels)["queue"], value) for (name, labels), value in registry.gauges.items()
+                        if name == "queue_depth")
+    queue_text = " ".join(f"{name}={current}/{high}" for name, (current, high) in queues)
+    line = (
+        f"Metrics: {fetch.count} fetches{rate('fetches')} p95 {_ms(fetch.quantile(0.95))}, "
+        f"{totals['fetch_cache_hits_total']} cached, {totals['fetch_bytes_total'] / 1e6:.1f} MB; "
+        f"parse p95 {_ms(parse.quantile(0.95))}; "
+        f"{totals['listings_saved_total']} saved{rate('listings_saved_total')} p95 {_ms(save.quantile(0.95))}; "
+        f"{totals['images_downloaded_total']} images{rate('images_downloaded_total')} "
+        f"{totals['image_bytes_total'] / 1e6:.1f} MB; "
+        f"rate-limit wait {registry.combined('ratelimit_wait_seconds').sum:.1f}s"
+    )
+    if queue_text:
+        line += f"; queues {queue_text}"
+    return line, totals
+
+
+class Reporter(threading.Thread):
+    """Samples queue depths every second and logs a summary every interval."""
+
+    def __init__(self, registry, interval, prometheus_path=None):
+        super().__init__(name="metrics-reporter", daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self.prometheus_path = prometheus_path
+        self.stopped = threading.Event()
+
+    def run(self):
+        last_report = time.monotonic()
+        previous = None
+        while not self.stopped.wait(config.METRICS_SAMPLE_INTERVAL):
+            self.registry.sample_queues()
+            now = time.monotonic()
+            if now - last_report < self.interval:
+                continue
+            line, previous = summary_line(self.registry, previous, now - last_report)
+            logger.info(line)
+            last_report = now
+            if self.prometheus_path:
+                try:
+                    write_prometheus(self.prometheus_path, self.registry)
+                except OSError as e:
+                    logger.error(f"Could not write metrics to {self.prometheus_path}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+@contextmanager
+def reporting(name="crawl", interval=None, prometheus_path=None, report_path=None):
+    """Collect metrics for one run.
+
+    Starts from an empty registry, logs summary lines while the block runs and,
+    on exit (including Ctrl-C), writes the JSON report and the final
+    Prometheus file and logs where the time went.
+    """
+    registry = reset()
+    reporter = Reporter(registry, interval or config.METRICS_INTERVAL, prometheus_path)
+    reporter.start()
+    try:
+        yield registry
+    finally:
+        reporter.stop()
+        registry.sample_queues()
+        logger.info(summary_line(registry)[0])
+        breakdown = registry.time_breakdown()
+        if breakdown:
+            logger.info("Time recorded: " + ", ".join(f"{n} {s:.1f}s" for n, s in breakdown.items()))
+        report = {"run": name, **registry.snapshot(), "time_breakdown": breakdown}
+        report_path = report_path or os.path.join(config.LOGS_DIR, f"metrics-{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Metrics report written to {report_path}")
+        if prometheus_path:
+            write_prometheus(prometheus_path, registry)
+
+
+_registry = Registry()
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide registry the hot paths record into."""
+    return _registry
+
+
+def reset():
+    """Swap in an empty registry and return it."""
+    global _registry
+    with _registry_lock:
+        _registry = Registry()
+        return _registry
+
+
+def inc(name, value=1, **labels):
+    _registry.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    _registry.observe(name, value, **labels)
+
+
+def set_gauge(name, value, **labels):
+    _registry.set_gauge(name, value, **labels)
+
+
+def track_queue(name, q):
+    _registry.track_queue(name, q)
+
+
+def untrack_queue(name):
+    _registry.untrack_queue(name)
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observe the block's wall time in seconds under name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registry.observe(name, time.perf_counter() - started, **labels)
+
+
+def timed(name, **labels):
+    """Decorator form of timer."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def call_in_worker(fn, *args):
+    """Run fn in a process pool worker; returns (result, metrics state) for merge().
+
+    Only meant for worker processes: it replaces the calling process's registry.
+    """
+    registry = reset()
+    result = fn(*args)
+    return result, registry.state()
+
+
+def merge(state):
+    _registry.merge(state)
@@ -0,0 +1,250 @@
+"""
+Typed listing fields.
+
+The parsers keep what the page shows: "65000 /month", "2340000 per perch",
+"8.0 perches", "1,500.0" (sqft), "10+" bedrooms. normalize_listing() turns
+those into numbers once, at ingest, so filters and aggregates never parse
+strings again:
+
+    price           float (LKR), None if the page had no number
+    rental_period   "month", "week", "day", "year" or None
+    price_unit      "perch", "acre", "sqft" or None (land priced per unit)
+    area_sqft       float, converted from perches/acres/m2 where needed
+    bedrooms        int ("10+" -> 10)
+    bathrooms       int
+
+The raw price text is kept in price_text. normalize_columns() applies the same
+rules to whole columns, which normalize_frame() (pandas) and the batch pass
+over the store (normalize_store) build on.
+"""
+import re
+import logging
+import numpy as np
+import pandas as pd
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+SQFT_PER = {"sqft": 1.0, "perch": 272.25, "acre": 43560.0, "m2": 10.7639, "hectare": 107639.0}
+
+# Amount, then an optional "Mn"/"lakh" multiplier
+AMOUNT = re.compile(r"(\d+(?:\.\d+)?)\s*(mn|million|lakhs?)?\b")
+MULTIPLIERS = {"mn": 1e6, "million": 1e6, "lakh": 1e5, "lakhs": 1e5}
+
+# "/month", "per month", "monthly"
+PERIOD = re.compile(r"(?:/|\bper\s+)\s*(month|mo|week|wk|day|night|year|yr|annum)\b|\b(monthly|weekly|daily|yearly|annually)\b")
+PERIODS = {
+    "month": "month", "mo": "month", "monthly": "month",
+    "week": "week", "wk": "week", "weekly": "week",
+    "day": "day", "night": "day", "daily": "day",
+    "year": "year", "yr": "year", "annum": "year", "yearly": "year", "annually": "year",
+}
+
+# "per perch", "/acre", "per sq.ft"
+PRICE_UNIT = re.compile(r"(?:/|\bper\s+)\s*(perch(?:es)?|acres?|sq\.?\s*ft|sqft)\b")
+
+# "8.0 perches", "1,500 sqft", "2 acres", "150 m2"; a bare number is sqft
+AREA = re.compile(r"(\d+(?:\.\d+)?)\s*(perch(?:es)?|p\b|acres?|sq\.?\s*ft|sqft|square\s+feet|ft²|m2|m²|sq\.?\s*m|hectares?|ha\b)?")
+
+COUNT = re.compile(r"(\d+)")
+
+
+def _unit(text):
+    """Canonical unit key for a matched unit string."""
+    if not text:
+        return None
+    text = text.replace(" ", "").replace(".", "")
+    if text.startswith("perch") or text == "p":
+        return "perch"
+    if text.startswith("acre"):
+        return "acre"
+    if text.startswith("hect") or text == "ha":
+        return "hectare"
+    if text in ("m2", "m²", "sqm"):
+        return "m2"
+    return "sqft"
+
+
+def _clean(text):
+    return text.replace(",", "").lower()
+
+
+def parse_price(value):
+    """(amount, rental_period, price_unit) from a price string or number."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (None if value != value else float(value)), None, None
+    if not isinstance(value, str):
+        return None, None, None
+    text = _clean(value)
+    match = AMOUNT.search(text)
+    amount = None
+    if match:
+        amount = float(match.group(1)) * MULTIPLIERS.get(match.group(2), 1)
+    period = PERIOD.search(text)
+    unit = PRICE_UNIT.search(text)
+    return (
+        amount,
+        PERIODS[period.group(1) or period.group(2)] if period else None,
+        _unit(unit.group(1)) if unit else None,
+    )
+
+
+def parse_area(value):
+    """Area in square feet from "8.0 perches", "1 acre 20 perches", "1,500 sqft", 1500.0, ...
+
+    The parts of a compound size (largest unit first) are added up; an amount
+    in the same or a larger unit than the one before it restates the size
+    ("1,500 sqft (139 m2)") and is ignored. A bare number is square feet.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return None if value != value else float(value)
+    if not isinstance(value, str):
+        return None
+    total = None
+    previous = None
+    for match in AREA.finditer(_clean(value)):
+        unit = _unit(match.group(2))
+        if previous is not None and (unit is None or SQFT_PER[unit] >= SQFT_PER[previous]):
+            break
+        total = (total or 0.0) + float(match.group(1)) * SQFT_PER[unit or "sqft"]
+        if unit is None:
+            break
+        previous = unit
+    return None if total is None else round(total, 2)
+
+
+def parse_count(value):
+    """Room count as an int ("3", "10+", 3.0); None if there is no number."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return None if value != value else int(value)
+    if not isinstance(value, str):
+        return None
+    match = COUNT.search(value)
+    return int(match.group(1)) if match else None
+
+
+def normalize_listing(listing):
+    """Return a copy of listing with typed price, area and room fields.
+
+    Safe to run on an already normalized listing.
+    """
+    data = dict(listing)
+    price = data.get("price")
+    if isinstance(price, str):
+        data["price_text"] = price
+        data["price"], data["rental_period"], data["price_unit"] = parse_price(price)
+    else:
+        data["price"] = parse_price(price)[0]
+        data.setdefault("price_text", None)
+        data.setdefault("rental_period", None)
+        data.setdefault("price_unit", None)
+
+    # Detail pages give House size (already sqft) in area_sqft and Land size
+    # only in area, so fall back to the raw area text
+    area_sqft = parse_area(data.get("area_sqft"))
+    if area_sqft is None:
+        area_sqft = parse_area(data.get("area"))
+    data["area_sqft"] = area_sqft
+
+    for key in ("bedrooms", "bathrooms"):
+        if key in data:
+            data[key] = parse_count(data[key])
+    return data
+
+
+# Bulk mode: the same rules over whole columns. Listing fields repeat a lot
+# ("3", "85000 /month", "10.0 perches"), so each distinct value is parsed once
+# and the results are broadcast back through pandas.factorize codes.
+
+INPUT_COLUMNS = ("price", "price_text", "rental_period", "price_unit", "area", "area_sqft", "bedrooms", "bathrooms")
+TYPED_COLUMNS = ("price", "price_text", "rental_period", "price_unit", "area_sqft", "bedrooms", "bathrooms")
+
+
+def _distinct(values):
+    """(codes, distinct values); code -1 (None/NaN) indexes the trailing None."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    return codes, list(uniques) + [None]
+
+
+def _broadcast(codes, results):
+    table = np.empty(len(results), dtype=object)
+    table[:] = results
+    return table[codes]
+
+
+def _object_column(values, n):
+    column = np.empty(n, dtype=object)
+    if values is not None:
+        column[:] = values
+    return column
+
+
+def normalize_columns(columns, n):
+    """Typed columns from raw ones.
+
+    columns maps INPUT_COLUMNS names to sequences of length n (missing names
+    count as all-None). Returns TYPED_COLUMNS names -> object arrays holding
+    Python values or None, matching normalize_listing row for row.
+    """
+    def raw(name):
+        return _object_column(columns.get(name), n)
+
+    codes, values = _distinct(raw("price"))
+    parsed = [parse_price(value) for value in values]
+    is_text = _broadcast(codes, [isinstance(value, str) for value in values]).astype(bool)
+    amount, period, unit = (_broadcast(codes, list(part)) for part in zip(*parsed))
+    out = {
+        "price": amount,
+        "price_text": np.where(is_text, _broadcast(codes, values), raw("price_text")),
+        "rental_period": np.where(is_text, period, raw("rental_period")),
+        "price_unit": np.where(is_text, unit, raw("price_unit")),
+    }
+
+    codes, values = _distinct(raw("area_sqft"))
+    area_sqft = _broadcast(codes, [parse_area(value) for value in values])
+    codes, values = _distinct(raw("area"))
+    from_area = _broadcast(codes, [parse_area(value) for value in values])
+    out["area_sqft"] = np.where(np.equal(area_sqft, None), from_area, area_sqft)
+
+    for key in ("bedrooms", "bathrooms"):
+        codes, values = _distinct(raw(key))
+        out[key] = _broadcast(codes, [parse_count(value) for value in values])
+    return out
+
+
+def normalize_frame(frame):
+    """Replace a DataFrame's raw price/area/room columns with typed ones (in place)."""
+    columns = {name: frame[name].to_numpy(dtype=object) for name in INPUT_COLUMNS if name in frame}
+    # DataFrame holes are NaN; normalize_columns treats NaN like None
+    out = normalize_columns(columns, len(frame))
+    dtypes = {"price": "float64", "area_sqft": "float64", "bedrooms": "Int64", "bathrooms": "Int64"}
+    for name in TYPED_COLUMNS:
+        if name in ("bedrooms", "bathrooms") and name not in frame:
+            continue
+        frame[name] = pd.Series(out[name], index=frame.index, dtype=dtypes.get(name, object))
+    return frame
+
+
+def normalize_records(listings):
+    """normalize_listing over a list of listings, using the bulk column mode."""
+    columns = {name: [listing.get(name) for listing in listings] for name in INPUT_COLUMNS}
+    out = normalize_columns(columns, len(listings))
+    records = []
+    for i, listing in enumerate(listings):
+        data = dict(listing)
+        for name in TYPED_COLUMNS:
+            if name in ("bedrooms", "bathrooms") and name not in listing:
+                continue
+            data[name] = out[name][i]
+        records.append(data)
+    return records
+
+
+def normalize_store(batch_size=1000):
+    """Batch pass: normalize every stored listing, rewriting only those that change. Returns the count."""
+    listings = storage.get_all_listings()
+    changed = [data for listing, data in zip(listings, normalize_records(listings)) if data != listing]
+    for start in range(0, len(changed), batch_size):
+        storage.save_listings(changed[start:start + batch_size])
+    logger.info(f"Normalized {len(changed)} of {len(listings)} stored listings")
+    return len(changed)
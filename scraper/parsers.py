@@ -1,37 +1,41 @@
-from bs4 import BeautifulSoup
 import logging
-from . import config
+from . import config, html_backends, metrics, profiling
 
 logger = logging.getLogger(__name__)
 
-def parse_search_page(html):
+@metrics.timed("parse_seconds", page="search")
+@profiling.staged("parse")
+def parse_search_page(html, backend=None):
     """Parse the search results page to get listing URLs and basic info."""
-    soup = BeautifulSoup(html, "html.parser")
+    dom = html_backends.get_backend(backend)
+    soup = dom.parse(html)
     listings = []
 
-    listing_items = soup.select(config.SELECTORS["listing_item"])
+    listing_items = dom.select(soup, config.SELECTORS["listing_item"])
     for item in listing_items:
         try:
-            link_tag = item.select_one(config.SELECTORS["listing_link"])
+            link_tag = dom.select_one(item, config.SELECTORS["listing_link"])
             if not link_tag:
                 continue
 
-            url = link_tag.get("href")
+            url = dom.attr(link_tag, "href")
             if url and not url.startswith("http"):
                 url = f"{config.BASE_URL}{url}"
 
             # Extract basic info available on search page
-            title_tag = item.select_one(config.SELECTORS["listing_title"])
-            price_tag = item.select_one(config.SELECTORS["listing_price"])
-            location_tag = item.select_one(config.SELECTORS["listing_location"])
-            image_tag = item.select_one(config.SELECTORS["listing_image"])
+            title_tag = dom.select_one(item, config.SELECTORS["listing_title"])
+            price_tag = dom.select_one(item, config.SELECTORS["listing_price"])
+            location_tag = dom.select_one(item, config.SELECTORS["listing_location"])
+            image_tag = dom.select_one(item, config.SELECTORS["listing_image"])
+            bumped_tag = dom.select_one(item, config.SELECTORS["listing_bumped"])
 
             listing = {
                 "source_url": url,
-                "title": title_tag.get_text(strip=True) if title_tag else "",
-                "price": price_tag.get_text(strip=True) if price_tag else "",
-                "location": location_tag.get_text(strip=True) if location_tag else "",
-                "image_url": image_tag.get("src") if image_tag else None,
+                "title": dom.text(title_tag) if title_tag else "",
+                "price": dom.text(price_tag) if price_tag else "",
+                "location": dom.text(location_tag) if location_tag else "",
+                "image_url": dom.attr(image_tag, "src") if image_tag else None,
+                "bumped": bumped_tag is not None,
                 "listing_id": url.split("-")[-1] if url else None
             }
 
@@ -47,34 +51,38 @@ def parse_search_page(html):
 
     return listings
 
-def parse_detail_page(html, url):
+@metrics.timed("parse_seconds", page="detail")
+@profiling.staged("parse")
+def parse_detail_page(html, url, backend=None):
     """Parse the detail page to extract more info."""
-    soup = BeautifulSoup(html, "html.parser")
+    dom = html_backends.get_backend(backend)
+    soup = dom.parse(html)
     data = {"source_url": url}
 
     try:
         # Title
-        title = soup.select_one("h1.title--3s1R8")
+        title = dom.select_one(soup, config.SELECTORS["detail_title"])
         if title:
-            data["title"] = title.get_text(strip=True)
+            data["title"] = dom.text(title)
 
         # Price (if not already from search page, or to update it)
-        price = soup.select_one("div.amount--3NTpl")
+        price = dom.select_one(soup, config.SELECTORS["detail_price"])
         if price:
-             p_text = price.get_text(strip=True)
+             p_text = dom.text(price)
              data["price"] = p_text.replace("Rs", "").replace(",", "").strip()
              data["currency"] = "LKR"
 
         # Description
-        desc = soup.select_one("div.description--1nxbC") or soup.find("div", class_=lambda x: x and "description" in x)
+        desc = (dom.select_one(soup, config.SELECTORS["detail_description"])
+                or dom.select_one(soup, config.SELECTORS["detail_description_fallback"]))
         if desc:
             # Check if there is a 'show more' button or similar, usually get full text
             # often description is in p tags
-            ps = desc.find_all("p")
+            ps = dom.select(desc, "p")
             if ps:
-                data["description"] = "\n".join([p.get_text(strip=True) for p in ps])
+                data["description"] = "\n".join([dom.text(p) for p in ps])
             else:
-                data["description"] = desc.get_text(strip=True)
+                data["description"] = dom.text(desc)
 
         # Property details (Bedrooms, Bathrooms, Area)
         # These are often in a definition list dl or similar
@@ -84,11 +92,11 @@ def parse_detail_page(html, url):
         attributes = {}
         # Try finding all divs with class 'word-break--2nyVq' inside a container
         # Or look for dt/dd pairs
-        for dt in soup.find_all("dt"):
-            dd = dt.find_next_sibling("dd")
+        for dt in dom.select(soup, "dt"):
+            dd = dom.next_sibling(dt, "dd")
             if dd:
-                key = dt.get_text(strip=True).replace(":", "")
-                value = dd.get_text(strip=True)
+                key = dom.text(dt).replace(":", "")
+                value = dom.text(dd)
                 attributes[key] = value
 
         # Also check for "Bedrooms: 3" text style
@@ -108,17 +116,17 @@ def parse_detail_page(html, url):
         # Look for gallery images
         # standard is often in a json script or img tags with class gallery
         images = []
-        gallery_imgs = soup.select("img.gallery-image--1nS9k") # hypothetical class
+        gallery_imgs = dom.select(soup, config.SELECTORS["detail_gallery_image"])
         if not gallery_imgs:
              # Try finding all images in the viewing container
-             gallery_div = soup.select_one("div.gallery-container") # potential
+             gallery_div = dom.select_one(soup, config.SELECTORS["detail_gallery"])
              if gallery_div:
-                 gallery_imgs = gallery_div.find_all("img")
+                 gallery_imgs = dom.select(gallery_div, "img")
 
         # Fallback: extract from meta tags or scripts if needed
         # For now, collect what we find
         for img in gallery_imgs:
-            src = img.get("src") or img.get("data-src")
+            src = dom.attr(img, "src") or dom.attr(img, "data-src")
             if src:
                 images.append(src)
 
@@ -127,9 +135,9 @@ def parse_detail_page(html, url):
         # Contact logic is tricky as it's often protected behind a button "Show Number"
         # We can trigger it? No, raw HTTP.
         # We might only get the name.
-        contact_name = soup.select_one("div.contact-name--m97 Sb")
+        contact_name = dom.select_one(soup, config.SELECTORS["detail_contact_name"])
         if contact_name:
-            data["contact_name"] = contact_name.get_text(strip=True)
+            data["contact_name"] = dom.text(contact_name)
 
     except Exception as e:
         logger.error(f"Error parsing detail page {url}: {e}")
@@ -0,0 +1,320 @@
+"""
+Pipelined crawl: fetch -> parse -> persist.
+
+Each stage runs on its own workers and the stages are joined by bounded
+queues, so network I/O, CPU-bound parsing and disk/image work overlap while
+memory stays capped at roughly `queue_size` pages per hop:
+
+- fetch: threads pull new listings and download their detail pages
+- parse: a process pool (one process per core, see utils.process_pool) runs build_listing
+- persist: threads download images and save listings
+
+Search pages are walked on the calling thread, which blocks whenever the
+fetch queue is full.
+"""
+import os
+import time
+import queue
+import collections
+import logging
+import threading
+from . import config, utils, parsers, storage, ratelimit, httpcache, metrics, profiling
+from .scraper import build_listing, persist_listing
+from .incremental import IncrementalTracker
+from .checkpoint import open_checkpoint, resume_image_jobs
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+def _parse_task(listing, html, profile):
+    """Process-pool task: build_listing plus the metrics and profile it recorded."""
+    (full_data, profile_stats), worker_metrics = metrics.call_in_worker(
+        profiling.call_in_worker, profile, build_listing, listing, html)
+    return full_data, worker_metrics, profile_stats
+
+
+class StageStats:
+    """Items handled and busy time for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, busy, ok=True):
+        with self._lock:
+            self.items += ok
+            self.errors += not ok
+            self.busy += busy
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    def summary(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "items": self.items,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy, 3),
+            "elapsed": round(elapsed, 3),
+            "per_second": round(self.items / elapsed, 2) if elapsed else 0.0,
+        }
+
+
+class Pipeline:
+    def __init__(self, target_count, fetch_workers, parse_workers, persist_workers, queue_size,
+                 incremental=False, checkpoint=None):
+        self.target_count = target_count
+        self.tracker = IncrementalTracker() if incremental else None
+        self.checkpoint = checkpoint or open_checkpoint(False)
+        self.exhausted = False
+        self.fetch_failed = False
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.persist_workers = persist_workers
+
+        self.fetch_queue = queue.Queue(maxsize=queue_size)
+        self.parse_queue = queue.Queue(maxsize=queue_size)
+        self.persist_queue = queue.Queue(maxsize=queue_size)
+
+        self.stats = {name: StageStats(name) for name in ("search", "fetch", "parse", "persist")}
+        self.stop = threading.Event()
+        self.saved = self.resumed = self.checkpoint.saved
+        self._saved_lock = threading.Lock()
+        self.session = utils.get_session(pool_size=fetch_workers)
+
+    # Stage workers
+
+    def _fetch_worker(self):
+        stats = self.stats["fetch"]
+        while True:
+            listing = self.fetch_queue.get()
+            if listing is _DONE:
+                return
+            if self.stop.is_set():
+                continue
+            started = time.monotonic()
+            response = utils.fetch_url(self.session, listing.get("source_url"))
+            stats.record(time.monotonic() - started, ok=response is not None)
+            if response is not None:
+                self.parse_queue.put((listing, response.text))
+            else:
+                self.checkpoint.listing_done(listing["listing_id"], False)
+
+    def _parse_dispatcher(self, executor):
+        """Feed the process pool, keeping at most 2x its size in flight."""
+        stats = self.stats["parse"]
+        pending = collections.deque()
+
+        def collect():
+            future, listing_id, started = pending.popleft()
+            try:
+                full_data, worker_metrics, profile_stats = future.result()
+            except Exception as e:
+                logger.error(f"Error parsing detail page: {e}")
+                stats.record(time.monotonic() - started, ok=False)
+                self.checkpoint.listing_done(listing_id, False)
+                return
+            # Parse timings were recorded in the worker process
+            metrics.merge(worker_metrics)
+            profiling.merge("parse", profile_stats)
+            stats.record(time.monotonic() - started)
+            self.persist_queue.put(full_data)
+
+        finished_fetchers = 0
+        while finished_fetchers < self.fetch_workers:
+            # Hand finished parses on promptly even while no new pages arrive
+            while pending and pending[0][0].done():
+                collect()
+            try:
+                item = self.parse_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                finished_fetchers += 1
+                continue
+            if self.stop.is_set():
+                continue
+            if len(pending) >= self.parse_workers * 2:
+                collect()
+            listing, html = item
+            future = executor.submit(_parse_task, listing, html, profiling.wants_worker_profile())
+            pending.append((future, listing["listing_id"], time.monotonic()))
+
+        while pending:
+            collect()
+
+    def _persist_worker(self):
+        stats = self.stats["persist"]
+        while True:
+            full_data = self.persist_queue.get()
+            if full_data is _DONE:
+                return
+            if self.stop.is_set():
+                continue
+            started = time.monotonic()
+            ok = persist_listing(full_data, self.checkpoint)
+            self.checkpoint.listing_done(full_data["listing_id"], ok)
+            stats.record(time.monotonic() - started, ok=ok)
+            if ok:
+                with self._saved_lock:
+                    self.saved += 1
+                    logger.info(f"Scraped count: {self.saved}/{self.target_count}")
+                    if self.saved >= self.target_count:
+                        self.stop.set()
+
+    # Driver
+
+    def _walk_search_pages(self, existing_ids):
+        stats = self.stats["search"]
+        queued = set()
+        frontier, _ = self.checkpoint.pending()
+        # Listings queued by the interrupted run but never stored
+        for listing in frontier:
+            if listing["listing_id"] in existing_ids:
+                self.checkpoint.listing_done(listing["listing_id"], False)
+                continue
+            queued.add(listing["listing_id"])
+            self.fetch_queue.put(listing)
+
+        page = self.checkpoint.next_page
+        while not self.stop.is_set():
+            logger.info(f"Scraping search page {page}...")
+            profiling.at_page(page)
+            started = time.monotonic()
+            response = utils.fetch_url(self.session, f"{config.SEARCH_URL}?page={page}")
+            if not response:
+                logger.error("Failed to fetch search page. Stopping.")
+                self.fetch_failed = True
+                break
+            listings = parsers.parse_search_page(response.text)
+            stats.record(time.monotonic() - started, ok=bool(listings))
+            if not listings:
+                logger.info("No more listings found or parsing failed. Stopping.")
+                self.exhausted = True
+                break
+            stop_after_page = self.tracker.observe_page(page, listings, existing_ids) if self.tracker else False
+
+            for listing in listings:
+                listing_id = listing.get("listing_id")
+                if not listing_id or listing_id in existing_ids or listing_id in queued:
+                    continue
+                # Hold back once enough listings are in flight to reach the target
+                while not self.stop.is_set() and \
+                        self.resumed + len(queued) - self._failures() >= self.target_count:
+                    time.sleep(0.1)
+                if self.stop.is_set():
+                    break
+                queued.add(listing_id)
+                self.checkpoint.add_pending(listing)
+                self.fetch_queue.put(listing)
+            self.checkpoint.page_done(page)
+            if stop_after_page:
+                break
+            page += 1
+
+    def _failures(self):
+        return sum(self.stats[name].errors for name in ("fetch", "parse", "persist"))
+
+    def run(self, existing_ids):
+        queues = {"fetch": self.fetch_queue, "parse": self.parse_queue, "persist": self.persist_queue}
+        for name, q in queues.items():
+            metrics.track_queue(name, q)
+        try:
+            self._run(existing_ids)
+        except BaseException:
+            self.checkpoint.save()
+            logger.info(f"Crawl interrupted; checkpoint saved to {self.checkpoint.path}")
+            raise
+        finally:
+            for name in queues:
+                metrics.untrack_queue(name)
+        if self.fetch_failed:
+            # Keep the position so --resume can retry from this page
+            self.checkpoint.save()
+        else:
+            self.checkpoint.clear()
+
+    def _run(self, existing_ids):
+        fetchers = [threading.Thread(target=self._fetch_worker, name=f"fetch-{i}", daemon=True)
+                    for i in range(self.fetch_workers)]
+        persisters = [threading.Thread(target=self._persist_worker, name=f"persist-{i}", daemon=True)
+                      for i in range(self.persist_workers)]
+        for t in fetchers + persisters:
+            t.start()
+
+        with utils.process_pool(self.parse_workers) as executor:
+            dispatcher = threading.Thread(target=self._parse_dispatcher, args=(executor,), daemon=True)
+            dispatcher.start()
+
+            try:
+                self._walk_search_pages(existing_ids)
+            finally:
+                self.stats["search"].finish()
+                for _ in fetchers:
+                    self.fetch_queue.put(_DONE)
+                for t in fetchers:
+                    t.join()
+                self.stats["fetch"].finish()
+                for _ in fetchers:
+                    self.parse_queue.put(_DONE)
+                dispatcher.join()
+                self.stats["parse"].finish()
+
+        for _ in persisters:
+            self.persist_queue.put(_DONE)
+        for t in persisters:
+            t.join()
+        self.stats["persist"].finish()
+        self.session.close()
+        if self.tracker:
+            self.tracker.finish(exhausted=self.exhausted)
+
+    def report(self):
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+
+def run_pipeline(target_count=config.TARGET_COUNT, fetch_workers=config.PIPELINE_FETCH_WORKERS,
+                 parse_workers=None, persist_workers=config.PIPELINE_PERSIST_WORKERS,
+                 queue_size=config.PIPELINE_QUEUE_SIZE, incremental=False, resume=False):
+    """Run the staged crawl and return per-stage throughput stats.
+
+    parse_workers defaults to the machine's core count; incremental stops the
+    walk once it reaches already-stored listings; resume continues from the
+    checkpoint of an interrupted run.
+    """
+    logger.info("Starting pipelined scraper...")
+    storage.init_storage()
+    existing_ids = storage.get_existing_ids()
+    logger.info(f"Found {len(existing_ids)} existing listings.")
+
+    checkpoint = open_checkpoint(resume)
+    resume_image_jobs(checkpoint, checkpoint.pending()[1])
+
+    pipeline = Pipeline(
+        target_count,
+        fetch_workers,
+        parse_workers or os.cpu_count() or 1,
+        persist_workers,
+        queue_size,
+        incremental=incremental,
+        checkpoint=checkpoint,
+    )
+    pipeline.run(existing_ids)
+
+    report = pipeline.report()
+    for name, s in report.items():
+        logger.info(
+            f"Stage {name}: {s['items']} items ({s['errors']} errors) in {s['elapsed']:.1f}s, "
+            f"{s['per_second']}/s, busy {s['busy_seconds']:.1f}s"
+        )
+    ratelimit.get_limiter().log_summary()
+    httpcache.get_cache().log_summary()
+    logger.info(f"Pipelined scraping completed: {pipeline.saved} saved.")
+    return {"saved": pipeline.saved, "stages": report}
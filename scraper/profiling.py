@@ -0,0 +1,376 @@
+"""
+Opt-in profiling for crawl runs.
+
+Two modes, both tagged by pipeline stage (fetch, parse, images, save; work
+outside any stage on the calling thread is "run"):
+
+- cprofile: a cProfile.Profile per stage and thread, switched on while that
+  stage's code runs. At the end the profiles of each stage are merged into
+  <name>-<time>-<stage>.prof (open with snakeviz or pstats) and a top-N text
+  summary. Deterministic and thorough, but slows the crawl down noticeably.
+  From Python 3.12 cProfile sits on sys.monitoring, which sees every thread
+  and allows one profiler per process, so there it runs one profile for the
+  whole run (<name>-<time>-all.prof) and the sampler below splits the time
+  by stage.
+- sample: a background thread looks at every thread's stack each
+  config.PROFILE_SAMPLE_INTERVAL seconds and counts them by stage. The cost
+  is a few percent at the default rate, so it can stay on in production.
+  Output is a folded-stack file (flamegraph.pl / speedscope) and the same
+  kind of text summary. Only threads inside a stage are sampled, and samples
+  are wall-clock, so a stage blocked on the network shows up where it waits.
+
+every=N restricts either mode to every Nth search page: the crawl loops call
+at_page() as each page starts, and the staged work done until the next page
+begins (that page's detail fetches, parses and saves) is recorded. Stages are
+marked with stage() or the staged() decorator; both cost one global lookup
+when profiling is off.
+In the pipeline, parse runs in worker processes: call_in_worker() profiles
+the call there and merge() adds the result to the parse stage (cprofile
+mode only; the sampler cannot see other processes).
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+from . import config
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cprofile", "sample")
+
+# Before 3.12 a profile only sees the thread that enabled it
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+_NULL = nullcontext()
+
+
+class _Snapshot:
+    """Profile data from another process, in the shape pstats.Stats loads."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Profiler:
+    def __init__(self, mode, every=None, name="crawl", top=None, directory=None, interval=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; expected one of {MODES}")
+        self.mode = mode
+        self.every = every
+        self.name = name
+        self.top = top or config.PROFILE_TOP_N
+        self.directory = directory or config.PROFILE_DIR
+        self.interval = interval or config.PROFILE_SAMPLE_INTERVAL
+        # With every=N nothing is recorded until at_page() switches it on
+        self.active = not every
+        self.started = time.time()
+        self._local = threading.local()
+        self.per_thread = mode == "cprofile" and PER_THREAD_PROFILES
+        # Stages are told apart by sampling unless each has its own profiles
+        self.sampling = not self.per_thread
+        self._global = cProfile.Profile() if mode == "cprofile" and not self.per_thread else None
+        self._failed = False
+        self._lock = threading.Lock()
+        self._profiles = {}  # (stage, thread id) -> cProfile.Profile
+        self._snapshots = {}  # stage -> [_Snapshot] from worker processes
+        self._thread_stage = {}  # thread id -> innermost stage (sample mode)
+        self._samples = {}  # folded stack -> count
+        self._sampler = None
+        self._stopped = threading.Event()
+
+    # Stage tagging
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _profile(self, stage):
+        key = (stage, threading.get_ident())
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is None:
+                profile = self._profiles[key] = cProfile.Profile()
+            return profile
+
+    def _switch(self, disable, enable):
+        """Move this thread's profiling from one stage to another.
+
+        Never raises: a profiler that cannot be switched (another profiling
+        tool is active) is logged once and the staged work runs unprofiled.
+        """
+        try:
+            if disable:
+                self._profile(disable).disable()
+            if enable:
+                self._profile(enable).enable()
+        except Exception as e:
+            if not self._failed:
+                self._failed = True
+                logger.warning(f"Profiling stage {enable or disable} failed, not recorded: {e}")
+
+    @contextmanager
+    def stage(self, name):
+        stack = self._stack()
+        if not self.active or (stack and stack[-1] == name):
+            yield
+            return
+        ident = threading.get_ident()
+        outer = stack[-1] if stack else None
+        stack.append(name)
+        if self.sampling:
+            self._thread_stage[ident] = name
+        else:
+            self._switch(outer, name)
+        try:
+            yield
+        finally:
+            stack.pop()
+            if self.sampling:
+                if outer:
+                    self._thread_stage[ident] = outer
+                else:
+                    self._thread_stage.pop(ident, None)
+            else:
+                self._switch(name, outer)
+
+    def _set_global(self, on):
+        if not self._global:
+            return
+        try:
+            if on:
+                self._global.enable()
+            else:
+                self._global.disable()
+        except ValueError as e:
+            logger.warning(f"cProfile unavailable, recording stage samples only: {e}")
+            self._global = None
+
+    def at_page(self, number):
+        """Called as search page `number` starts; with every=N, records only every Nth page."""
+        if not self.every:
+            return
+        self.active = number % self.every == 0
+        self._set_global(self.active)
+        if self.active:
+            logger.info(f"Profiling search page {number}")
+
+    def merge(self, stage, stats):
+        with self._lock:
+            self._snapshots.setdefault(stage, []).append(_Snapshot(stats))
+
+    # Sampling
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            if not self.active:
+                continue
+            stages = dict(self._thread_stage)
+            for ident, frame in sys._current_frames().items():
+                # Untagged threads are idle pool workers, servers and the like
+                if ident == own or ident not in stages:
+                    continue
+                names = []
+                while frame is not None and len(names) < config.PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                folded = ";".join([stages[ident]] + names[::-1])
+                self._samples[folded] = self._samples.get(folded, 0) + 1
+
+    # Lifecycle
+
+    def start(self):
+        self._set_global(self.active)
+        if self.sampling:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+            self._sampler.start()
+        # The calling thread's time outside any stage is the "run" stage
+        self._outer = self.stage("run")
+        self._outer.__enter__()
+
+    def stop(self):
+        """Stop recording and write the profile files. Returns their paths."""
+        self._outer.__exit__(None, None, None)
+        self._set_global(False)
+        if self._sampler:
+            self._stopped.set()
+            self._sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        prefix = os.path.join(self.directory, f"{self.name}-{stamp}")
+        if self.mode == "sample":
+            return self._write_samples(prefix)
+        return self._write_profiles(prefix)
+
+    def _write_profiles(self, prefix):
+        by_stage = {}
+        with self._lock:
+            if self._global:
+                by_stage["all"] = [self._global]
+            for (stage, _), profile in self._profiles.items():
+                by_stage.setdefault(stage, []).append(profile)
+            for stage, snapshots in self._snapshots.items():
+                by_stage.setdefault(stage, []).extend(snapshots)
+
+        paths = []
+        summary = io.StringIO()
+        merged = {}
+        for stage, profiles in by_stage.items():
+            # pstats cannot load a profile that never ran (a stage that failed to switch on)
+            for profile in profiles:
+                profile.create_stats()
+            profiles = [profile for profile in profiles if profile.stats]
+            if not profiles:
+                continue
+            stats = merged[stage] = pstats.Stats(profiles[0], stream=summary)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            path = f"{prefix}-{stage}.prof"
+            stats.dump_stats(path)
+            paths.append(path)
+        # Slowest stage first
+        for stage, stats in sorted(merged.items(), key=lambda item: -item[1].total_tt):
+            summary.write(f"=== {stage}: {stats.total_tt:.3f}s in {stats.total_calls} calls ===\n")
+            stats.sort_stats("tottime").print_stats(self.top)
+            stats.sort_stats("cumulative").print_stats(self.top)
+        if self.sampling:
+            folded_path, text = self._folded(prefix)
+            paths.append(folded_path)
+            summary.write(f"\n=== stages (sampled) ===\n{text}")
+        return paths + [self._write_summary(prefix, summary.getvalue())]
+
+    def _write_samples(self, prefix):
+        folded_path, text = self._folded(prefix)
+        return [folded_path, self._write_summary(prefix, text)]
+
+    def _folded(self, prefix):
+        """Write the folded-stack file; returns its path and a per-stage text summary."""
+        samples = dict(self._samples)
+        folded_path = f"{prefix}.folded"
+        with open(folded_path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f"{stack} {count}\n")
+
+        stages = {}
+        for stack, count in samples.items():
+            stage, *frames = stack.split(";")
+            own, inclusive = stages.setdefault(stage, ({}, {}))
+            if frames:
+                own[frames[-1]] = own.get(frames[-1], 0) + count
+            for name in set(frames):
+                inclusive[name] = inclusive.get(name, 0) + count
+
+        total = sum(samples.values())
+        summary = io.StringIO()
+        summary.write(f"{total} samples every {self.interval * 1000:.0f}ms\n")
+        for stage, (own, inclusive) in sorted(stages.items(), key=lambda item: -sum(item[1][0].values())):
+            count = sum(own.values())
+            summary.write(f"\n=== {stage}: {count} samples ({count / total:.1%}) ===\n")
+            for title, counts in (("self", own), ("inclusive", inclusive)):
+                summary.write(f"  top by {title}:\n")
+                for name, n in sorted(counts.items(), key=lambda item: -item[1])[:self.top]:
+                    summary.write(f"    {n:>7} {n / count:>6.1%}  {name}\n")
+        return folded_path, summary.getvalue()
+
+    def _write_summary(self, prefix, text):
+        path = f"{prefix}-summary.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+
+_profiler = None
+
+
+def get_profiler():
+    """The running profiler, or None when profiling is off."""
+    return _profiler
+
+
+def stage(name):
+    """Context manager tagging the enclosed work with a stage name."""
+    profiler = _profiler
+    return profiler.stage(name) if profiler else _NULL
+
+
+def at_page(number):
+    """Mark the start of search page `number` (for every=N)."""
+    profiler = _profiler
+    if profiler:
+        profiler.at_page(number)
+
+
+def staged(name):
+    """Decorator form of stage()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def wants_worker_profile():
+    """Whether work handed to a process pool right now should be profiled."""
+    profiler = _profiler
+    return bool(profiler and profiler.mode == "cprofile" and profiler.active)
+
+
+def call_in_worker(profile, fn, *args):
+    """Run fn in a process pool worker; returns (result, profile stats or None) for merge().
+
+    Only meant for worker processes: a profiler inherited through fork is dropped.
+    """
+    global _profiler
+    _profiler = None
+    if not profile:
+        return fn(*args), None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profile already holds the hook in this process (3.12+)
+        return fn(*args), None
+    try:
+        result = fn(*args)
+    finally:
+        profiler.disable()
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+def merge(stage_name, stats):
+    profiler = _profiler
+    if profiler and stats:
+        profiler.merge(stage_name, stats)
+
+
+@contextmanager
+def session(mode, every=None, name="crawl", top=None):
+    """Profile the enclosed run; logs the files written when it ends."""
+    global _profiler
+    if not mode:
+        yield None
+        return
+    profiler = Profiler(mode, every=every, name=name, top=top)
+    _profiler = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _profiler = None
+        paths = profiler.stop()
+        logger.info(f"Profile ({mode}) written: {', '.join(paths)}")
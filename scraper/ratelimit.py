@@ -0,0 +1,176 @@
+"""
+Per-host token-bucket rate limiting with adaptive backoff.
+
+Each host gets its own bucket (rate + burst) from config.HOST_LIMITS. Buckets
+slow down when a host answers 429/503 (honouring Retry-After) and recover
+towards their configured rate after a run of healthy responses. The same
+limiter is shared by the sync fetch path (wait) and the async crawler
+(wait_async), and it keeps track of how long callers spent waiting.
+"""
+import time
+import asyncio
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value):
+    """Return the Retry-After header as seconds, or None if absent/invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate adapts to server feedback."""
+
+    def __init__(self, rate, burst):
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = self.base_rate * config.RATE_MIN_FRACTION
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.healthy_streak = 0
+        self.requests = 0
+        self.waited = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            wait = max(wait, self.blocked_until - now)
+            self.requests += 1
+            self.waited += wait
+            return wait
+
+    def penalize(self, retry_after=None):
+        """Halve the rate (down to the floor) and pause for Retry-After if given."""
+        with self._lock:
+            self.throttled += 1
+            self.healthy_streak = 0
+            self.rate = max(self.min_rate, self.rate * config.RATE_BACKOFF_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def reward(self):
+        """Step the rate back up after enough consecutive healthy responses."""
+        with self._lock:
+            self.healthy_streak += 1
+            if self.rate < self.base_rate and self.healthy_streak >= config.RATE_RECOVERY_AFTER:
+                self.rate = min(self.base_rate, self.rate * config.RATE_RECOVERY_FACTOR)
+                self.healthy_streak = 0
+
+
+class RateLimiter:
+    """Holds one TokenBucket per host."""
+
+    def __init__(self, host_limits=None, default_limit=None):
+        self.host_limits = dict(config.HOST_LIMITS if host_limits is None else host_limits)
+        self.default_limit = default_limit or config.DEFAULT_HOST_LIMIT
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host, rate, burst=1):
+        """Override the budget for a host, replacing any existing bucket."""
+        with self._lock:
+            self.host_limits[host] = (rate, burst)
+            self._buckets.pop(host, None)
+
+    def bucket(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.host_limits.get(host, self.default_limit)
+                bucket = self._buckets[host] = TokenBucket(rate, burst)
+            return bucket
+
+    def wait(self, url):
+        """Block until a request to url is allowed. Returns seconds waited."""
+        delay = self.bucket(url).reserve()
+        metrics.observe("ratelimit_wait_seconds", max(delay, 0.0), host=urlparse(url).netloc.lower())
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def wait_async(self, url):
+        """Async variant of wait for use on the event loop."""
+        delay = self.bucket(url).reserve()
+        metrics.observe("ratelimit_wait_seconds", max(delay, 0.0), host=urlparse(url).netloc.lower())
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def record(self, url, status_code, headers=None):
+        """Feed a response status back into the host's bucket."""
+        bucket = self.bucket(url)
+        if status_code in THROTTLE_STATUSES:
+            retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+            bucket.penalize(retry_after)
+            logger.warning(
+                f"Throttled by {urlparse(url).netloc} ({status_code}); "
+                f"rate now {bucket.rate:.2f}/s, retry after {retry_after or 0:.1f}s"
+            )
+        elif status_code < 500:
+            bucket.reward()
+
+    def stats(self):
+        """Per-host counters: requests, seconds waited, throttles and current rate."""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {
+            host: {
+                "requests": b.requests,
+                "waited": round(b.waited, 3),
+                "throttled": b.throttled,
+                "rate": round(b.rate, 3),
+            }
+            for host, b in buckets.items()
+        }
+
+    def total_waited(self):
+        return sum(host["waited"] for host in self.stats().values())
+
+    def log_summary(self):
+        for host, s in sorted(self.stats().items()):
+            logger.info(
+                f"Rate limit {host}: {s['requests']} requests, waited {s['waited']:.1f}s, "
+                f"throttled {s['throttled']}x, rate {s['rate']}/s"
+            )
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Return the process-wide limiter shared by every fetch path."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
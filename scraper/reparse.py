@@ -0,0 +1,105 @@
+"""
+Offline re-parse: rebuild the listing store from the raw HTML archive.
+
+After a selector fix in config.SELECTORS the archived pages are replayed
+through the current parsers on a process pool, so the store can be backfilled
+without a re-crawl and without any network access.
+"""
+import os
+import time
+import logging
+from . import config, normalize, parsers, storage, universities, utils
+from .archive import get_archive
+from .scraper import build_listing
+from .scrape_listings import extract_initial_data, parse_ad_data
+
+logger = logging.getLogger(__name__)
+
+PARSERS = ("selectors", "initial-data")
+
+
+def _parse_search(item):
+    _, html = item
+    return parsers.parse_search_page(html)
+
+
+def _parse_detail(item):
+    listing, html, parser = item
+    if parser == "initial-data":
+        full_data = {**listing, **parse_ad_data(extract_initial_data(html), listing["source_url"])}
+        # parse_ad_data reports the ad's JSON id; the store is keyed by the URL-derived one
+        full_data["listing_id"] = listing["listing_id"]
+        full_data["source_url"] = listing["source_url"]
+        return full_data
+    return build_listing(listing, html)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reparse(workers=None, parser="selectors", batch_size=None):
+    """Rebuild listings from archived pages. Returns the number saved.
+
+    Search pages are replayed oldest first so each listing keeps its newest
+    search-card fields, then the newest copy of every detail page is parsed
+    (parser "selectors" uses parsers.parse_detail_page, "initial-data" uses
+    scrape_listings.parse_ad_data) and merged over them, and both over the
+    stored listing: a field neither page provides (a listing whose search
+    page came from the HTTP cache has no archived card) keeps its stored
+    value. image_folder and scraped_date always come from the stored
+    listing, since they are set by the crawl; the nearest university is
+    resolved again from the rebuilt location, as persist_listing does.
+    Pages are handled in batches so memory stays flat however large the
+    archive is.
+    """
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown parser {parser!r}; expected one of {PARSERS}")
+    archive = get_archive()
+    batch_size = batch_size or config.REPARSE_BATCH_SIZE
+    started = time.monotonic()
+    storage.init_storage()
+
+    search = {}
+    saved = failed = 0
+    with utils.process_pool(workers or os.cpu_count() or 1) as executor:
+        for batch in _batches(archive.iter_pages("search"), batch_size):
+            for listings in executor.map(_parse_search, batch):
+                for listing in listings:
+                    if listing.get("listing_id"):
+                        search[listing["listing_id"]] = listing
+        logger.info(f"Reparse: {len(search)} listings found on archived search pages")
+
+        def detail_items():
+            for url, html in archive.iter_pages("detail", latest_only=True):
+                listing_id = url.split("-")[-1]
+                yield search.get(listing_id) or {"source_url": url, "listing_id": listing_id}, html, parser
+
+        for batch in _batches(detail_items(), batch_size):
+            futures = [executor.submit(_parse_detail, item) for item in batch]
+            rebuilt = []
+            for item, future in zip(batch, futures):
+                try:
+                    full_data = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Reparse failed for {item[0]['source_url']}: {e}")
+                    continue
+                stored = storage.get_listing(full_data["listing_id"]) or {}
+                full_data = {**stored, **full_data}
+                full_data["image_folder"] = stored.get("image_folder", full_data.get("image_folder", ""))
+                full_data["scraped_date"] = stored.get("scraped_date", full_data.get("scraped_date"))
+                rebuilt.append(full_data)
+            universities.assign(rebuilt)
+            saved += storage.save_listings(normalize.normalize_records(rebuilt))
+
+    logger.info(f"Reparse completed: {saved} listings rebuilt, {failed} failed in "
+                f"{time.monotonic() - started:.1f}s")
+    return saved
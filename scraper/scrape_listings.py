@@ -9,6 +9,14 @@ import datetime
 from bs4 import BeautifulSoup
 import time
 import sys
+import os
+
+if not __package__:
+    # Run as "python scraper/scrape_listings.py": swap this file's directory
+    # for the repo root, or scraper/scraper.py would shadow the scraper package
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from scraper import ratelimit, initial_data, universities
 
 
 def fetch_page(url, max_retries=3):
@@ -28,11 +36,14 @@ def fetch_page(url, max_retries=3):
 
     session = requests.Session()
     session.headers.update(headers)
+    limiter = ratelimit.get_limiter()
 
     for attempt in range(max_retries):
         try:
             print(f"  → Attempt {attempt + 1}/{max_retries}...")
+            limiter.wait(url)
             response = session.get(url, timeout=20)
+            limiter.record(url, response.status_code, response.headers)
             response.raise_for_status()
 
             if "<html" not in response.text.lower():
@@ -50,6 +61,17 @@ def fetch_page(url, max_retries=3):
 
 
 def extract_initial_data(html):
+    """
+    Extract window.initialData, trying the raw-string decoder first and
+    falling back to the BeautifulSoup/regex scan for unusual markup.
+    """
+    try:
+        return initial_data.extract_initial_data(html)
+    except ValueError:
+        return extract_initial_data_soup(html)
+
+
+def extract_initial_data_soup(html):
     """
     Extract window.initialData from script tags
     Based on actual structure found in debug:
@@ -207,8 +229,8 @@ def parse_ad_data(initial_data, url):
     # 8. area (raw string)
     area = get_property(ad_data.get("properties", []), "size") or ""
 
-    # 9. nearest_university (requires geocoding API - not on page)
-    nearest_university = None
+    # 9. nearest_university (offline gazetteer lookup on the location names)
+    nearest_university, university_distance_km = universities.lookup(location)
 
     # 10-11. bedrooms & bathrooms
     bedrooms = get_property(ad_data.get("properties", []), "bedrooms")
@@ -260,6 +282,7 @@ def parse_ad_data(initial_data, url):
         "location": location,
         "area": area,
         "nearest_university": nearest_university,
+        "university_distance_km": university_distance_km,
         "bedrooms": bedrooms,
         "bathrooms": bathrooms,
         "area_sqft": area_sqft,
@@ -343,21 +366,19 @@ if __name__ == "__main__":
         print(f"Processing listing {i}/{len(urls)}")
         print('='*70)
 
+        # Rate limiting is handled per host in fetch_page
         data = scrape_listing(url, debug=debug_mode)
         if data:
             results.append(data)
 
-        # Rate limiting
-        if i < len(urls):
-            delay = 8 + (i % 3)
-            print(f"\n⏳ Waiting {delay}s before next request...")
-            time.sleep(delay)
-
     # Summary
     print("\n" + "="*70)
     print(f"✅ COMPLETED: {len(results)}/{len(urls)} listings successfully scraped")
     print("="*70)
 
+    waited = ratelimit.get_limiter().total_waited()
+    print(f"⏳ Spent {waited:.1f}s waiting on rate limits")
+
     if results:
         print("\n📊 RESULTS SUMMARY:")
         for idx, ad in enumerate(results, 1):
@@ -367,7 +388,7 @@ if __name__ == "__main__":
 
         print("\n💡 IMPORTANT NOTES:")
         print("   • Contact info requires manual interaction (ethically omitted)")
-        print("   • nearest_university requires geocoding API (not on page)")
+        print("   • nearest_university is approximate (town centre to main campus)")
         print("   • For production: Add 10-15s delays and proxy rotation")
 
         # Optional: Save to JSON
@@ -1,13 +1,56 @@
-
 import time
 import logging
 from urllib.parse import urljoin
-from . import config, utils, parsers, storage
+from . import config, utils, parsers, storage, ratelimit, httpcache, normalize, universities, history, profiling
+from .incremental import IncrementalTracker
+from .checkpoint import open_checkpoint, resume_image_jobs
 
 logger = logging.getLogger(__name__)
 
-def run_scraper():
-    """Main execution loop."""
+def build_listing(listing, detail_html):
+    """Merge search page data with the parsed detail page."""
+    detail_data = parsers.parse_detail_page(detail_html, listing.get("source_url"))
+
+    # Merge data (detail data overrides search data if present)
+    return {**listing, **detail_data}
+
+def persist_listing(full_data, checkpoint=None):
+    """Download images for a merged listing and save it."""
+    image_urls = full_data.get("image_urls", [])
+    # If only one image from search page and none from detail, use search image
+    if not image_urls and full_data.get("image_url"):
+        image_urls = [full_data.get("image_url")]
+
+    if image_urls:
+        if checkpoint:
+            checkpoint.image_started(full_data["listing_id"], image_urls)
+        image_folder = storage.download_images(full_data["listing_id"], image_urls)
+        full_data["image_folder"] = image_folder
+    else:
+        full_data["image_folder"] = ""
+
+    # Add scraped date
+    full_data["scraped_date"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    # Nearest university from the location names (see universities.py)
+    universities.assign([full_data])
+
+    # Typed price/area/room fields (see normalize.py)
+    saved = storage.save_listing(normalize.normalize_listing(full_data), track_history=True)
+    if checkpoint:
+        checkpoint.image_done(full_data["listing_id"])
+    return saved
+
+def run_scraper(target_count=config.TARGET_COUNT, incremental=False, resume=False, recheck=False):
+    """Main execution loop.
+
+    With incremental=True the walk stops early once it reaches listings the
+    previous run already stored (see incremental.py). With resume=True it
+    picks up from the checkpoint an interrupted run left behind. With
+    recheck=True already-stored listings whose search card changed (price,
+    title or location) are fetched again so the change lands in their
+    history (see history.py).
+    """
     logger.info("Starting scraper...")
 
     # Initialize storage
@@ -18,85 +61,130 @@ def run_scraper():
 
     session = utils.get_session()
 
-    page = 1
-    total_scraped = 0
-    target_count = 2000 # Target from plan
-
-    while total_scraped < target_count:
-        logger.info(f"Scraping search page {page}...")
-
-        # Construct URL with pagination
-        # ikman.lk pagination: ?page=1
-        search_url = f"{config.SEARCH_URL}?page={page}"
-
-        response = utils.fetch_url(session, search_url)
-        if not response:
-            logger.error("Failed to fetch search page. Stopping.")
-            break
-
-        listings = parsers.parse_search_page(response.text)
-        if not listings:
-            logger.info("No more listings found or parsing failed. Stopping.")
-            break
-
-        new_listings_count = 0
-        for listing in listings:
-            listing_id = listing.get("listing_id")
-
-            if not listing_id:
-                logger.warning("Found listing without ID. Skipping.")
-                continue
-
-            if listing_id in existing_ids:
-                if total_scraped % 10 == 0:
-                   logger.info(f"Skipping existing listing {listing_id}")
-                continue
-
-            # Fetch detail page
-            logger.info(f"Processing new listing {listing_id}...")
-            detail_response = utils.fetch_url(session, listing.get("source_url"))
-
-            if detail_response:
-                # Parse detail info
-                detail_data = parsers.parse_detail_page(detail_response.text, listing.get("source_url"))
-
-                # Merge data (detail data overrides search data if present)
-                full_data = {**listing, **detail_data}
-
-                # Download images
-                image_urls = full_data.get("image_urls", [])
-                # If only one image from search page and none from detail, use search image
-                if not image_urls and listing.get("image_url"):
-                    image_urls = [listing.get("image_url")]
-
-                if image_urls:
-                    image_folder = storage.download_images(listing_id, image_urls)
-                    full_data["image_folder"] = image_folder
-                else:
-                    full_data["image_folder"] = ""
-
-                # Add scraped date
-                full_data["scraped_date"] = time.strftime("%Y-%m-%d %H:%M:%S")
-
-                # Save to JSON
-                if storage.save_listing(full_data):
-                    existing_ids.add(listing_id)
+    checkpoint = open_checkpoint(resume)
+    frontier, image_jobs = checkpoint.pending()
+    resume_image_jobs(checkpoint, image_jobs)
+
+    tracker = IncrementalTracker() if incremental else None
+    exhausted = False
+    stop_after_page = False
+    fetch_failed = False
+    page = checkpoint.next_page
+    total_scraped = checkpoint.saved
+    refreshed = 0
+
+    def process(listing, changed=False):
+        """Fetch, merge and store one new (or changed) listing. Returns True if it was saved."""
+        listing_id = listing["listing_id"]
+        logger.info(f"Processing {'changed' if changed else 'new'} listing {listing_id}...")
+        # A cached detail page would put the old price back over the new card
+        detail_response = utils.fetch_url(session, listing.get("source_url"), fresh=changed)
+
+        saved = False
+        if detail_response:
+            full_data = build_listing(listing, detail_response.text)
+
+            # Download images and save to JSON
+            saved = persist_listing(full_data, checkpoint)
+            if saved:
+                existing_ids.add(listing_id)
+                # Baseline for later --recheck runs, only if the detail page
+                # was checked with the server and so matches this card
+                if changed or not getattr(detail_response, "from_cache", False):
+                    history.remember_cards([listing])
+        if not changed:
+            checkpoint.listing_done(listing_id, saved)
+        return saved
+
+    try:
+        # Listings queued by the interrupted run but never stored
+        for listing in frontier:
+            if total_scraped >= target_count:
+                break
+            if listing["listing_id"] in existing_ids:
+                checkpoint.listing_done(listing["listing_id"], False)
+            elif process(listing):
+                total_scraped += 1
+                logger.info(f"Scraped count: {total_scraped}/{target_count}")
+
+        while total_scraped < target_count and not stop_after_page:
+            logger.info(f"Scraping search page {page}...")
+            profiling.at_page(page)
+
+            # Construct URL with pagination
+            # ikman.lk pagination: ?page=1
+            search_url = f"{config.SEARCH_URL}?page={page}"
+
+            response = utils.fetch_url(session, search_url)
+            if not response:
+                logger.error("Failed to fetch search page. Stopping.")
+                fetch_failed = True
+                break
+
+            listings = parsers.parse_search_page(response.text)
+            if not listings:
+                logger.info("No more listings found or parsing failed. Stopping.")
+                exhausted = True
+                break
+
+            if tracker:
+                stop_after_page = tracker.observe_page(page, listings, existing_ids)
+
+            new_listings = []
+            known_listings = []
+            for listing in listings:
+                listing_id = listing.get("listing_id")
+
+                if not listing_id:
+                    logger.warning("Found listing without ID. Skipping.")
+                    continue
+
+                if listing_id in existing_ids:
+                    if recheck:
+                        known_listings.append(listing)
+                    elif total_scraped % 10 == 0:
+                       logger.info(f"Skipping existing listing {listing_id}")
+                    continue
+
+                checkpoint.add_pending(listing)
+                new_listings.append(listing)
+            checkpoint.page_done(page)
+
+            # Only cards that differ from the stored hash cost a detail fetch
+            for listing in history.changed_cards(known_listings):
+                refreshed += process(listing, changed=True)
+
+            for listing in new_listings:
+                # Rate limiting is handled in fetch_url
+                if process(listing):
                     total_scraped += 1
-                    new_listings_count += 1
                     logger.info(f"Scraped count: {total_scraped}/{target_count}")
 
-            # Rate limiting is handled in fetch_url
-
-        if new_listings_count == 0 and len(listings) > 0:
-             # If we went through a whole page of duplicates, we might want to stop?
-             # But valid to continue as older ads might be mixed or we want to catch up.
-             # Yet, if we have 2000 gathered and we see duplicates, maybe we are done.
-             # For now, let's continue.
-             pass
-
-        page += 1
-
+                if total_scraped >= target_count:
+                    break
+
+            # A page of duplicates only ends the run in incremental mode; a full
+            # crawl keeps going to catch up on older ads.
+
+            page += 1
+    except BaseException:
+        checkpoint.save()
+        logger.info(f"Crawl interrupted; checkpoint saved to {checkpoint.path}")
+        raise
+
+    if fetch_failed:
+        # Keep the position so --resume can retry from this page
+        checkpoint.save()
+    else:
+        checkpoint.clear()
+    if tracker:
+        tracker.finish(exhausted=exhausted)
+    if recheck:
+        logger.info(f"Recheck: {refreshed} changed listings re-fetched.")
     logger.info("Scraping completed.")
+    ratelimit.get_limiter().log_summary()
+    httpcache.get_cache().log_summary()
+    return total_scraped
 
 if __name__ == "__main__":
     run_scraper()
@@ -0,0 +1,106 @@
+"""
+Full-text search over listing text.
+
+The listings_fts table (SQLite FTS5) indexes each listing's title,
+description, location, amenities and nearest university under the same
+rowid as its listings row. save_listings() keeps it up to date inside its
+own transaction, so a listing is searchable as soon as it is stored;
+rebuild() re-indexes the whole store and runs once for stores created before
+the index existed.
+
+Text is tokenized with unicode61 (so Sinhala and Tamil words are indexed
+too) and English words are stemmed ("annexes" finds "annex"). Queries are
+split into words and quoted, so user input can never be read as FTS syntax;
+storage.search_listings() ranks matches with bm25, weighting the columns by
+config.SEARCH_COLUMN_WEIGHTS.
+"""
+import re
+import json
+import time
+import logging
+from . import config, db
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r"[^\W_]+")
+
+COLUMNS = tuple(config.SEARCH_COLUMN_WEIGHTS)
+
+
+def document(listing):
+    """Indexed text of a listing, one value per column in COLUMNS."""
+    amenities = listing.get("amenities") or []
+    if not isinstance(amenities, list):
+        amenities = [amenities]
+    return (
+        listing.get("title") or "",
+        listing.get("description") or "",
+        listing.get("location") or "",
+        " ".join(str(a) for a in amenities if a),
+        listing.get("nearest_university") or "",
+    )
+
+
+def match_expression(query, any_term=False):
+    """FTS5 MATCH expression for free text, or None if it has no words.
+
+    Every word must match unless any_term is set.
+    """
+    terms = [f'"{word}"' for word in TOKEN.findall(query.lower())]
+    if not terms:
+        return None
+    return (" OR " if any_term else " ").join(terms)
+
+
+def ranking():
+    """bm25() call with the configured column weights (lower is better)."""
+    weights = ", ".join(str(float(w)) for w in config.SEARCH_COLUMN_WEIGHTS.values())
+    return f"bm25(listings_fts, {weights})"
+
+
+def _insert_sql():
+    return f"INSERT INTO listings_fts (rowid, {', '.join(COLUMNS)}) VALUES (?{', ?' * len(COLUMNS)})"
+
+
+def index_listings(conn, listings, chunk=500):
+    """Replace the index entries of listings that were just upserted.
+
+    Runs inside the caller's transaction (storage.save_listings), after the
+    listings rows exist, since entries are keyed by their rowid.
+    """
+    by_id = {str(listing["listing_id"]): listing for listing in listings}
+    ids = list(by_id)
+    for start in range(0, len(ids), chunk):
+        part = ids[start:start + chunk]
+        rows = conn.execute(
+            f"SELECT rowid, listing_id FROM listings WHERE listing_id IN ({', '.join('?' * len(part))})", part
+        ).fetchall()
+        conn.executemany("DELETE FROM listings_fts WHERE rowid = ?", [(rowid,) for rowid, _ in rows])
+        conn.executemany(_insert_sql(), [(rowid, *document(by_id[listing_id])) for rowid, listing_id in rows])
+
+
+def rebuild(batch_size=1000):
+    """Re-index every stored listing. Returns the number indexed."""
+    conn = db.connect()
+    started = time.perf_counter()
+    count = 0
+    with conn:
+        conn.execute("DELETE FROM listings_fts")
+        cursor = conn.execute("SELECT rowid, data FROM listings ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            conn.executemany(_insert_sql(), [(rowid, *document(json.loads(data))) for rowid, data in rows])
+            count += len(rows)
+        # Merge the per-batch segments so queries touch fewer b-trees
+        conn.execute("INSERT INTO listings_fts (listings_fts) VALUES ('optimize')")
+        db.set_meta(conn, "search_indexed", time.strftime("%Y-%m-%d %H:%M:%S"))
+    logger.info(f"Indexed {count} listings for search in {time.perf_counter() - started:.1f}s")
+    return count
+
+
+def ensure_index():
+    """Build the index once for a store that predates it."""
+    if not db.get_meta(db.connect(), "search_indexed"):
+        rebuild()
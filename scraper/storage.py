@@ -1,98 +1,248 @@
 
 import os
 import json
+import time
 import logging
-import requests
-from . import config
+from . import config, db, images, dedupe, search, history, metrics, profiling
 
 logger = logging.getLogger(__name__)
 
 def init_storage():
-    """Initialize storage directories."""
+    """Initialize storage directories and the listings database."""
     if not os.path.exists(config.STORAGE_DIR):
         os.makedirs(config.STORAGE_DIR)
     if not os.path.exists(config.IMAGES_DIR):
         os.makedirs(config.IMAGES_DIR)
-    if not os.path.exists(config.JSON_DIR):
-        os.makedirs(config.JSON_DIR)
-    logger.info(f"Initialized storage directories at {config.STORAGE_DIR}")
+
+    conn = db.connect()
+    if not db.get_meta(conn, "json_migrated"):
+        migrate_json_to_sqlite()
+    search.ensure_index()
+    logger.info(f"Initialized storage at {config.STORAGE_DIR}")
 
 def get_existing_ids():
     """Get list of existing listing IDs to avoid duplicates."""
-    if not os.path.exists(config.JSON_DIR):
-        return set()
-
     try:
-        # Listing IDs are filenames without extension
-        ids = {f.replace(".json", "") for f in os.listdir(config.JSON_DIR) if f.endswith(".json")}
-        return ids
+        rows = db.connect().execute("SELECT listing_id FROM listings")
+        return {row[0] for row in rows}
     except Exception as e:
         logger.error(f"Error reading existing IDs: {e}")
         return set()
 
-def save_listing(listing_data):
-    """Save a listing to a JSON file."""
+def _listing_row(listing_data, now):
+    price, location, property_type = db.index_fields(listing_data)
+    return (
+        listing_data["listing_id"],
+        price,
+        location,
+        property_type,
+        listing_data.get("scraped_date"),
+        now,
+        json.dumps(listing_data, ensure_ascii=False),
+    )
+
+UPSERT_SQL = """
+INSERT INTO listings (listing_id, price, location, property_type, scraped_date, updated_at, data)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(listing_id) DO UPDATE SET
+    price = excluded.price,
+    location = excluded.location,
+    property_type = excluded.property_type,
+    scraped_date = excluded.scraped_date,
+    updated_at = excluded.updated_at,
+    data = excluded.data
+"""
+
+@profiling.staged("save")
+def save_listings(listings, track_history=False):
+    """Upsert a batch of listings in one transaction. Returns the number saved.
+
+    track_history records new listings and changed fields in the listing
+    history (crawls set it; maintenance passes that rewrite the store do not).
+    """
+    now = time.time()
+    rows = []
+    saved = []
+    for listing_data in listings:
+        if not listing_data.get("listing_id"):
+            logger.error("Listing data missing ID. Cannot save.")
+            continue
+        rows.append(_listing_row(listing_data, now))
+        saved.append(listing_data)
+
+    if not rows:
+        return 0
+    conn = db.connect()
+    with metrics.timer("save_seconds"), conn:
+        previous = history.previous_versions(conn, saved) if track_history else None
+        conn.executemany(UPSERT_SQL, rows)
+        if track_history:
+            history.record(conn, saved, previous, now)
+        search.index_listings(conn, saved)
+        if config.DEDUPE_ENABLED:
+            dedupe.index_listings(conn, saved)
+    metrics.inc("listings_saved_total", len(rows))
+    return len(rows)
+
+def save_listing(listing_data, track_history=False):
+    """Save a listing to the database."""
     try:
         listing_id = listing_data.get("listing_id")
         if not listing_id:
             logger.error("Listing data missing ID. Cannot save.")
             return False
 
-        file_path = os.path.join(config.JSON_DIR, f"{listing_id}.json")
+        save_listings([listing_data], track_history=track_history)
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(listing_data, f, indent=4, ensure_ascii=False)
-
-        logger.info(f"Saved listing {listing_id} to JSON.")
+        logger.info(f"Saved listing {listing_id} to database.")
         return True
     except Exception as e:
         logger.error(f"Error saving listing {listing_data.get('listing_id')}: {e}")
         return False
 
 def get_all_listings():
-    """Retrieve all listings from JSON files."""
-    listings = []
-    if not os.path.exists(config.JSON_DIR):
-        return listings
-
-    for filename in os.listdir(config.JSON_DIR):
-        if filename.endswith(".json"):
-            file_path = os.path.join(config.JSON_DIR, filename)
+    """Retrieve all listings from the database."""
+    rows = db.connect().execute("SELECT data FROM listings ORDER BY rowid")
+    return [json.loads(row[0]) for row in rows]
+
+def store_version():
+    """Changes whenever the listing database is written (including the WAL file)."""
+    version = []
+    for path in (config.DB_FILE, f"{config.DB_FILE}-wal"):
+        try:
+            st = os.stat(path)
+            version.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+def _filter_clauses(min_price=None, max_price=None, location=None, property_type=None, bedrooms=None,
+                    table="listings"):
+    """SQL conditions (and their parameters) on the indexed listing columns."""
+    clauses = []
+    params = []
+    if min_price is not None:
+        clauses.append(f"{table}.price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        clauses.append(f"{table}.price <= ?")
+        params.append(max_price)
+    if location:
+        clauses.append(f"{table}.location LIKE ?")
+        params.append(f"%{location}%")
+    if property_type:
+        clauses.append(f"{table}.property_type = ? COLLATE NOCASE")
+        params.append(property_type)
+    if bedrooms is not None:
+        clauses.append(f"CAST(json_extract({table}.data, '$.bedrooms') AS INTEGER) = ?")
+        params.append(bedrooms)
+    return clauses, params
+
+def query_listings(min_price=None, max_price=None, location=None, property_type=None,
+                   bedrooms=None, after=None, limit=50):
+    """One page of listings in storage order, filtered on the indexed columns.
+
+    after is the rowid cursor returned for the previous page. Returns
+    (listings, next_cursor); next_cursor is None on the last page.
+    """
+    clauses, params = _filter_clauses(min_price, max_price, location, property_type, bedrooms)
+    if after is not None:
+        clauses.append("rowid > ?")
+        params.append(after)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = db.connect().execute(
+        f"SELECT rowid, data FROM listings {where} ORDER BY rowid LIMIT ?", (*params, limit + 1)
+    ).fetchall()
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return [json.loads(data) for _, data in rows[:limit]], next_cursor
+
+def search_listings(text, min_price=None, max_price=None, location=None, property_type=None,
+                    bedrooms=None, after=None, limit=50):
+    """One page of listings matching free text, best match first.
+
+    Listings must contain every word; if none do, listings with any of the
+    words are ranked instead. after is the offset cursor returned for
+    the previous page. Returns (listings, next_cursor, matched) where matched
+    is "all", "any" or None (no words in text).
+    """
+    expression = search.match_expression(text)
+    if expression is None:
+        return [], None, None
+    clauses, params = _filter_clauses(min_price, max_price, location, property_type, bedrooms)
+    if clauses:
+        matches = f"""
+            FROM listings_fts JOIN listings ON listings.rowid = listings_fts.rowid
+            WHERE listings_fts MATCH ? AND {" AND ".join(clauses)}
+        """
+    else:
+        matches = "FROM listings_fts WHERE listings_fts MATCH ?"
+    conn = db.connect()
+    matched = "all"
+    # Checked on every page, so later pages keep the first page's mode
+    if conn.execute(f"SELECT 1 {matches} LIMIT 1", (expression, *params)).fetchone() is None:
+        expression, matched = search.match_expression(text, any_term=True), "any"
+    offset = after or 0
+    # Rank on rowids only; the JSON documents are read for the page alone
+    rows = conn.execute(
+        f"""
+        SELECT listings.data FROM (
+            SELECT listings_fts.rowid AS id, {search.ranking()} AS score {matches}
+            ORDER BY score, id LIMIT ? OFFSET ?
+        ) page JOIN listings ON listings.rowid = page.id
+        ORDER BY page.score, page.id
+        """,
+        (expression, *params, limit + 1, offset),
+    ).fetchall()
+    next_cursor = offset + limit if len(rows) > limit else None
+    return [json.loads(data) for data, in rows[:limit]], next_cursor, matched
+
+def get_listing(listing_id):
+    """Retrieve one listing by ID, or None."""
+    row = db.connect().execute("SELECT data FROM listings WHERE listing_id = ?", (listing_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def migrate_json_to_sqlite(json_dir=None, batch_size=500):
+    """Import storage/json/*.json into the database (existing rows are kept up to date).
+
+    Runs automatically the first time init_storage sees an empty migration flag.
+    Returns the number of listings imported.
+    """
+    json_dir = json_dir or config.JSON_DIR
+    conn = db.connect()
+    imported = 0
+
+    if os.path.exists(json_dir):
+        batch = []
+        for filename in sorted(os.listdir(json_dir)):
+            if not filename.endswith(".json"):
+                continue
+            file_path = os.path.join(json_dir, filename)
             try:
                 with open(file_path, "r", encoding="utf-8") as f:
                     data = json.load(f)
-                    listings.append(data)
             except Exception as e:
                 logger.error(f"Error reading listing file {filename}: {e}")
-    return listings
-
-def download_images(listing_id, image_urls):
-    """Download images for a listing."""
-    listing_img_dir = os.path.join(config.IMAGES_DIR, str(listing_id))
-    if not os.path.exists(listing_img_dir):
-        os.makedirs(listing_img_dir)
-
-    saved_count = 0
-    # Limit to 10 images
-    for i, url in enumerate(image_urls[:10]):
-        try:
-            if not url:
                 continue
-
-            response = requests.get(url, headers=config.HEADERS, timeout=10)
-            if response.status_code == 200:
-                # determine extension
-                ext = url.split('.')[-1].split('?')[0]
-                if len(ext) > 4 or not ext:
-                    ext = "jpg"
-
-                filename = f"image_{i+1}.{ext}"
-                filepath = os.path.join(listing_img_dir, filename)
-
-                with open(filepath, "wb") as f:
-                    f.write(response.content)
-                saved_count += 1
-        except Exception as e:
-            logger.error(f"Failed to download image {url}: {e}")
-
+            # Older files are named after the ID but may predate the listing_id field
+            data.setdefault("listing_id", filename[:-len(".json")])
+            batch.append(data)
+            if len(batch) >= batch_size:
+                imported += save_listings(batch)
+                batch = []
+        imported += save_listings(batch)
+
+    with conn:
+        db.set_meta(conn, "json_migrated", time.strftime("%Y-%m-%d %H:%M:%S"))
+    if imported:
+        logger.info(f"Migrated {imported} JSON listings from {json_dir} into {config.DB_FILE}")
+    return imported
+
+@profiling.staged("images")
+def download_images(listing_id, image_urls):
+    """Download images for a listing (pooled, streamed and resumable; see images.py)."""
+    with metrics.timer("image_seconds"):
+        listing_img_dir, downloaded, reused = images.download_listing_images(listing_id, image_urls)
+    metrics.inc("images_downloaded_total", downloaded)
+    metrics.inc("images_reused_total", reused)
     return listing_img_dir
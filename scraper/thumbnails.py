@@ -0,0 +1,165 @@
+"""
+Resized WebP/JPEG variants of stored images for the listings server.
+
+Thumbnails are keyed by the source blob (which is content-addressed), the
+width and the format, so a generated file never goes stale:
+storage/thumbs/<aa>/<sha256>-<width>.<webp|jpg>. They are made on first
+request or in bulk after a crawl, and the least recently used files are
+removed once the directory grows past config.THUMBS_MAX_BYTES.
+
+Pillow is optional; without it thumbnails are unavailable and the server
+falls back to the original image.
+"""
+import os
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import config, db, images
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+
+_total_bytes = None
+_size_lock = threading.Lock()
+
+
+def available():
+    return Image is not None
+
+
+def thumbnail_name(blob, width, fmt):
+    digest = os.path.splitext(os.path.basename(blob))[0]
+    return f"{digest[:2]}/{digest}-{width}.{fmt}"
+
+
+def render(source, dest, width, fmt):
+    """Decode source, shrink it to fit width x width and write dest atomically."""
+    pil_format, _ = FORMATS[fmt]
+    tmp_path = f"{dest}.{uuid.uuid4().hex}.part"
+    with Image.open(source) as img:
+        # JPEG sources decode straight at a reduced scale
+        img.draft("RGB", (width, width))
+        img.thumbnail((width, width))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        options = {"quality": config.THUMB_QUALITY}
+        if pil_format == "JPEG":
+            options.update(optimize=True, progressive=True)
+        else:
+            options["method"] = 4
+        img.save(tmp_path, format=pil_format, **options)
+    os.replace(tmp_path, dest)
+    return os.path.getsize(dest)
+
+
+def get_thumbnail(blob, width, fmt):
+    """Path of the thumbnail for blob, generating it if needed. None if impossible."""
+    if not available() or width not in config.THUMB_WIDTHS or fmt not in FORMATS:
+        return None
+    path = os.path.join(config.THUMBS_DIR, thumbnail_name(blob, width, fmt))
+    if os.path.exists(path):
+        # mtime doubles as the LRU clock
+        os.utime(path)
+        return path
+
+    source = images.blob_path(blob)
+    if not os.path.exists(source):
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        size = render(source, path, width, fmt)
+    except Exception as e:
+        logger.error(f"Failed to make {width}px {fmt} thumbnail of {blob}: {e}")
+        return None
+    _grow(size)
+    return path
+
+
+def _thumb_files():
+    """Yield (path, size, mtime) for every stored thumbnail."""
+    if not os.path.exists(config.THUMBS_DIR):
+        return
+    for prefix in os.listdir(config.THUMBS_DIR):
+        prefix_dir = os.path.join(config.THUMBS_DIR, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if name.endswith(".part"):
+                continue
+            st = os.stat(os.path.join(prefix_dir, name))
+            yield os.path.join(prefix_dir, name), st.st_size, st.st_mtime
+
+
+def _grow(size):
+    global _total_bytes
+    with _size_lock:
+        if _total_bytes is None:
+            _total_bytes = sum(s for _, s, _ in _thumb_files())
+        else:
+            _total_bytes += size
+        over = _total_bytes > config.THUMBS_MAX_BYTES
+    if over:
+        evict()
+
+
+def evict(target=None):
+    """Delete least recently used thumbnails until the cache is under target bytes (90% of max)."""
+    global _total_bytes
+    target = config.THUMBS_MAX_BYTES * 0.9 if target is None else target
+    with _size_lock:
+        files = sorted(_thumb_files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        _total_bytes = total
+    if removed:
+        logger.info(f"Evicted {removed} thumbnails")
+    return removed
+
+
+def card_blobs():
+    """The first stored image of every listing (the one the listing cards show)."""
+    rows = db.connect().execute(
+        "SELECT listing_id, MIN(position), blob FROM image_refs GROUP BY listing_id"
+    ).fetchall()
+    return sorted({blob for _, _, blob in rows})
+
+
+def pregenerate(blobs=None, widths=None, formats=None, workers=None):
+    """Make missing thumbnails on a thread pool. Returns how many variants are ready."""
+    if not available():
+        logger.warning("Pillow is not installed; skipping thumbnail generation")
+        return 0
+    blobs = card_blobs() if blobs is None else blobs
+    widths = widths or config.THUMB_PREGENERATE_WIDTHS
+    formats = formats or tuple(FORMATS)
+    jobs = [(blob, width, fmt) for blob in blobs for width in widths for fmt in formats]
+    with ThreadPoolExecutor(max_workers=workers or config.THUMB_WORKERS, thread_name_prefix="thumbs") as pool:
+        made = sum(1 for path in pool.map(lambda job: get_thumbnail(*job), jobs) if path)
+    logger.info(f"Thumbnails ready for {len(blobs)} images ({made}/{len(jobs)} variants)")
+    return made
+
+
+def stats():
+    files = list(_thumb_files())
+    return {
+        "available": available(),
+        "thumbnails": len(files),
+        "bytes_on_disk": sum(size for _, size, _ in files),
+        "max_bytes": config.THUMBS_MAX_BYTES,
+    }
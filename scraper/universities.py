@@ -0,0 +1,234 @@
+"""
+Nearest university for a listing, resolved offline.
+
+Listings only carry place names ("Kottawa, Colombo" from detail pages,
+"Colombo, Houses For Sale" from search cards), so the names are looked up in
+a bundled table of approximate town/district centre coordinates and the
+distance to every university in the gazetteer is computed with a vectorised
+haversine. The store has at most a few hundred distinct location strings, so
+bulk resolution works on unique locations and broadcasts the result back.
+"""
+import re
+import logging
+import numpy as np
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# (name, latitude, longitude) of the main campus
+UNIVERSITIES = [
+    ("University of Colombo", 6.9022, 79.8607),
+    ("University of Peradeniya", 7.2550, 80.5972),
+    ("University of Sri Jayewardenepura", 6.8528, 79.9036),
+    ("University of Kelaniya", 6.9738, 79.9158),
+    ("University of Moratuwa", 6.7951, 79.9009),
+    ("University of Jaffna", 9.6848, 80.0225),
+    ("University of Ruhuna", 5.9380, 80.5762),
+    ("Eastern University", 7.7940, 81.5790),
+    ("South Eastern University", 7.2966, 81.8508),
+    ("Rajarata University", 8.3600, 80.5040),
+    ("Sabaragamuwa University", 6.7147, 80.7871),
+    ("Wayamba University", 7.3223, 80.0435),
+    ("Uva Wellassa University", 6.9816, 81.0767),
+    ("University of the Visual and Performing Arts", 6.9077, 79.8631),
+    ("Open University of Sri Lanka", 6.8838, 79.8840),
+    ("Gampaha Wickramarachchi University", 7.0866, 80.0326),
+    ("University of Vavuniya", 8.7570, 80.4980),
+    ("Kotelawala Defence University", 6.8210, 79.8856),
+    ("SLIIT", 6.9147, 79.9729),
+    ("NSBM Green University", 6.8213, 80.0416),
+]
+
+# Approximate centres of the districts and the towns ikman uses as
+# l2/l3 locations, keyed by lower-case name
+LOCATIONS = {
+    # Districts
+    "colombo": (6.9271, 79.8612),
+    "gampaha": (7.0873, 79.9990),
+    "kalutara": (6.5854, 79.9607),
+    "kandy": (7.2906, 80.6337),
+    "matale": (7.4675, 80.6234),
+    "nuwara eliya": (6.9497, 80.7891),
+    "galle": (6.0535, 80.2210),
+    "matara": (5.9549, 80.5550),
+    "hambantota": (6.1246, 81.1185),
+    "jaffna": (9.6615, 80.0255),
+    "kilinochchi": (9.3803, 80.3770),
+    "mannar": (8.9810, 79.9044),
+    "vavuniya": (8.7514, 80.4971),
+    "mullativu": (9.2671, 80.8142),
+    "mullaitivu": (9.2671, 80.8142),
+    "batticaloa": (7.7310, 81.6747),
+    "ampara": (7.2975, 81.6820),
+    "trincomalee": (8.5874, 81.2152),
+    "kurunegala": (7.4863, 80.3623),
+    "puttalam": (8.0362, 79.8283),
+    "anuradhapura": (8.3114, 80.4037),
+    "polonnaruwa": (7.9403, 81.0188),
+    "badulla": (6.9934, 81.0550),
+    "monaragala": (6.8728, 81.3507),
+    "moneragala": (6.8728, 81.3507),
+    "ratnapura": (6.6828, 80.3992),
+    "kegalle": (7.2513, 80.3464),
+    # Colombo suburbs
+    "nugegoda": (6.8649, 79.8997),
+    "maharagama": (6.8480, 79.9265),
+    "dehiwala": (6.8511, 79.8659),
+    "mount lavinia": (6.8390, 79.8630),
+    "moratuwa": (6.7730, 79.8816),
+    "kottawa": (6.8412, 79.9654),
+    "malabe": (6.9061, 79.9696),
+    "battaramulla": (6.8990, 79.9180),
+    "rajagiriya": (6.9090, 79.8940),
+    "kotte": (6.8868, 79.9187),
+    "sri jayawardenepura kotte": (6.8868, 79.9187),
+    "kaduwela": (6.9306, 79.9847),
+    "athurugiriya": (6.8730, 79.9970),
+    "homagama": (6.8440, 80.0020),
+    "piliyandala": (6.8018, 79.9227),
+    "boralesgamuwa": (6.8406, 79.9012),
+    "kesbewa": (6.7953, 79.9385),
+    "ratmalana": (6.8200, 79.8800),
+    "thalawathugoda": (6.8750, 79.9350),
+    "pannipitiya": (6.8470, 79.9500),
+    "kohuwala": (6.8670, 79.8850),
+    "kirulapone": (6.8790, 79.8800),
+    "wellawatte": (6.8741, 79.8596),
+    "bambalapitiya": (6.8898, 79.8560),
+    "kollupitiya": (6.9100, 79.8500),
+    "borella": (6.9150, 79.8780),
+    "hanwella": (6.9010, 80.0850),
+    "padukka": (6.8400, 80.0900),
+    "avissawella": (6.9530, 80.2100),
+    # Gampaha district
+    "wattala": (6.9897, 79.8913),
+    "kelaniya": (6.9553, 79.9220),
+    "kiribathgoda": (6.9780, 79.9270),
+    "kadawatha": (7.0010, 79.9530),
+    "ja-ela": (7.0744, 79.8919),
+    "negombo": (7.2083, 79.8358),
+    "ragama": (7.0300, 79.9220),
+    "kandana": (7.0480, 79.8970),
+    "minuwangoda": (7.1660, 79.9530),
+    "nittambuwa": (7.1440, 80.0960),
+    "delgoda": (6.9870, 80.0150),
+    "veyangoda": (7.1560, 80.0560),
+    # Elsewhere
+    "panadura": (6.7132, 79.9026),
+    "horana": (6.7160, 80.0620),
+    "beruwala": (6.4790, 79.9830),
+    "peradeniya": (7.2690, 80.5940),
+    "katugastota": (7.3170, 80.6210),
+    "kuliyapitiya": (7.4690, 80.0400),
+    "chilaw": (7.5758, 79.7953),
+    "hikkaduwa": (6.1395, 80.1063),
+    "weligama": (5.9740, 80.4290),
+    "tangalle": (6.0240, 80.7940),
+    "embilipitiya": (6.3430, 80.8490),
+    "bandarawela": (6.8290, 80.9870),
+    "ella": (6.8667, 81.0466),
+    "dambulla": (7.8600, 80.6517),
+    "kalmunai": (7.4090, 81.8350),
+}
+
+COLOMBO_ZONE = re.compile(r"\s+\d+$")  # "Colombo 5" -> "colombo"
+
+_university_names = [name for name, _, _ in UNIVERSITIES]
+_university_lat = np.radians([lat for _, lat, _ in UNIVERSITIES])
+_university_lon = np.radians([lon for _, _, lon in UNIVERSITIES])
+
+
+def coordinates(location):
+    """(lat, lon) for the most specific known place in a location string, else None."""
+    if not location:
+        return None
+    for part in location.split(","):
+        key = part.strip().lower()
+        if key in LOCATIONS:
+            return LOCATIONS[key]
+        key = COLOMBO_ZONE.sub("", key)
+        if key in LOCATIONS:
+            return LOCATIONS[key]
+    return None
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between points given in radians (broadcasts)."""
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def nearest(lats, lons, chunk=65536):
+    """Index of the nearest university and its distance in km for arrays of degrees."""
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    indices = np.empty(len(lats), dtype=np.int64)
+    distances = np.empty(len(lats))
+    # points x universities distance matrix, a chunk of points at a time
+    for start in range(0, len(lats), chunk):
+        stop = start + chunk
+        d = haversine_km(lats[start:stop, None], lons[start:stop, None], _university_lat, _university_lon)
+        indices[start:stop] = d.argmin(axis=1)
+        distances[start:stop] = d[np.arange(len(d)), indices[start:stop]]
+    return indices, distances
+
+
+def resolve(locations):
+    """[(university, distance_km)] for each location string; (None, None) if unknown."""
+    unique = list(dict.fromkeys(locations))
+    points = {location: coordinates(location) for location in unique}
+    known = [location for location in unique if points[location]]
+    results = dict.fromkeys(unique, (None, None))
+    if known:
+        indices, distances = nearest([points[l][0] for l in known], [points[l][1] for l in known])
+        for location, i, km in zip(known, indices, distances):
+            results[location] = (_university_names[i], round(float(km), 1))
+    return [results[location] for location in locations]
+
+
+def lookup(location):
+    """Nearest university and distance for a single location string."""
+    return resolve([location])[0]
+
+
+def assign(listings):
+    """Set nearest_university and university_distance_km on listings from their location, in place."""
+    results = resolve([listing.get("location") or "" for listing in listings])
+    for listing, (university, km) in zip(listings, results):
+        listing["nearest_university"] = university
+        listing["university_distance_km"] = km
+    return listings
+
+
+def assign_store(batch_size=1000):
+    """Fill nearest_university and university_distance_km for every stored listing.
+
+    Only listings whose values change are rewritten. Returns (updated, unresolved).
+    """
+    listings = storage.get_all_listings()
+    results = resolve([listing.get("location") or "" for listing in listings])
+    changed = []
+    unresolved = 0
+    for listing, (university, km) in zip(listings, results):
+        if university is None:
+            unresolved += 1
+        if listing.get("nearest_university") != university or listing.get("university_distance_km") != km:
+            listing["nearest_university"] = university
+            listing["university_distance_km"] = km
+            changed.append(listing)
+    for start in range(0, len(changed), batch_size):
+        storage.save_listings(changed[start:start + batch_size])
+    logger.info(f"Nearest university: {len(changed)} listings updated, {unresolved} locations unresolved")
+    return len(changed), unresolved
+
+
+def unresolved_locations():
+    """Stored location strings with no coordinates, most common first."""
+    counts = {}
+    for listing in storage.get_all_listings():
+        location = listing.get("location") or ""
+        if coordinates(location) is None:
+            counts[location] = counts.get(location, 0) + 1
+    return sorted(counts.items(), key=lambda item: item[1], reverse=True)
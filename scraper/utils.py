@@ -1,11 +1,17 @@
+import os
+import json
 import logging
 import time
 import requests
+import multiprocessing
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from . import config
+from . import config, ratelimit, httpcache, archive, metrics, profiling
 
 # Configure logging
+os.makedirs(config.LOGS_DIR, exist_ok=True)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
@@ -16,8 +22,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def get_session():
-    """Create a requests session with retries."""
+def _init_worker(settings):
+    """Process pool initializer: the parent's config, including values set at run time."""
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+
+def process_pool(max_workers):
+    """A ProcessPoolExecutor whose workers are not forked from this process.
+
+    Pools are started while fetch, persist, metrics and profiler threads are
+    running, and a child forked then inherits any lock one of them holds
+    (sqlite, the requests pool, logging) and can deadlock on it. Workers come
+    from a forkserver instead (spawn where there is none) and are handed the
+    parent's config constants, so overrides made by main.py, the benchmarks
+    and the tests still apply in them.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method),
+                               initializer=_init_worker, initargs=(settings,))
+
+
+def get_session(pool_size=None, cache=None):
+    """Create a requests session with retries.
+
+    pool_size sizes the connection pool for sessions shared by concurrent workers.
+    cache puts the on-disk HTTP cache under the session (default
+    config.HTTP_CACHE_ENABLED).
+    """
     session = requests.Session()
     retry = Retry(
         total=config.MAX_RETRIES,
@@ -26,22 +59,61 @@ def get_session():
         backoff_factor=0.3,
         status_forcelist=(500, 502, 504),
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    pool_args = {"pool_connections": pool_size, "pool_maxsize": pool_size} if pool_size else {}
+    if config.HTTP_CACHE_ENABLED if cache is None else cache:
+        session.http_cache = httpcache.get_cache()
+        adapter = httpcache.CachingAdapter(session.http_cache, max_retries=retry, **pool_args)
+    else:
+        adapter = HTTPAdapter(max_retries=retry, **pool_args)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     session.headers.update(config.HEADERS)
     return session
 
-def fetch_url(session, url):
-    """Fetch a URL with delay and error handling."""
-    time.sleep(config.REQUEST_DELAY)
-    try:
-        response = session.get(url, timeout=config.TIMEOUT)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching URL {url}: {e}")
-        return None
+@profiling.staged("fetch")
+def fetch_url(session, url, wait=True, fresh=False):
+    """Fetch a URL with per-host rate limiting and error handling.
+
+    Callers that already waited on the limiter (the async crawler) pass wait=False.
+    fresh=True makes the HTTP cache revalidate with the server instead of
+    answering from a copy it still considers fresh.
+    429/503 responses back the host off and are retried up to MAX_RETRIES times.
+    Pages the session's HTTP cache can answer skip the limiter entirely.
+    Newly downloaded search/detail pages are appended to the raw HTML archive.
+    """
+    limiter = ratelimit.get_limiter()
+    host = urlparse(url).netloc
+    for attempt in range(config.MAX_RETRIES + 1):
+        if (wait or attempt) and (fresh or not httpcache.is_fresh(session, url)):
+            limiter.wait(url)
+        try:
+            started = time.perf_counter()
+            headers = {"Cache-Control": "no-cache"} if fresh else None
+            response = session.get(url, timeout=config.TIMEOUT, headers=headers)
+            if getattr(response, "from_cache", False):
+                metrics.inc("fetch_cache_hits_total", host=host)
+            else:
+                metrics.observe("fetch_seconds", time.perf_counter() - started, host=host)
+                metrics.inc("fetch_bytes_total", len(response.content), host=host)
+                metrics.inc("fetch_responses_total", host=host, status=response.status_code)
+                limiter.record(url, response.status_code, response.headers)
+            if response.status_code in ratelimit.THROTTLE_STATUSES and attempt < config.MAX_RETRIES:
+                continue
+            response.raise_for_status()
+            if not getattr(response, "from_cache", False):
+                archive.record_page(url, response.text)
+            return response
+        except requests.exceptions.RequestException as e:
+            metrics.inc("fetch_responses_total", host=host, status="error")
+            logger.error(f"Error fetching URL {url}: {e}")
+            return None
+
+def write_json_atomic(path, data):
+    """Write JSON to path via a temp file and rename, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
 
 def clean_text(text):
     """Clean extracted text."""
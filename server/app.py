@@ -1,22 +1,341 @@
-from flask import Flask, render_template, send_from_directory
+from flask import Flask, Response, jsonify, render_template, request, send_from_directory
 import sys
 import os
+import gzip
+import json
+import base64
+import hashlib
+import threading
+import collections
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # Add parent directory to path to import scraper modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from scraper import storage, config
+from scraper import storage, config, images, thumbnails, columnar, history
 
 app = Flask(__name__)
+storage.init_storage()
+
+class QueryCache:
+    """Serialized responses for recent API queries, dropped whenever the store changes.
+
+    Each entry maps a content encoding (None for identity) to its body, so
+    compressed variants are only produced once per store version.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.version = None
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, version):
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None
+            variants = self.entries.get(key)
+            if variants is not None:
+                self.entries.move_to_end(key)
+            return variants
+
+    def put(self, key, version, variants):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = variants
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+query_cache = QueryCache(config.API_CACHE_ENTRIES)
+
+def encode_cursor(rowid):
+    return base64.urlsafe_b64encode(str(rowid).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+def parse_listing_query(args):
+    """Validate /api/listings query parameters into storage.query_listings arguments."""
+    def number(name, cast=float):
+        value = args.get(name)
+        if value in (None, ""):
+            return None
+        try:
+            return cast(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+
+    limit = number("limit", int) or config.API_PAGE_SIZE
+    if not 1 <= limit <= config.API_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {config.API_MAX_PAGE_SIZE}")
+    cursor = args.get("cursor")
+    return {
+        "min_price": number("min_price"),
+        "max_price": number("max_price"),
+        "location": args.get("location") or None,
+        "property_type": args.get("property_type") or None,
+        "bedrooms": number("bedrooms", int),
+        "after": decode_cursor(cursor) if cursor else None,
+        "limit": limit,
+    }
+
+def project(listing, fields):
+    """Keep only the requested fields (listing_id is always included).
+
+    image is the content-addressed URL of the first stored image.
+    """
+    if not fields or "image" in fields:
+        blob = images.first_blob(listing["listing_id"])
+        listing["image"] = f"/blobs/{blob}" if blob else None
+    if not fields:
+        return listing
+    return {key: listing.get(key) for key in ("listing_id", *fields)}
+
+def negotiate_encoding():
+    """Best content encoding the client accepts: br (if available), gzip, or None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+def encode_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=config.SERVER_BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=config.SERVER_GZIP_LEVEL)
+    return body
+
+def conditional_response(base_etag, render, mimetype, variants=None):
+    """200 or 304 for a representation identified by base_etag.
+
+    render() produces the uncompressed body and is only called when the
+    client's copy is stale and variants (encoding -> body) has no entry yet. The strong ETag gets
+    the encoding appended, since each encoding is a different byte sequence.
+    """
+    encoding = negotiate_encoding()
+    etag = f"{base_etag}-{encoding}" if encoding else base_etag
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        variants = {} if variants is None else variants
+        if encoding not in variants:
+            if None not in variants:
+                variants[None] = render()
+            variants[encoding] = encode_body(variants[None], encoding)
+        response = Response(variants[encoding], mimetype=mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Vary"] = "Accept-Encoding"
+    # Always revalidate; an unchanged store answers with an empty 304
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def version_etag(version, *parts):
+    return hashlib.sha1(repr((version, parts)).encode()).hexdigest()[:32]
+
+# The index page is static; render and compress it once per process
+index_page = {}
 
 @app.route("/")
 def index():
-    listings = storage.get_all_listings()
-    return render_template("index.html", listings=listings)
+    if not index_page:
+        body = render_template("index.html", page_size=config.API_PAGE_SIZE).encode("utf-8")
+        index_page.update(etag=hashlib.sha1(body).hexdigest()[:32], variants={None: body})
+    return conditional_response(index_page["etag"], None, "text/html", index_page["variants"])
+
+@app.route("/api/listings")
+def api_listings():
+    """Cursor-paginated listings with optional filters and field projection.
+
+    Query parameters: min_price, max_price, location (substring),
+    property_type, bedrooms, fields (comma separated), limit, cursor.
+    """
+    try:
+        query = parse_listing_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fields = tuple(f.strip() for f in request.args.get("fields", "").split(",") if f.strip())
+
+    key = (tuple(sorted(query.items())), fields)
+    version = storage.store_version()
+    variants = query_cache.get(key, version)
+    if variants is None:
+        variants = {}
+        query_cache.put(key, version, variants)
+
+    def render():
+        listings, next_rowid = storage.query_listings(**query)
+        return json.dumps({
+            "listings": [project(listing, fields) for listing in listings],
+            "count": len(listings),
+            "next_cursor": encode_cursor(next_rowid) if next_rowid is not None else None,
+        }, ensure_ascii=False).encode("utf-8")
+
+    return conditional_response(version_etag(version, key), render, "application/json", variants)
+
+@app.route("/api/search")
+def api_search():
+    """Ranked full-text search, e.g. /api/search?q=annex+near+moratuwa+university.
+
+    q is matched against title, description, location, amenities and nearest
+    university. Takes the same filters, fields, limit and cursor parameters
+    as /api/listings; results come best match first.
+    """
+    text = request.args.get("q", "").strip()
+    if not text:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        query = parse_listing_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if query["after"] is not None and not 0 <= query["after"] <= config.SEARCH_MAX_OFFSET:
+        return jsonify({"error": f"search results are limited to the first {config.SEARCH_MAX_OFFSET}"}), 400
+    fields = tuple(f.strip() for f in request.args.get("fields", "").split(",") if f.strip())
+
+    key = ("search", text, tuple(sorted(query.items())), fields)
+    version = storage.store_version()
+    variants = query_cache.get(key, version)
+    if variants is None:
+        variants = {}
+        query_cache.put(key, version, variants)
+
+    def render():
+        listings, next_offset, matched = storage.search_listings(text, **query)
+        if next_offset is not None and next_offset > config.SEARCH_MAX_OFFSET:
+            next_offset = None
+        return json.dumps({
+            "listings": [project(listing, fields) for listing in listings],
+            "count": len(listings),
+            "matched": matched,
+            "next_cursor": encode_cursor(next_offset) if next_offset is not None else None,
+        }, ensure_ascii=False).encode("utf-8")
+
+    return conditional_response(version_etag(version, key), render, "application/json", variants)
+
+@app.route("/api/stats")
+def api_stats():
+    """Aggregates over the columnar index, e.g. median price per district.
+
+    Query parameters: group_by (district, location, property_type,
+    university), value (price, bedrooms, bathrooms, area_sqft), agg (count,
+    median, mean, min, max, sum), plus the filters min_price, max_price,
+    location, district, property_type, university, bedrooms, min_bedrooms,
+    min_area and max_area.
+    """
+    def number(name):
+        value = request.args.get(name)
+        if value in (None, ""):
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number")
+
+    group_by = request.args.get("group_by", "district")
+    value = request.args.get("value") or None
+    agg = request.args.get("agg", "median" if value else "count")
+    try:
+        filters = {name: number(name) for name in ("min_price", "max_price", "bedrooms", "min_bedrooms",
+                                                   "min_area", "max_area")}
+        for name in ("location", "district", "property_type", "university"):
+            filters[name] = request.args.get(name) or None
+        index = columnar.get_index()
+        mask = index.mask(**filters)
+        groups = index.group_by(group_by, value, agg, mask)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    key = ("stats", group_by, value, agg, tuple(sorted(filters.items())))
+    def render():
+        return json.dumps({
+            "group_by": group_by, "value": value, "agg": agg,
+            "matched": int(mask.sum()), "groups": groups,
+        }, ensure_ascii=False).encode("utf-8")
+
+    return conditional_response(version_etag(index.version, index.updated_at, key), render, "application/json")
+
+@app.route("/api/listings/<listing_id>/history")
+def api_listing_history(listing_id):
+    """Price over time for one listing: [{observed_at, price, changes}], oldest first."""
+    entries = history.price_history(listing_id)
+    if not entries and storage.get_listing(listing_id) is None:
+        return jsonify({"error": "no such listing"}), 404
+    version = storage.store_version()
+    def render():
+        return json.dumps({"listing_id": listing_id, "history": entries}, ensure_ascii=False).encode("utf-8")
+
+    return conditional_response(version_etag(version, "history", listing_id), render, "application/json")
+
+@app.route("/api/price-changes")
+def api_price_changes():
+    """Recent price changes across the store, newest first.
+
+    Query parameters: days (only changes in the last N days), limit.
+    """
+    try:
+        days = float(request.args["days"]) if request.args.get("days") else None
+        limit = int(request.args.get("limit") or config.API_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "days and limit must be numbers"}), 400
+    if not 1 <= limit <= config.API_MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {config.API_MAX_PAGE_SIZE}"}), 400
+
+    version = storage.store_version()
+    def render():
+        changes = history.price_changes(days=days, limit=limit)
+        return json.dumps({"changes": changes, "count": len(changes)}, ensure_ascii=False).encode("utf-8")
+
+    return conditional_response(version_etag(version, "price-changes", days, limit), render, "application/json")
+
+def blob_etag(blob):
+    # Blob names are <aa>/<sha256>.<ext>, so the digest is a strong validator
+    return os.path.splitext(os.path.basename(blob))[0]
+
+@app.route("/blobs/<path:blob>")
+def serve_blob(blob):
+    response = send_from_directory(config.BLOBS_DIR, blob, etag=blob_etag(blob), max_age=config.BLOB_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/thumbs/<int:width>/<path:blob>")
+def serve_thumbnail(width, blob):
+    """Resized copy of a blob; WebP for browsers that accept it, JPEG otherwise."""
+    fmt = "webp" if request.accept_mimetypes["image/webp"] else "jpg"
+    path = thumbnails.get_thumbnail(blob, width, fmt)
+    if path is None:
+        if width not in config.THUMB_WIDTHS:
+            return jsonify({"error": f"width must be one of {list(config.THUMB_WIDTHS)}"}), 404
+        # No Pillow, or the source cannot be decoded: send the original
+        return serve_blob(blob)
+    response = send_from_directory(config.THUMBS_DIR, os.path.relpath(path, config.THUMBS_DIR),
+                                   mimetype=thumbnails.FORMATS[fmt][1],
+                                   etag=f"{blob_etag(blob)}-{width}-{fmt}", max_age=config.BLOB_MAX_AGE)
+    response.cache_control.immutable = True
+    response.headers["Vary"] = "Accept"
+    return response
 
 @app.route("/images/<path:filename>")
 def serve_image(filename):
-    return send_from_directory(config.IMAGES_DIR, filename)
+    listing_id, _, name = filename.rpartition("/")
+    path = images.resolve_image(listing_id, name) if listing_id else None
+    if path:
+        blob = os.path.relpath(path, config.BLOBS_DIR)
+        return send_from_directory(config.BLOBS_DIR, blob, etag=blob_etag(blob),
+                                   max_age=config.LISTING_IMAGE_MAX_AGE)
+    return send_from_directory(config.IMAGES_DIR, filename, max_age=config.LISTING_IMAGE_MAX_AGE)
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
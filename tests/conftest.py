@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+
+# Run from any directory: make the scraper and benchmarks packages importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper import config, db, httpcache, archive
+from benchmarks.bench_crawl import point_at
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Scratch storage directory; config and process-wide caches are restored afterwards."""
+    for name in dir(config):
+        if name.isupper():
+            monkeypatch.setattr(config, name, getattr(config, name))
+    point_at("http://127.0.0.1:9", str(tmp_path))
+    monkeypatch.setattr(httpcache, "_cache", None)
+    monkeypatch.setattr(archive, "_archive", None)
+    yield tmp_path
+    db.close()
@@ -0,0 +1,54 @@
+from urllib.parse import urlparse
+import pytest
+from scraper import config, db, history, ratelimit, utils
+from scraper.scraper import run_scraper
+from benchmarks.stub_server import start_stub_server
+from benchmarks.bench_crawl import point_at
+
+
+@pytest.fixture
+def stub(store, monkeypatch):
+    server, base = start_stub_server(max_pages=1)
+    point_at(base, str(store))
+    ratelimit.get_limiter().configure(urlparse(base).netloc, 1000, burst=100)
+    yield server.RequestHandlerClass
+    server.shutdown()
+
+
+def stored_prices():
+    return dict(db.connect().execute("SELECT listing_id, price FROM listings"))
+
+
+def test_recheck_records_price_change(stub, monkeypatch):
+    run_scraper(target_count=1000)
+    before = stored_prices()
+    assert before
+
+    stub.search_html = stub.search_html.replace("Rs 220,000,000", "Rs 210,000,000")
+    stub.detail_html = stub.detail_html.replace(b"Rs 250,000", b"Rs 240,000")
+    # A later run: search pages have expired, detail pages are still in the cache
+    monkeypatch.setitem(config.HTTP_CACHE_TTL, "search", 0)
+    run_scraper(target_count=1000, recheck=True)
+
+    changes = history.price_changes()
+    assert changes
+    for change in changes:
+        assert (change["old_price"], change["price"]) == (250000.0, 240000.0)
+        assert stored_prices()[change["listing_id"]] == 240000.0
+        assert len(history.price_history(change["listing_id"])) == 2
+
+
+def test_recheck_without_changes_fetches_no_detail_pages(stub, monkeypatch):
+    run_scraper(target_count=1000)
+    monkeypatch.setitem(config.HTTP_CACHE_TTL, "search", 0)
+    fetched = []
+    fetch_url = utils.fetch_url
+
+    def counting_fetch(session, url, *args, **kwargs):
+        fetched.append(url)
+        return fetch_url(session, url, *args, **kwargs)
+
+    monkeypatch.setattr(utils, "fetch_url", counting_fetch)
+    run_scraper(target_count=1000, recheck=True)
+    assert not [url for url in fetched if "/en/ad/" in url]
+    assert not history.price_changes()
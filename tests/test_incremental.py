@@ -0,0 +1,89 @@
+import os
+import copy
+from bs4 import BeautifulSoup
+from scraper import config, storage, parsers
+from scraper.incremental import IncrementalTracker, ad_id, load_high_water_mark
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper", "ikman_property.html")
+
+
+def fixture_cards():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
+    return soup.select(config.SELECTORS["listing_item"])
+
+
+def make_card(template, slug):
+    """A copy of a fixture card pointing at another ad, not bumped."""
+    card = copy.copy(template)
+    card.select_one(config.SELECTORS["listing_link"])["href"] = f"/en/ad/{slug}"
+    for bumped in card.select(config.SELECTORS["listing_bumped"]):
+        bumped.decompose()
+    return card
+
+
+def search_page(cards):
+    return parsers.parse_search_page("<ul>" + "".join(str(card) for card in cards) + "</ul>")
+
+
+def crawl(tracker, pages, existing_ids):
+    """Feed pages to the tracker the way run_scraper does; the observe_page results."""
+    stops = []
+    for page, html_cards in enumerate(pages, start=1):
+        listings = search_page(html_cards)
+        stops.append(tracker.observe_page(page, listings, existing_ids))
+        existing_ids.update(listing["listing_id"] for listing in listings)
+        if stops[-1]:
+            break
+    tracker.finish(exhausted=not stops[-1])
+    return stops
+
+
+def test_mark_skips_bumped_cards_and_uses_ad_slugs(store):
+    storage.init_storage()
+    cards = fixture_cards()
+    listings = search_page(cards)
+    bumped = [listing for listing in listings if listing["bumped"]]
+    assert len(bumped) == 4
+    # Bumped cards first, as the site shows them on a later day
+    bumped_cards = [card for card in cards if card.select_one(config.SELECTORS["listing_bumped"])]
+    crawl(IncrementalTracker(), [bumped_cards + cards], set())
+    expected = [ad_id(listing) for listing in listings if not listing["bumped"]][:config.HIGH_WATER_IDS]
+    assert load_high_water_mark()["ad_ids"] == expected
+    assert all("-" in slug for slug in expected)
+
+
+def test_overlapping_pages_stop_after_fully_known_run(store):
+    storage.init_storage()
+    cards = fixture_cards()
+    template = cards[0]
+    older = [make_card(template, f"older-house-for-sale-colombo-o{n}") for n in range(100)]
+    existing_ids = set()
+
+    # Day 1: the fixture page, then older ads, until the last page
+    day1 = [cards, older[:25], older[25:50], older[50:75], older[75:]]
+    assert not any(crawl(IncrementalTracker(), day1, existing_ids))
+
+    # Day 2: five new ads push the list down; page 1 overlaps the old mark and
+    # shares its "colombo"-style listing_ids, but the crawl goes on
+    new = [make_card(template, f"new-annex-for-rent-colombo-n{n}") for n in range(5)]
+    listing = new + cards + older
+    day2 = [listing[start:start + 25] for start in range(0, len(listing), 25)]
+    tracker = IncrementalTracker()
+    stops = crawl(tracker, day2, existing_ids)
+    assert stops == [False] * config.INCREMENTAL_STOP_PAGES + [True]
+    assert tracker.reason == f"{config.INCREMENTAL_STOP_PAGES} consecutive fully-known pages"
+    assert load_high_water_mark()["ad_ids"][0] == "new-annex-for-rent-colombo-n0"
+
+
+def test_known_pages_do_not_stop_before_the_mark(store):
+    storage.init_storage()
+    cards = fixture_cards()
+    existing_ids = set()
+    crawl(IncrementalTracker(), [cards[:5]], existing_ids)
+
+    # Known ads, but none of the marked ones: keep walking to the last page
+    pages = [[make_card(cards[0], f"known-land-for-sale-kandy-k{page}-{n}") for n in range(25)] for page in range(5)]
+    for page in pages:
+        existing_ids.update(listing["listing_id"] for listing in search_page(page))
+    assert not any(crawl(IncrementalTracker(), pages, existing_ids))
@@ -0,0 +1,56 @@
+import csv
+import json
+from scraper import db, storage, columnar, export
+
+
+def save(*listings):
+    storage.save_listings([{"listing_id": listing_id, "price": price, "location": "Moratuwa, House Rentals"}
+                           for listing_id, price in listings])
+
+
+def commit_late(listing_id, price, updated_at):
+    """A save that stamped updated_at earlier than a commit which beat it."""
+    conn = db.connect()
+    listing = {"listing_id": listing_id, "price": price, "location": "Moratuwa, House Rentals"}
+    with conn:
+        conn.execute("INSERT INTO listings (listing_id, price, location, updated_at, data) VALUES (?, ?, ?, ?, ?) "
+                     "ON CONFLICT(listing_id) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at, "
+                     "data = excluded.data",
+                     (listing_id, price, listing["location"], updated_at, json.dumps(listing)))
+
+
+def test_columnar_refresh_picks_up_late_commits(store):
+    storage.init_storage()
+    save(("a", 1000.0), ("b", 2000.0))
+    index = columnar.ColumnarIndex.empty()
+    assert index.refresh() == 2
+    mark = index.updated_at
+
+    commit_late("b", 2500.0, mark - 0.5)
+    commit_late("c", 3000.0, mark - 0.3)
+    assert index.refresh() == 2
+    prices = dict(zip(index.listing_ids.tolist(), index.columns["price"].tolist()))
+    assert prices == {"a": 1000.0, "b": 2500.0, "c": 3000.0}
+    # Rows in the window that are already indexed are not counted again
+    assert index.refresh() == 0
+
+
+def exported_ids(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))[1:]
+    return sorted(row[0] for row in rows)
+
+
+def test_incremental_export_picks_up_late_commits(store, tmp_path):
+    storage.init_storage()
+    save(("a", 1000.0), ("b", 2000.0))
+    path, count = export.export("csv", path=str(tmp_path / "first.csv"), incremental=True)
+    assert count == 2
+    mark, _ = export.load_mark(db.connect(), "export_csv_updated_at")
+
+    commit_late("c", 3000.0, mark - 0.5)
+    path, count = export.export("csv", path=str(tmp_path / "second.csv"), incremental=True)
+    assert exported_ids(path) == ["c"]
+
+    path, count = export.export("csv", path=str(tmp_path / "third.csv"), incremental=True)
+    assert count == 0
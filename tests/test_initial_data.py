@@ -0,0 +1,32 @@
+import os
+import pytest
+from scraper import initial_data, scrape_listings
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper")
+FIXTURES = ["ikman_property.html", "ikman_detail.html", "debug_page.html"]
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("fixture", FIXTURES)
+def test_matches_soup_extractor(fixture):
+    html = read_fixture(fixture)
+    assert initial_data.extract_initial_data(html) == scrape_listings.extract_initial_data_soup(html)
+
+
+def test_skips_mentions_that_are_not_assignments():
+    html = '<script>if (window.initialData) {}</script><script>window.initialData = {"a": [1, "}"]};</script>'
+    assert initial_data.extract_initial_data(html) == {"a": [1, "}"]}
+
+
+def test_missing_marker_raises():
+    with pytest.raises(ValueError):
+        initial_data.extract_initial_data("<html><body></body></html>")
+
+
+def test_undecodable_object_raises():
+    with pytest.raises(ValueError):
+        initial_data.extract_initial_data("<script>window.initialData = {broken</script>")
@@ -0,0 +1,68 @@
+import pytest
+from scraper.normalize import parse_price, parse_area, parse_count, normalize_listing, normalize_records
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("65000 /month", (65000.0, "month", None)),
+    ("Rs 85,000 per month", (85000.0, "month", None)),
+    ("120000 monthly", (120000.0, "month", None)),
+    ("5000 /night", (5000.0, "day", None)),
+    ("2340000 per perch", (2340000.0, None, "perch")),
+    ("Rs 1.5 Mn /perch", (1500000.0, None, "perch")),
+    ("45 lakhs", (4500000.0, None, None)),
+    ("25000000", (25000000.0, None, None)),
+    ("Negotiable", (None, None, None)),
+    (250000, (250000.0, None, None)),
+    (float("nan"), (None, None, None)),
+    (None, (None, None, None)),
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("8.0 perches", 2178.0),
+    ("10p", 2722.5),
+    ("1,500 sqft", 1500.0),
+    ("1500 square feet", 1500.0),
+    ("2 acres", 87120.0),
+    ("150 m2", 1614.59),
+    ("1 acre 20 perches", 49005.0),
+    ("1 hectare 2 acres", 194759.0),
+    ("1,500 sqft (139 m2)", 1500.0),
+    ("1500", 1500.0),
+    (1500.0, 1500.0),
+    ("n/a", None),
+    ("", None),
+    (None, None),
+])
+def test_parse_area(value, expected):
+    assert parse_area(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("3", 3), ("10+", 10), (3.0, 3), ("Studio", None), (None, None), (float("nan"), None),
+])
+def test_parse_count(value, expected):
+    assert parse_count(value) == expected
+
+
+LISTINGS = [
+    {"listing_id": "1", "price": "65000 /month", "area": "8.0 perches", "bedrooms": "3", "bathrooms": "2"},
+    {"listing_id": "2", "price": "2340000 per perch", "area": "1 acre 20 perches"},
+    {"listing_id": "3", "price": 250000.0, "price_text": "250000", "rental_period": None, "price_unit": None,
+     "area_sqft": "1,500.0", "bedrooms": "10+"},
+    {"listing_id": "4", "price": "Negotiable", "area_sqft": None, "area": "150 m2", "bathrooms": None},
+    {"listing_id": "5"},
+    {"listing_id": "6", "price": "65000 /month", "area": "8.0 perches", "bedrooms": "3", "bathrooms": "2"},
+]
+
+
+def test_normalize_records_matches_normalize_listing():
+    assert normalize_records(LISTINGS) == [normalize_listing(listing) for listing in LISTINGS]
+
+
+def test_normalize_listing_is_idempotent():
+    for listing in LISTINGS:
+        once = normalize_listing(listing)
+        assert normalize_listing(once) == once
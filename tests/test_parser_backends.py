@@ -0,0 +1,39 @@
+import os
+import pytest
+from scraper import parsers, html_backends
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper")
+FIXTURES = ["ikman_property.html", "ikman_detail.html", "debug_page.html"]
+REFERENCE = "html.parser"
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def run(backend, html):
+    return (
+        parsers.parse_search_page(html, backend=backend),
+        parsers.parse_detail_page(html, "https://ikman.lk/en/ad/fixture", backend=backend),
+    )
+
+
+@pytest.mark.parametrize("backend", ["lxml", "selectolax"])
+@pytest.mark.parametrize("fixture", FIXTURES)
+def test_backend_matches_html_parser(fixture, backend):
+    if backend not in html_backends.available_backends():
+        pytest.skip(f"{backend} is not installed")
+    html = read_fixture(fixture)
+    assert run(backend, html) == run(REFERENCE, html)
+
+
+def test_search_fixture_yields_listings():
+    # Guards the equivalence tests against every backend agreeing on nothing
+    listings = parsers.parse_search_page(read_fixture("ikman_property.html"), backend=REFERENCE)
+    assert listings and all(listing["listing_id"] for listing in listings)
+
+
+def test_default_backend_is_html_parser():
+    # The faster backends are opt-in through config.PARSER_BACKEND
+    assert html_backends.get_backend().name == REFERENCE
@@ -0,0 +1,18 @@
+from scraper import storage
+from scraper.scraper import persist_listing
+
+
+def test_persist_listing_resolves_nearest_university(store):
+    storage.init_storage()
+    assert persist_listing({"listing_id": "u1", "location": "Moratuwa, Colombo", "price": "45000 /month"})
+    listing = storage.get_listing("u1")
+    assert listing["nearest_university"] == "University of Moratuwa"
+    assert listing["university_distance_km"] < 5
+
+
+def test_persist_listing_unknown_location(store):
+    storage.init_storage()
+    assert persist_listing({"listing_id": "u2", "location": "Nowhere In Particular"})
+    listing = storage.get_listing("u2")
+    assert listing["nearest_university"] is None
+    assert listing["university_distance_km"] is None
@@ -0,0 +1,15 @@
+import multiprocessing
+from scraper import config, utils
+
+
+def worker_settings():
+    return config.BASE_URL, multiprocessing.parent_process() is not None
+
+
+def test_process_pool_workers_get_runtime_config(monkeypatch):
+    monkeypatch.setattr(config, "BASE_URL", "http://127.0.0.1:9")
+    with utils.process_pool(1) as executor:
+        assert executor._mp_context.get_start_method() != "fork"
+        base_url, in_worker = executor.submit(worker_settings).result()
+    assert base_url == "http://127.0.0.1:9"
+    assert in_worker
@@ -0,0 +1,46 @@
+import os
+import cProfile
+import threading
+from scraper import config, profiling
+
+
+@profiling.staged("fetch")
+def fetch():
+    return sum(range(20000))
+
+
+def run_threads(count=4, calls=20):
+    results = []
+    threads = [threading.Thread(target=lambda: results.extend(fetch() for _ in range(calls))) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_cprofile_stages_from_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILE_DIR", str(tmp_path))
+    with profiling.session("cprofile", name="threads"):
+        assert len(run_threads()) == 80
+    files = os.listdir(tmp_path)
+    assert any(name.endswith("-summary.txt") for name in files)
+    assert any(name.endswith(".prof") for name in files)
+
+
+class Busy(cProfile.Profile):
+    """A profile that cannot start, as when another one holds sys.monitoring (3.12+)."""
+
+    def enable(self, *args, **kwargs):
+        raise ValueError("Another profiling tool is already active")
+
+
+def test_unavailable_profiler_never_breaks_the_staged_code(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling.cProfile, "Profile", Busy)
+    with profiling.session("cprofile", name="busy"):
+        assert len(run_threads()) == 80
+    # Empty profiles are skipped rather than handed to pstats
+    files = os.listdir(tmp_path)
+    assert any(name.endswith("-summary.txt") for name in files)
+    assert not any(name.endswith(".prof") for name in files)
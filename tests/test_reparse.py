@@ -0,0 +1,42 @@
+import os
+import pytest
+from scraper import reparse, storage
+from scraper.archive import get_archive
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper", "debug_page.html")
+URL = "https://ikman.lk/en/ad/unfurnished-3br-apartment-for-rent-colombo-4-123"
+
+
+@pytest.mark.parametrize("parser", reparse.PARSERS)
+def test_parse_detail_keeps_archived_listing_id(parser):
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    full_data = reparse._parse_detail(({"listing_id": "123", "source_url": URL}, html, parser))
+    assert full_data["listing_id"] == "123"
+    assert full_data["source_url"] == URL
+
+
+def test_reparse_keeps_stored_fields_without_archived_card(store):
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    storage.init_storage()
+    storage.save_listing({"listing_id": "123", "source_url": URL, "location": "Moratuwa, Colombo", "price": "1"})
+    # Only the detail page was archived (its search page was a cache hit)
+    get_archive().append(URL, html)
+    assert reparse.reparse(workers=1) == 1
+    listing = storage.get_listing("123")
+    assert listing["location"] == "Moratuwa, Colombo"
+    assert listing["price"] == 250000
+
+
+def test_reparse_resolves_nearest_university(store):
+    with open(FIXTURE, encoding="utf-8") as f:
+        html = f.read()
+    storage.init_storage()
+    # Stored without a university, as listings saved before it was resolved
+    storage.save_listing({"listing_id": "123", "source_url": URL, "location": "Colombo 7, Colombo"})
+    get_archive().append(URL, html)
+    assert reparse.reparse(workers=1) == 1
+    listing = storage.get_listing("123")
+    assert listing["nearest_university"] == "University of the Visual and Performing Arts"
+    assert listing["university_distance_km"] is not None
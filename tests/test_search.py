@@ -0,0 +1,77 @@
+import pytest
+from scraper import config, storage
+
+LISTINGS = [
+    {"listing_id": "s1", "title": "Annex for rent in Moratuwa", "description": "Quiet annex near the university",
+     "location": "Moratuwa, Colombo", "price": 35000.0, "nearest_university": "University of Moratuwa"},
+    {"listing_id": "s2", "title": "House for sale in Kandy", "description": "Garden and parking",
+     "location": "Kandy, Kandy", "price": 25000000.0},
+    {"listing_id": "s3", "title": "Furnished annex", "description": "Hot water, parking",
+     "location": "Nugegoda, Colombo", "price": 55000.0},
+    {"listing_id": "s4", "title": "Room for rent", "description": "Annex room with parking",
+     "location": "Maharagama, Colombo", "price": 20000.0},
+]
+
+
+def ids(result):
+    return {listing["listing_id"] for listing in result[0]}
+
+
+@pytest.fixture
+def indexed(store):
+    storage.init_storage()
+    storage.save_listings([dict(listing) for listing in LISTINGS])
+    return store
+
+
+def test_listings_are_searchable_once_saved(indexed):
+    assert ids(storage.search_listings("annex")) == {"s1", "s3", "s4"}
+    # Stemmed: "annexes" finds "annex"
+    assert ids(storage.search_listings("annexes")) == {"s1", "s3", "s4"}
+    assert ids(storage.search_listings("moratuwa university")) == {"s1"}
+
+    # Re-saving replaces the index entry
+    storage.save_listings([{**LISTINGS[1], "title": "Villa for sale in Kandy"}])
+    assert ids(storage.search_listings("house")) == set()
+    assert ids(storage.search_listings("villa")) == {"s2"}
+
+
+def test_falls_back_to_any_word(indexed):
+    listings, _, matched = storage.search_listings("annex parking")
+    assert matched == "all"
+    assert {listing["listing_id"] for listing in listings} == {"s3", "s4"}
+
+    listings, _, matched = storage.search_listings("kandy nugegoda")
+    assert matched == "any"
+    assert {listing["listing_id"] for listing in listings} == {"s2", "s3"}
+
+    assert storage.search_listings("!!! ???") == ([], None, None)
+
+
+def test_filters_apply_to_matches(indexed):
+    assert ids(storage.search_listings("annex", max_price=40000)) == {"s1", "s4"}
+    assert ids(storage.search_listings("annex", location="Nugegoda")) == {"s3"}
+    assert ids(storage.search_listings("annex", min_price=100000)) == set()
+
+
+def test_pages_follow_the_cursor(indexed):
+    first, cursor, _ = storage.search_listings("annex", limit=2)
+    assert len(first) == 2 and cursor == 2
+    rest, cursor, _ = storage.search_listings("annex", after=cursor, limit=2)
+    assert cursor is None
+    assert {listing["listing_id"] for listing in first + rest} == {"s1", "s3", "s4"}
+
+
+def test_api_search_offset_cap(indexed, monkeypatch):
+    from server.app import app, encode_cursor
+    monkeypatch.setattr(config, "SEARCH_MAX_OFFSET", 1)
+    client = app.test_client()
+
+    page = client.get("/api/search?q=annex&limit=1").get_json()
+    assert page["count"] == 1 and page["next_cursor"] == encode_cursor(1)
+    # The next page would start past the cap, so there is no cursor to it
+    page = client.get(f"/api/search?q=annex&limit=1&cursor={page['next_cursor']}").get_json()
+    assert page["count"] == 1 and page["next_cursor"] is None
+
+    response = client.get(f"/api/search?q=annex&limit=1&cursor={encode_cursor(2)}")
+    assert response.status_code == 400